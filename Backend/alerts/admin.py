@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Alert, AlertAcknowledgement, AlertTemplate
+from . import inbox
+from .models import Alert, AlertAcknowledgement, AlertInbox, AlertTemplate, AlertUnreadCounter
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
@@ -16,11 +17,11 @@ class AlertAdmin(admin.ModelAdmin):
     is_expired.short_description = 'Expired'
     
     def mark_as_resolved(self, request, queryset):
-        queryset.update(status='resolved')
+        inbox.close_alerts(queryset, 'resolved')
     mark_as_resolved.short_description = "Mark selected alerts as resolved"
     
     def mark_as_expired(self, request, queryset):
-        queryset.update(status='expired')
+        inbox.close_alerts(queryset, 'expired')
     mark_as_expired.short_description = "Mark selected alerts as expired"
 
 @admin.register(AlertAcknowledgement)
@@ -30,6 +31,19 @@ class AlertAcknowledgementAdmin(admin.ModelAdmin):
     search_fields = ('alert__title', 'user__username')
     readonly_fields = ('acknowledged_at',)
 
+@admin.register(AlertInbox)
+class AlertInboxAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'user', 'priority', 'created_at', 'acknowledged')
+    list_filter = ('priority', 'acknowledged')
+    search_fields = ('alert__title', 'user__username')
+    raw_id_fields = ('alert', 'user')
+
+@admin.register(AlertUnreadCounter)
+class AlertUnreadCounterAdmin(admin.ModelAdmin):
+    list_display = ('user', 'unread', 'updated_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+
 @admin.register(AlertTemplate)
 class AlertTemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'alert_type', 'default_priority', 'default_expiry_hours')
@@ -0,0 +1,239 @@
+"""
+Per-user alert inbox.
+
+Recipients of an alert are resolved once, when the alert is created, into
+AlertInbox rows (user, alert, type, priority, created_at, acknowledged).
+Reading a user's alerts or checking whether they may acknowledge one is
+then a lookup on the (user, ...) indexes instead of an OR across
+target_users, target_user_types, the student and the student's parent.
+
+An alert reaches:
+
+- every user in target_users
+- every active user whose user_type is in target_user_types
+- the student it is about and that student's parent
+
+Alerts saved one at a time are delivered from signals (target_users from
+m2m_changed, as they are set after the alert is saved). Code that creates
+alerts with bulk_create, or writes the target_users through table
+directly, calls deliver() / deliver_to_users() itself.
+
+Each user's unread badge is an AlertUnreadCounter row holding the number
+of unacknowledged entries for active alerts in their inbox. It is kept in
+step as entries are delivered, acknowledged or removed and as alerts stop
+being active. Expiry is time based, so overdue alerts only leave the count
+once expire_overdue_alerts() marks them expired; the
+reconcile_alert_counters command does that and rebuilds the counters from
+the inbox to correct any drift.
+
+New entries and acknowledgements are also pushed to the recipients' open
+alert streams (alerts.streaming).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import AlertInbox, AlertUnreadCounter
+from .streaming import acknowledged_event, alert_broadcaster, alert_event
+
+BATCH_SIZE = 1000
+
+
+def _users_by_type(user_types):
+    """user_type -> active user ids, for the given types only"""
+    from accounts.models import User
+
+    by_type = {user_type: [] for user_type in user_types}
+    if user_types:
+        rows = User.objects.filter(user_type__in=user_types, is_active=True).values_list('user_type', 'id')
+        for user_type, user_id in rows.iterator(chunk_size=BATCH_SIZE):
+            by_type[user_type].append(user_id)
+    return by_type
+
+
+def recipients(alerts, include_target_users=True):
+    """alert id -> recipient user ids, resolved with at most three queries"""
+    from .models import Alert
+
+    by_type = _users_by_type({user_type for alert in alerts for user_type in alert.target_user_types or []})
+    student_parents = {}
+    student_ids = {alert.student_id for alert in alerts if alert.student_id is not None}
+    if student_ids:
+        from accounts.models import Student
+
+        student_parents = dict(Student.objects.filter(pk__in=student_ids).values_list('pk', 'parent_id'))
+
+    resolved = {}
+    for alert in alerts:
+        user_ids = set()
+        for user_type in alert.target_user_types or []:
+            user_ids.update(by_type.get(user_type, ()))
+        if alert.student_id is not None:
+            # Student.pk is its user id, and Parent.pk its parent's user id
+            user_ids.add(alert.student_id)
+            if student_parents.get(alert.student_id) is not None:
+                user_ids.add(student_parents[alert.student_id])
+        resolved[alert.id] = user_ids
+
+    if include_target_users:
+        Through = Alert.target_users.through
+        rows = Through.objects.filter(alert_id__in=resolved).values_list('alert_id', 'user_id')
+        for alert_id, user_id in rows:
+            resolved[alert_id].add(user_id)
+    return resolved
+
+
+def _insert(alerts_by_id, pairs):
+    """
+    Write inbox rows for (alert_id, user_id) pairs that don't exist yet and
+    bump the recipients' unread counters; returns rows written.
+    """
+    if not pairs:
+        return 0
+    existing = set(
+        AlertInbox.objects.filter(alert_id__in=alerts_by_id).values_list('alert_id', 'user_id')
+    )
+    rows = [
+        AlertInbox.for_alert(alerts_by_id[alert_id], user_id)
+        for alert_id, user_id in pairs
+        if (alert_id, user_id) not in existing
+    ]
+    AlertInbox.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    adjust_unread(Counter(row.user_id for row in rows if alerts_by_id[row.alert_id].status == 'active'))
+    _publish_entries(alerts_by_id, rows)
+    return len(rows)
+
+
+def _publish_entries(alerts_by_id, rows):
+    """Push new entries to recipients with an open stream once the transaction commits"""
+    connected = alert_broadcaster.connected({row.user_id for row in rows})
+    if not connected:
+        return
+    # bulk_create with ignore_conflicts doesn't return ids; the SSE ids need them
+    entries = (
+        AlertInbox.objects
+        .filter(alert_id__in={row.alert_id for row in rows}, user_id__in=connected)
+        .order_by('id')
+        .values_list('id', 'alert_id', 'user_id')
+    )
+    events = {}
+    for entry_id, alert_id, user_id in entries:
+        alert = alerts_by_id.get(alert_id)
+        if alert is not None and alert.status == 'active':
+            events.setdefault(user_id, []).append(alert_event(entry_id, alert))
+    if events:
+        transaction.on_commit(lambda: alert_broadcaster.publish(events))
+
+
+def deliver(alerts, include_target_users=True):
+    """Add saved alerts to their recipients' inboxes; returns rows written"""
+    alerts = [alert for alert in alerts if alert.pk is not None]
+    if not alerts:
+        return 0
+    return _insert(
+        {alert.id: alert for alert in alerts},
+        [
+            (alert_id, user_id)
+            for alert_id, user_ids in recipients(alerts, include_target_users).items()
+            for user_id in user_ids
+        ]
+    )
+
+
+def deliver_to_users(alert, user_ids):
+    """Add one saved alert to the given users' inboxes"""
+    return _insert({alert.id: alert}, [(alert.id, user_id) for user_id in user_ids])
+
+
+def remove_entries(entries):
+    """Delete inbox rows, taking unread ones off their users' counters"""
+    unread = entries.filter(acknowledged=False, alert__status='active')
+    adjust_unread(Counter(unread.values_list('user_id', flat=True)), sign=-1)
+    entries.delete()
+
+
+def mark_acknowledged(user, alert_ids):
+    """Flag inbox entries as acknowledged; returns how many changed"""
+    changed = AlertInbox.objects.filter(user=user, alert_id__in=alert_ids, acknowledged=False).update(acknowledged=True)
+    adjust_unread({user.id: changed}, sign=-1)
+    if changed and alert_broadcaster.connected([user.id]):
+        event = acknowledged_event(alert_ids)
+        transaction.on_commit(lambda: alert_broadcaster.publish({user.id: [event]}))
+    return changed
+
+
+def adjust_unread(deltas, sign=1):
+    """Add sign * delta to each user's unread counter, one UPDATE per distinct delta"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    AlertUnreadCounter.objects.bulk_create(
+        [AlertUnreadCounter(user_id=user_id) for user_id in deltas],
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        AlertUnreadCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(F('unread') + sign * delta, 0),
+            updated_at=timezone.now()
+        )
+
+
+def retire_alerts(alert_ids):
+    """
+    Take alerts that just stopped being active (resolved, expired, deleted)
+    off the unread counters of recipients who hadn't acknowledged them.
+    """
+    unread = AlertInbox.objects.filter(alert_id__in=alert_ids, acknowledged=False)
+    adjust_unread(Counter(unread.values_list('user_id', flat=True)), sign=-1)
+
+
+def close_alerts(queryset, new_status):
+    """Move the active alerts in queryset to new_status; returns how many changed"""
+    from .models import Alert
+
+    alert_ids = list(queryset.filter(status='active').values_list('id', flat=True))
+    if not alert_ids:
+        return 0
+    with transaction.atomic():
+        Alert.objects.filter(id__in=alert_ids).update(status=new_status, updated_at=timezone.now())
+        retire_alerts(alert_ids)
+    return len(alert_ids)
+
+
+def expire_overdue_alerts():
+    """Mark active alerts past expires_at as expired; returns how many changed"""
+    from .models import Alert
+
+    return close_alerts(Alert.objects.filter(expires_at__lt=timezone.now()), 'expired')
+
+
+def rebuild_unread_counters():
+    """
+    Recompute every counter from the inbox. Returns the number of users
+    with unread alerts.
+    """
+    unread = dict(
+        AlertInbox.objects.filter(acknowledged=False, alert__status='active')
+        .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+    )
+    with transaction.atomic():
+        AlertUnreadCounter.objects.exclude(user_id__in=unread).update(unread=0)
+        AlertUnreadCounter.objects.bulk_create(
+            [AlertUnreadCounter(user_id=user_id, unread=count) for user_id, count in unread.items()],
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['unread', 'updated_at']
+        )
+    return len(unread)
+
+
+def unread_count(user):
+    """The user's badge count: one primary-key lookup"""
+    return AlertUnreadCounter.objects.filter(user_id=user.id).values_list('unread', flat=True).first() or 0
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from alerts.inbox import expire_overdue_alerts, rebuild_unread_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark alerts past expires_at as expired and rebuild every user's unread "
+        "alert counter from the inbox. Run it periodically (e.g. every few minutes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-expire', action='store_true',
+            help="Only rebuild the counters; leave overdue alerts active"
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_expire']:
+            expired = expire_overdue_alerts()
+            self.stdout.write(f"Expired {expired} overdue alerts")
+        users = rebuild_unread_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt unread counters; {users} users have unread alerts"))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.CharField(choices=[('low', 'Low Priority'), ('medium', 'Medium Priority'), ('high', 'High Priority'), ('emergency', 'Emergency')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('acknowledged', models.BooleanField(default=False)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='alerts.alert')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_inbox', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='alerts_aler_user_id_3d3a2a_idx'), models.Index(fields=['user', 'acknowledged'], name='alerts_aler_user_id_0bdad0_idx')],
+                'unique_together': {('user', 'alert')},
+            },
+        ),
+    ]
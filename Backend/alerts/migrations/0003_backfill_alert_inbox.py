@@ -0,0 +1,55 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_inbox(apps, schema_editor):
+    """Resolve recipients of existing alerts the same way alerts.inbox does"""
+    Alert = apps.get_model('alerts', 'Alert')
+    AlertInbox = apps.get_model('alerts', 'AlertInbox')
+    AlertAcknowledgement = apps.get_model('alerts', 'AlertAcknowledgement')
+    Student = apps.get_model('accounts', 'Student')
+    User = apps.get_model('accounts', 'User')
+
+    users_by_type = {}
+    for user_type, user_id in User.objects.filter(is_active=True).values_list('user_type', 'id'):
+        users_by_type.setdefault(user_type, []).append(user_id)
+    student_parents = dict(Student.objects.values_list('pk', 'parent_id'))
+    acknowledged = set(AlertAcknowledgement.objects.values_list('alert_id', 'user_id'))
+    targets = {}
+    for alert_id, user_id in Alert.target_users.through.objects.values_list('alert_id', 'user_id'):
+        targets.setdefault(alert_id, set()).add(user_id)
+
+    rows = []
+    alerts = Alert.objects.values_list('id', 'priority', 'created_at', 'target_user_types', 'student_id')
+    for alert_id, priority, created_at, user_types, student_id in alerts.iterator(chunk_size=BATCH_SIZE):
+        user_ids = set(targets.get(alert_id, ()))
+        for user_type in user_types or []:
+            user_ids.update(users_by_type.get(user_type, ()))
+        if student_id is not None:
+            user_ids.add(student_id)
+            if student_parents.get(student_id) is not None:
+                user_ids.add(student_parents[student_id])
+        rows.extend(
+            AlertInbox(
+                user_id=user_id, alert_id=alert_id, priority=priority, created_at=created_at,
+                acknowledged=(alert_id, user_id) in acknowledged
+            )
+            for user_id in user_ids
+        )
+        if len(rows) >= BATCH_SIZE:
+            AlertInbox.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    AlertInbox.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_options_remove_user_avatar_and_more'),
+        ('alerts', '0002_alertinbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
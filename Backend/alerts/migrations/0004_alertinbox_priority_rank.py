@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+PRIORITY_RANK = {'emergency': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+def fill_type_and_rank(apps, schema_editor):
+    Alert = apps.get_model('alerts', 'Alert')
+    AlertInbox = apps.get_model('alerts', 'AlertInbox')
+    for priority, rank in PRIORITY_RANK.items():
+        AlertInbox.objects.filter(priority=priority).update(priority_rank=rank)
+    AlertInbox.objects.update(
+        alert_type=Subquery(Alert.objects.filter(pk=OuterRef('alert_id')).values('alert_type')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0003_backfill_alert_inbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='alertinbox',
+            options={'ordering': ['priority_rank', '-created_at', '-id']},
+        ),
+        migrations.AddField(
+            model_name='alertinbox',
+            name='alert_type',
+            field=models.CharField(choices=[('transport_safety', 'Transport Safety'), ('academic_performance', 'Academic Performance'), ('attendance', 'Attendance Issue'), ('behavior', 'Behavioral Incident'), ('health_wellness', 'Health & Wellness'), ('school_safety', 'School Safety'), ('financial', 'Financial Update'), ('system', 'System Notification'), ('achievement', 'Student Achievement'), ('parent_meeting', 'Parent Meeting Request')], default='system', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='alertinbox',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=2),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_type_and_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alertinbox',
+            index=models.Index(fields=['user', 'priority_rank', '-created_at', '-id'], name='alerts_aler_user_id_8d0146_idx'),
+        ),
+    ]
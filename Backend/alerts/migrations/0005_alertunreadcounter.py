@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    AlertInbox = apps.get_model('alerts', 'AlertInbox')
+    AlertUnreadCounter = apps.get_model('alerts', 'AlertUnreadCounter')
+    unread = (
+        AlertInbox.objects.filter(acknowledged=False, alert__status='active')
+        .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+    )
+    AlertUnreadCounter.objects.bulk_create(
+        [AlertUnreadCounter(user_id=user_id, unread=count) for user_id, count in unread],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_options_remove_user_avatar_and_more'),
+        ('alerts', '0004_alertinbox_priority_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertUnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alert_unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
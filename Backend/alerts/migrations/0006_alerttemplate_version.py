@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_alertunreadcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alerttemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
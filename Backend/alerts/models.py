@@ -26,6 +26,9 @@ class Alert(models.Model):
         ('emergency', 'Emergency'),
     )
     
+    # Sort order for inboxes: emergency first
+    PRIORITY_RANK = {'emergency': 0, 'high': 1, 'medium': 2, 'low': 3}
+    
     STATUS_CHOICES = (
         ('active', 'Active'),
         ('acknowledged', 'Acknowledged'),
@@ -97,7 +100,10 @@ class Alert(models.Model):
     
     def mark_acknowledged(self, user):
         """Mark alert as acknowledged by a user"""
+        from .inbox import mark_acknowledged
+        
         AlertAcknowledgement.objects.create(alert=self, user=user)
+        mark_acknowledged(user, [self.id])
     
     def get_acknowledged_users(self):
         """Get users who have acknowledged this alert"""
@@ -127,6 +133,70 @@ class AlertAcknowledgement(models.Model):
     def __str__(self):
         return f"{self.user.username} acknowledged {self.alert.title}"
 
+class AlertInbox(models.Model):
+    """
+    One row per alert per recipient, resolved when the alert is created.
+    Type, priority (with its sort rank) and created_at are copied from the
+    alert so a user's inbox can be filtered and ordered without touching
+    the alerts table.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='alert_inbox'
+    )
+    alert = models.ForeignKey(
+        Alert,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries'
+    )
+    alert_type = models.CharField(max_length=20, choices=Alert.ALERT_TYPE_CHOICES)
+    priority = models.CharField(max_length=10, choices=Alert.PRIORITY_CHOICES)
+    priority_rank = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField()
+    acknowledged = models.BooleanField(default=False)
+    
+    class Meta:
+        unique_together = ['user', 'alert']
+        ordering = ['priority_rank', '-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', 'priority_rank', '-created_at', '-id']),
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'acknowledged']),
+        ]
+    
+    def __str__(self):
+        return f"{self.alert_id} for {self.user_id}"
+    
+    @classmethod
+    def for_alert(cls, alert, user_id):
+        """Unsaved inbox row delivering alert to user_id"""
+        return cls(
+            user_id=user_id,
+            alert_id=alert.id,
+            alert_type=alert.alert_type,
+            priority=alert.priority,
+            priority_rank=Alert.PRIORITY_RANK[alert.priority],
+            created_at=alert.created_at
+        )
+
+class AlertUnreadCounter(models.Model):
+    """
+    Number of unacknowledged, active alerts in a user's inbox, maintained
+    by alerts.inbox so the unread badge is a single-row lookup
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='alert_unread_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
 class AlertTemplate(models.Model):
     """
     Reusable templates for common alert types
@@ -144,16 +214,25 @@ class AlertTemplate(models.Model):
         help_text="Available variables for this template"
     )
     
+    # Bumped on every save; compiled templates are cached per version
+    version = models.PositiveIntegerField(default=1, editable=False)
+    
     def __str__(self):
         return f"{self.name} ({self.get_alert_type_display()})"
     
-    def create_alert(self, context_data, created_by, **kwargs):
-        """Create an alert from this template with context data"""
-        from django.template import Template, Context
-        title = Template(self.title_template).render(Context(context_data))
-        message = Template(self.message_template).render(Context(context_data))
-        
-        return Alert.objects.create(
+    def save(self, *args, **kwargs):
+        if self._state.adding or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        # Bump in the UPDATE itself so concurrent edits never share a version
+        self.version = models.F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+    
+    def _build_alert(self, title, message, created_by, kwargs):
+        return Alert(
             title=title,
             message=message,
             alert_type=self.alert_type,
@@ -163,4 +242,38 @@ class AlertTemplate(models.Model):
                 hours=kwargs.get('expiry_hours', self.default_expiry_hours)
             ),
             **{k: v for k, v in kwargs.items() if k not in ['priority', 'expiry_hours']}
-        )
\ No newline at end of file
+        )
+    
+    def create_alert(self, context_data, created_by, **kwargs):
+        """Create an alert from this template with context data"""
+        from .templating import render, template_key
+        
+        title = render(template_key(self, 'title'), self.title_template, context_data)
+        message = render(template_key(self, 'message'), self.message_template, context_data)
+        alert = self._build_alert(title, message, created_by, kwargs)
+        alert.save()
+        return alert
+    
+    def create_alerts(self, contexts, created_by, per_alert=None, **kwargs):
+        """
+        Create one alert per context with a bulk insert and deliver them.
+        
+        per_alert, if given, is a list of extra field dicts (e.g. student)
+        matching contexts one to one; kwargs apply to every alert.
+        """
+        from django.db import transaction
+        from .inbox import deliver
+        from .templating import render_many, template_key
+        
+        contexts = list(contexts)
+        titles = render_many(template_key(self, 'title'), self.title_template, contexts)
+        messages = render_many(template_key(self, 'message'), self.message_template, contexts)
+        per_alert = per_alert or [{}] * len(contexts)
+        alerts = [
+            self._build_alert(title, message, created_by, {**kwargs, **extra})
+            for title, message, extra in zip(titles, messages, per_alert)
+        ]
+        with transaction.atomic():
+            Alert.objects.bulk_create(alerts, batch_size=500)
+            deliver(alerts, include_target_users=False)
+        return alerts
\ No newline at end of file
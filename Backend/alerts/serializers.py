@@ -29,6 +29,9 @@ class AlertSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'acknowledgements']
     
     def get_is_acknowledged(self, obj):
+        # List views set this from the user's inbox instead of querying per alert
+        if hasattr(obj, 'user_acknowledged'):
+            return obj.user_acknowledged
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.acknowledgements.filter(user=request.user).exists()
@@ -37,6 +40,20 @@ class AlertSerializer(serializers.ModelSerializer):
     def get_is_expired(self, obj):
         return obj.is_expired()
 
+class AlertListSerializer(AlertSerializer):
+    """
+    AlertSerializer for inbox listings: acknowledgements are summarised as
+    a count (set by the view as acknowledgement_count) instead of nesting
+    every acknowledging user's profile, and target_users, which can hold
+    thousands of ids on broadcast alerts, are left out.
+    """
+    acknowledgement_count = serializers.IntegerField(read_only=True, default=0)
+    
+    class Meta(AlertSerializer.Meta):
+        fields = [
+            field for field in AlertSerializer.Meta.fields if field not in ('acknowledgements', 'target_users')
+        ] + ['acknowledgement_count']
+
 class AlertCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Alert
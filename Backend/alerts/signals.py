@@ -0,0 +1,61 @@
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import inbox
+from .models import Alert, AlertInbox
+
+
+@receiver(pre_save, sender=Alert)
+def remember_status(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._previous_status = Alert.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Alert)
+def deliver_alert(sender, instance, created, **kwargs):
+    """Fill recipients' inboxes for new alerts; keep the copied fields and unread counts in step"""
+    if created:
+        # target_users can only be set after the first save; see below
+        inbox.deliver([instance], include_target_users=False)
+        return
+
+    AlertInbox.objects.filter(alert=instance).exclude(
+        priority=instance.priority, alert_type=instance.alert_type
+    ).update(
+        priority=instance.priority,
+        priority_rank=Alert.PRIORITY_RANK[instance.priority],
+        alert_type=instance.alert_type
+    )
+    previous = getattr(instance, '_previous_status', instance.status)
+    if previous == 'active' and instance.status != 'active':
+        inbox.retire_alerts([instance.id])
+    elif previous != 'active' and instance.status == 'active':
+        unread = AlertInbox.objects.filter(alert=instance, acknowledged=False)
+        inbox.adjust_unread({user_id: 1 for user_id in unread.values_list('user_id', flat=True)})
+
+
+@receiver(pre_delete, sender=Alert)
+def retire_deleted_alert(sender, instance, **kwargs):
+    if instance.status == 'active':
+        inbox.retire_alerts([instance.id])
+
+
+@receiver(m2m_changed, sender=Alert.target_users.through)
+def sync_target_users(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and pk_set:
+        alerts = Alert.objects.filter(pk__in=pk_set) if reverse else [instance]
+        for alert in alerts:
+            inbox.deliver_to_users(alert, [instance.pk] if reverse else pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        # Users dropped from target_users may still be recipients by type or student
+        if not reverse:
+            alerts = [instance]
+        elif pk_set:
+            alerts = list(Alert.objects.filter(pk__in=pk_set))
+        else:
+            alerts = list(Alert.objects.filter(inbox_entries__user=instance))
+        for alert_id, user_ids in inbox.recipients(alerts).items():
+            stale = AlertInbox.objects.filter(alert_id=alert_id).exclude(user_id__in=user_ids)
+            if reverse:
+                stale = stale.filter(user_id=instance.pk)
+            inbox.remove_entries(stale)
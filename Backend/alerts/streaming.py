@@ -0,0 +1,127 @@
+"""
+In-process fan-out of alert deliveries to each recipient's open streams.
+
+A connected client owns a Subscription keyed by its user id. When inbox
+rows are written (see alerts.inbox), the new entries are published after
+the transaction commits and queued on every subscription of their users;
+acknowledgements are published the same way so a user's other devices
+update too. Unlike bus positions nothing is coalesced: every alert is
+sent. Ordinary alerts are flushed in small batches, while an emergency
+alert wakes the stream immediately.
+
+Each alert event carries its inbox entry id as the SSE id, so a client
+that reconnects with Last-Event-ID gets only what it missed, replayed
+from the inbox.
+
+Like the fleet broadcaster this lives in process memory: run the ASGI
+app with a single worker process, or put a shared pub/sub in front of
+it, for every stream to see every alert.
+"""
+import asyncio
+import threading
+
+
+class Subscription:
+    """Per-connection queue of alert events for one user"""
+
+    def __init__(self, loop, user_id):
+        self.loop = loop
+        self.user_id = user_id
+        self._pending = []
+        self._ready = asyncio.Event()
+        self._urgent = asyncio.Event()
+
+    def _offer(self, events):
+        # Runs on the subscriber's event loop
+        self._pending.extend(events)
+        self._ready.set()
+        if any(event.get('priority') == 'emergency' for event in events):
+            self._urgent.set()
+
+    async def next_batch(self, timeout):
+        """Wait for events and return them, or an empty list on timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        self._urgent.clear()
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def pause(self, interval):
+        """Let further events gather for interval seconds, unless an emergency arrives"""
+        try:
+            await asyncio.wait_for(self._urgent.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+class AlertBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user = {}
+
+    def subscribe(self, loop, user_id):
+        subscription = Subscription(loop, user_id)
+        with self._lock:
+            self._by_user.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._by_user.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_user[subscription.user_id]
+
+    def connected(self, user_ids):
+        """The subset of user_ids with at least one open stream"""
+        with self._lock:
+            return {user_id for user_id in user_ids if user_id in self._by_user}
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._by_user.values())
+
+    def publish(self, events_by_user):
+        """Queue {user_id: [event, ...]} on those users' streams; safe from any thread"""
+        deliveries = []
+        with self._lock:
+            for user_id, events in events_by_user.items():
+                for subscription in self._by_user.get(user_id, ()):
+                    deliveries.append((subscription, events))
+
+        for subscription, events in deliveries:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, events)
+            except RuntimeError:
+                # The client's event loop has already shut down
+                self.unsubscribe(subscription)
+
+
+def alert_event(entry_id, alert):
+    """Compact 'alert' event payload; the inbox entry id doubles as the SSE id"""
+    return {
+        'event': 'alert',
+        'id': entry_id,
+        'alert_id': alert.id,
+        'title': alert.title,
+        'message': alert.message,
+        'alert_type': alert.alert_type,
+        'priority': alert.priority,
+        'student': alert.student_id,
+        'created_at': alert.created_at.isoformat() if alert.created_at else None,
+        'expires_at': alert.expires_at.isoformat() if alert.expires_at else None,
+        'action_required': alert.action_required,
+        'action_url': alert.action_url,
+        'action_text': alert.action_text,
+    }
+
+
+def acknowledged_event(alert_ids):
+    return {'event': 'acknowledged', 'alert_ids': list(alert_ids)}
+
+
+alert_broadcaster = AlertBroadcaster()
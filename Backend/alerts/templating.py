@@ -0,0 +1,83 @@
+"""
+Compiled, cached rendering for alert title and message templates.
+
+Both AlertTemplate rows and the built-in ALERT_TEMPLATES use Django
+template syntax ({{ student_name }}). Each template string is compiled
+once and kept in an LRU keyed by where it came from:
+
+    ('db', template id, version, field)    AlertTemplate rows
+    ('builtin', name, field)                ALERT_TEMPLATES entries
+
+AlertTemplate.version is bumped in the database on every save, so edits
+never hit a stale compiled copy. Alerts are plain text, so the engine
+does not HTML-escape variables. render_many() renders one compiled
+template against many contexts, reusing a single Context.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import Context, Engine
+
+engine = Engine(autoescape=False)
+
+
+class TemplateCache:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, 'ALERT_TEMPLATE_CACHE_SIZE', 256)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, source):
+        """Compiled template for key, compiling source on a miss"""
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = engine.from_string(source)
+        with self._lock:
+            self._entries[key] = template
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+template_cache = TemplateCache()
+
+
+def _context(values=None):
+    # A plain Context() escapes HTML whatever the engine says
+    return Context(values, autoescape=engine.autoescape)
+
+
+def render(key, source, context):
+    return template_cache.get(key, source).render(_context(context))
+
+
+def render_many(key, source, contexts):
+    """Render one template against each context in turn"""
+    template = template_cache.get(key, source)
+    context = _context()
+    rendered = []
+    for values in contexts:
+        with context.push(values):
+            rendered.append(template.render(context))
+    return rendered
+
+
+def template_key(alert_template, field):
+    return ('db', alert_template.pk, alert_template.version, field)
+
+
+def builtin_key(name, field):
+    return ('builtin', name, field)
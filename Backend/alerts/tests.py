@@ -1,3 +1,319 @@
+from datetime import timedelta
+from io import StringIO
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Parent, Student, User
+
+from . import inbox
+from .models import Alert, AlertAcknowledgement, AlertInbox, AlertTemplate, AlertUnreadCounter
+
+
+class AlertTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', user_type='admin')
+        self.teacher = User.objects.create(username='teacher', user_type='teacher')
+        self.parent = User.objects.create(username='parent', user_type='parent')
+        self.other_parent = User.objects.create(username='other-parent', user_type='parent')
+        self.student = Student.objects.create(
+            user=User.objects.create(username='kid', user_type='student', first_name='Liam', last_name="O'Brien"),
+            grade='4', parent=Parent.objects.create(user=self.parent)
+        )
+        Parent.objects.create(user=self.other_parent)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def alert(self, **fields):
+        fields = {
+            'title': 'Heads up', 'message': 'Something happened', 'alert_type': 'system',
+            'created_by': self.admin, **fields,
+        }
+        return Alert.objects.create(**fields)
+
+    def badge(self, user):
+        return AlertUnreadCounter.objects.filter(user=user).values_list('unread', flat=True).first() or 0
+
+    def assertInSync(self):
+        """Every counter equals the user's unacknowledged inbox entries of active alerts"""
+        users = set(AlertInbox.objects.values_list('user_id', flat=True)) | set(
+            AlertUnreadCounter.objects.values_list('user_id', flat=True)
+        )
+        for user_id in users:
+            expected = AlertInbox.objects.filter(user_id=user_id, acknowledged=False, alert__status='active').count()
+            self.assertEqual(self.badge(user_id), expected, f'user {user_id}')
+
+
+class UnreadBadgeTests(AlertTestCase):
+    def test_badge_is_a_single_counter_read(self):
+        self.alert(target_user_types=['teacher'])
+        client = self.client_for(self.teacher)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/alerts/unread-count/').data['unread_count'], 1)
+
+    def test_overdue_alerts_leave_the_badge_on_the_sweep(self):
+        from django.core.management import call_command
+
+        self.alert(target_user_types=['teacher'])
+        self.alert(target_user_types=['teacher'], expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.badge(self.teacher), 2)
+
+        call_command('reconcile_alert_counters', stdout=StringIO())
+        self.assertEqual(self.client_for(self.teacher).get('/alerts/unread-count/').data['unread_count'], 1)
+        self.assertInSync()
+
+
+class InboxSyncTests(AlertTestCase):
+    """The unread counters follow the inbox through every write path"""
+
+    def test_create_and_target_user_changes(self):
+        school = self.alert(target_user_types=['teacher'])
+        family = self.alert(student=self.student)
+        self.assertEqual((self.badge(self.teacher), self.badge(self.parent)), (1, 1))
+        self.assertInSync()
+
+        school.target_users.add(self.parent, self.other_parent)
+        self.assertEqual((self.badge(self.parent), self.badge(self.other_parent)), (2, 1))
+        self.assertInSync()
+
+        school.target_users.remove(self.other_parent)
+        self.assertEqual(self.badge(self.other_parent), 0)
+        self.assertInSync()
+
+        self.other_parent.alerts_received.add(school, family)
+        self.assertEqual(self.badge(self.other_parent), 2)
+        self.other_parent.alerts_received.clear()
+        self.assertEqual(self.badge(self.other_parent), 0)
+        self.assertInSync()
+
+        school.target_users.add(self.teacher)
+        school.target_users.clear()
+        self.assertEqual((self.badge(self.teacher), self.badge(self.parent)), (1, 1))
+        self.assertInSync()
+
+    def test_acknowledge_and_bulk_acknowledge(self):
+        alerts = [self.alert(target_user_types=['teacher']) for _ in range(3)]
+        client = self.client_for(self.teacher)
+
+        response = client.post(f'/alerts/{alerts[0].id}/acknowledge/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.badge(self.teacher), 2)
+        self.assertInSync()
+
+        ids = [alert.id for alert in alerts]
+        response = client.post('/alerts/acknowledge/bulk/', {'alert_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.badge(self.teacher), 0)
+        self.assertInSync()
+
+        client.post('/alerts/acknowledge/bulk/', {'alert_ids': ids}, format='json')
+        self.assertEqual(self.badge(self.teacher), 0)
+        self.assertInSync()
+
+    def test_resolve_reopen_and_expire(self):
+        resolved = self.alert(target_user_types=['teacher'])
+        closed = self.alert(target_user_types=['teacher'])
+        overdue = self.alert(target_user_types=['teacher'])
+        self.alert(target_user_types=['teacher'])
+        self.assertEqual(self.badge(self.teacher), 4)
+
+        resolved.status = 'resolved'
+        resolved.save()
+        self.assertEqual(self.badge(self.teacher), 3)
+        self.assertInSync()
+
+        resolved.status = 'active'
+        resolved.save()
+        self.assertEqual(self.badge(self.teacher), 4)
+        self.assertInSync()
+
+        self.assertEqual(inbox.close_alerts(Alert.objects.filter(pk__in=[resolved.pk, closed.pk]), 'resolved'), 2)
+        self.assertEqual(inbox.close_alerts(Alert.objects.filter(pk=closed.pk), 'resolved'), 0)
+        self.assertEqual(self.badge(self.teacher), 2)
+        self.assertInSync()
+
+        Alert.objects.filter(pk=overdue.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(inbox.expire_overdue_alerts(), 1)
+        self.assertEqual(inbox.expire_overdue_alerts(), 0)
+        self.assertEqual(self.badge(self.teacher), 1)
+        self.assertInSync()
+
+    def test_delete_and_reconcile(self):
+        from django.core.management import call_command
+
+        kept = self.alert(target_user_types=['teacher', 'parent'])
+        deleted = self.alert(target_user_types=['teacher'])
+        acknowledged = self.alert(target_user_types=['teacher'])
+        inbox.mark_acknowledged(self.teacher, [acknowledged.id])
+        self.assertEqual(self.badge(self.teacher), 2)
+
+        deleted.delete()
+        acknowledged.delete()
+        self.assertEqual(self.badge(self.teacher), 1)
+        self.assertInSync()
+
+        AlertUnreadCounter.objects.update(unread=7)
+        Alert.objects.filter(pk=kept.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('reconcile_alert_counters', stdout=StringIO())
+        self.assertEqual((self.badge(self.teacher), self.badge(self.parent)), (0, 0))
+        self.assertInSync()
+
+
+
+class MyAlertsTests(AlertTestCase):
+    def test_totals_only_on_request(self):
+        for priority in ('low', 'high', 'high'):
+            self.alert(target_user_types=['teacher'], priority=priority)
+        inbox.mark_acknowledged(self.teacher, [Alert.objects.filter(priority='low').get().id])
+        client = self.client_for(self.teacher)
+
+        listing = client.get('/alerts/my-alerts/', {'limit': 1}).data
+        self.assertEqual(len(listing['alerts']), 1)
+        self.assertEqual(listing['unacknowledged_count'], 2)
+        self.assertNotIn('total_count', listing)
+
+        listing = client.get('/alerts/my-alerts/', {'totals': 1, 'priority': 'high'}).data
+        self.assertEqual(listing['total_count'], 2)
+        listing = client.get('/alerts/my-alerts/', {'totals': 1}).data
+        self.assertEqual(listing['total_count'], 3)
+
+    def listing_queries(self, alert_count):
+        """Queries one my-alerts page takes for the parent with alert_count alerts"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for index in range(alert_count):
+            student = Student.objects.create(
+                user=User.objects.create(username=f'kid-{alert_count}-{index}', user_type='student'),
+                grade='5', parent=self.parent.parent
+            )
+            alert = self.alert(student=student, target_user_types=['teacher'], created_by=self.teacher)
+            alert.target_users.add(self.admin, self.other_parent)
+            AlertAcknowledgement.objects.create(alert=alert, user=self.teacher)
+        client = self.client_for(self.parent)
+        with CaptureQueriesContext(connection) as queries:
+            listing = client.get('/alerts/my-alerts/').data
+        self.assertEqual(len(listing['alerts']), alert_count)
+        self.assertEqual(listing['alerts'][0]['acknowledgement_count'], 1)
+        self.assertNotIn('target_users', listing['alerts'][0])
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        single = self.listing_queries(1)
+        AlertInbox.objects.all().delete()
+        self.assertEqual(self.listing_queries(20), single)
+
+    def test_page_takes_three_queries(self):
+        self.alert(student=self.student)
+        client = self.client_for(self.parent)
+        # page, acknowledgement counts, unread counter
+        with self.assertNumQueries(3):
+            client.get('/alerts/my-alerts/')
+
+class AlertStreamResumeTests(AlertTestCase):
+    def test_replay_includes_lower_ids_that_committed_late(self):
+        from .views import _missed_events
+
+        old = self.alert(target_user_types=['teacher'])
+        AlertInbox.objects.filter(alert=old).update(created_at=timezone.now() - timedelta(hours=1))
+        late = self.alert(target_user_types=['teacher'])
+        seen = self.alert(target_user_types=['teacher'])
+        newer = self.alert(target_user_types=['teacher'])
+        last_event_id = AlertInbox.objects.get(alert=seen).id
+
+        events, truncated = _missed_events(self.teacher, last_event_id, 200)
+        self.assertFalse(truncated)
+        self.assertEqual([event['alert_id'] for event in events], [late.id, newer.id])
+
+    def test_live_events_skip_only_what_the_replay_sent(self):
+        import asyncio
+        from .streaming import alert_broadcaster
+        from .views import _alert_stream
+
+        async def run():
+            subscription = alert_broadcaster.subscribe(asyncio.get_running_loop(), self.teacher.id)
+            stream = _alert_stream(subscription, [], {5})
+            await stream.__anext__()
+            subscription._offer([
+                {'event': 'alert', 'id': 5, 'priority': 'low'},
+                {'event': 'alert', 'id': 3, 'priority': 'low'},
+            ])
+            chunk = await stream.__anext__()
+            await stream.aclose()
+            return chunk
+
+        chunk = asyncio.run(run())
+        self.assertIn('id: 3\n', chunk)
+        self.assertNotIn('id: 5\n', chunk)
+
+
+class BulkAlertTests(AlertTestCase):
+    def test_bulk_transport_alerts_reach_each_family(self):
+        response = self.client_for(self.admin).post(
+            '/alerts/transport/bulk/', {'alert_type': 'bus_boarded', 'student_ids': [self.student.pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(AlertInbox.objects.filter(user=self.parent, alert_id=response.data['alert_ids'][0]).exists())
+        self.assertInSync()
+
+    def test_malformed_ids_are_rejected(self):
+        client = self.client_for(self.admin)
+        for payload in ({'student_ids': ['abc']}, {'student_ids': [None]}, {'route_id': 'x'}, {'route_id': [1]}):
+            response = client.post('/alerts/transport/bulk/', {'alert_type': 'bus_boarded', **payload}, format='json')
+            self.assertEqual(response.status_code, 400, payload)
+            response = client.post('/alerts/academic/bulk/', {'issue_type': 'grades', **payload}, format='json')
+            self.assertEqual(response.status_code, 400, payload)
+
+
+class AlertTemplateTests(AlertTestCase):
+    def test_emergency_alert_text_is_not_html_escaped(self):
+        response = self.client_for(self.admin).post('/alerts/emergency/', {
+            'template': 'medical_emergency', 'student_id': self.student.pk,
+            'custom_data': {'hospital': 'St. Mary & Joseph'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Medical Emergency Alert - Liam O'Brien", response.data['alert']['title'])
+        self.assertIn('taken to St. Mary & Joseph.', response.data['alert']['message'])
+
+    def test_render_many_matches_render(self):
+        from .templating import render, render_many
+
+        contexts = [{'name': "O'Brien & Sons"}, {'name': '<b>'}]
+        rendered = render_many(('test', 'many'), 'Hi {{ name }}', contexts)
+        self.assertEqual(rendered, ["Hi O'Brien & Sons", 'Hi <b>'])
+        self.assertEqual(rendered, [render(('test', 'one'), 'Hi {{ name }}', context) for context in contexts])
+
+    def test_concurrent_edits_get_distinct_versions(self):
+        AlertTemplate.objects.create(
+            name='Pickup', alert_type='transport_safety', title_template='Pickup {{ name }}', message_template='v1'
+        )
+        first, second = AlertTemplate.objects.all()[0], AlertTemplate.objects.all()[0]
+        self.assertEqual(first.create_alert({'name': 'A'}, self.admin).message, 'v1')
+
+        first.message_template = 'v2'
+        first.save()
+        second.message_template = 'v3'
+        second.save()
+        self.assertEqual((first.version, second.version), (2, 3))
+
+        latest = AlertTemplate.objects.get(pk=first.pk)
+        self.assertEqual(latest.create_alert({'name': 'A'}, self.admin).message, 'v3')
+        self.assertEqual(first.create_alert({'name': 'A'}, self.admin).message, 'v2')
+
+    def test_saving_a_new_row_with_an_explicit_pk(self):
+        template = AlertTemplate(pk=42, name='Fixture', alert_type='system', title_template='t', message_template='m')
+        template.save()
+        self.assertEqual(AlertTemplate.objects.get(pk=42).version, 1)
 
-# Create your tests here.
+        AlertTemplate.objects.filter(pk=42).delete()
+        AlertTemplate(pk=42, name='Fixture', alert_type='system', title_template='t', message_template='m').save(
+            force_insert=True
+        )
+        template = AlertTemplate.objects.get(pk=42)
+        template.save()
+        self.assertEqual((template.version, AlertTemplate.objects.get(pk=42).version), (2, 2))
@@ -6,8 +6,11 @@ app_name = 'alerts'
 urlpatterns = [
     # Alert management
     path('my-alerts/', views.get_my_alerts, name='my-alerts'),
+    path('unread-count/', views.get_unread_count, name='unread-count'),
+    path('stream/', views.stream_my_alerts, name='stream-my-alerts'),
     path('create/', views.create_alert, name='create-alert'),
     path('<int:alert_id>/acknowledge/', views.acknowledge_alert, name='acknowledge-alert'),
+    path('acknowledge/bulk/', views.bulk_acknowledge_alerts, name='bulk-acknowledge-alerts'),
     
     # Specialized alert endpoints
     path('emergency/', views.create_emergency_alert, name='create-emergency-alert'),
@@ -15,6 +18,8 @@ urlpatterns = [
     path('parent-meeting/', views.create_parent_meeting_alert, name='create-parent-meeting-alert'),
     path('transport/', views.create_transport_alert, name='create-transport-alert'),
     path('academic/', views.create_academic_alert, name='create-academic-alert'),
+    path('transport/bulk/', views.create_bulk_transport_alerts, name='create-bulk-transport-alerts'),
+    path('academic/bulk/', views.create_bulk_academic_alerts, name='create-bulk-academic-alerts'),
     
     # Templates
     path('templates/', views.get_alert_templates, name='alert-templates'),
@@ -1,13 +1,27 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Alert, AlertAcknowledgement, AlertTemplate
+from . import inbox, templating
+from .models import Alert, AlertAcknowledgement, AlertInbox, AlertTemplate
+from .streaming import alert_broadcaster, alert_event
 from .serializers import *
 from accounts.permissions import IsStudent, IsTeacher, IsParent, IsAdmin
+from smart_system.pagination import get_page_size, next_page_url, paginate_keyset
+
+INBOX_ORDERING = ['priority_rank', '-created_at', '-id']
 
 # Pre-defined alert messages for common scenarios
 ALERT_TEMPLATES = {
@@ -30,6 +44,32 @@ ALERT_TEMPLATES = {
         'type': 'transport_safety',
         'priority': 'emergency'
     },
+    'bus_sos': {
+        'title': "BUS SOS EMERGENCY - {{plate_number}}",
+        'message': "URGENT: The driver of bus {{plate_number}} ({{driver_name}}) on route {{route_name}} has raised an SOS at {{time}}. Last known location: {{location}}. The school is responding; please keep your phone available.",
+        'type': 'transport_safety',
+        'priority': 'emergency'
+    },
+    
+    # Transport Events (raised by transport.geofence)
+    'bus_arrived_school': {
+        'title': "Bus Arrived - {{student_name}}",
+        'message': "The bus carrying {{student_name}} has arrived at school at {{time}}",
+        'type': 'transport_safety',
+        'priority': 'medium'
+    },
+    'bus_departed_school': {
+        'title': "Bus Departed - {{student_name}}",
+        'message': "The bus carrying {{student_name}} has departed from school at {{time}}",
+        'type': 'transport_safety',
+        'priority': 'medium'
+    },
+    'bus_at_stop': {
+        'title': "Bus At Stop - {{student_name}}",
+        'message': "The bus for {{student_name}} has arrived at {{stop_name}} at {{time}}",
+        'type': 'transport_safety',
+        'priority': 'medium'
+    },
     
     # Financial Transparency Alerts
     'financial_irregularity': {
@@ -78,37 +118,188 @@ ALERT_TEMPLATES = {
 @permission_classes([permissions.IsAuthenticated])
 def get_my_alerts(request):
     """
-    Get alerts relevant to the current user
+    Get alerts relevant to the current user, most urgent first
+    
+    Query parameters:
+    - type: alert type filter
+    - priority: priority filter
+    - limit: page size (defaults to PAGE_SIZE)
+    - cursor: the 'next' cursor of the previous page
+    - totals: 1 to also return total_count, which counts every matching alert
+    
+    unacknowledged_count is the user's unread badge count.
     """
     user = request.user
     
-    # Base queryset - active alerts that haven't expired
-    alerts = Alert.objects.filter(status='active').exclude(
-        expires_at__lt=timezone.now()
+    # Active, unexpired alerts from the user's inbox
+    entries = AlertInbox.objects.filter(user=user, alert__status='active').exclude(
+        alert__expires_at__lt=timezone.now()
     )
     
-    # Filter alerts for this user
-    alerts = alerts.filter(
-        Q(target_users=user) |
-        Q(target_user_types__contains=[user.user_type]) |
-        Q(student__parent__user=user) |  # Parent gets child's alerts
-        Q(student__user=user)  # Student gets their own alerts
-    ).distinct()
-    
-    # Priority ordering: emergency -> high -> medium -> low
-    priority_order = {'emergency': 0, 'high': 1, 'medium': 2, 'low': 3}
-    alerts = sorted(alerts, key=lambda x: priority_order[x.priority])
+    alert_type = request.GET.get('type')
+    if alert_type:
+        entries = entries.filter(alert_type=alert_type)
+    priority = request.GET.get('priority')
+    if priority:
+        if priority not in Alert.PRIORITY_RANK:
+            return Response({
+                'error': f"priority must be one of {', '.join(Alert.PRIORITY_RANK)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        entries = entries.filter(priority_rank=Alert.PRIORITY_RANK[priority])
     
-    serializer = AlertSerializer(alerts, many=True, context={'request': request})
+    # Priority ordering: emergency -> high -> medium -> low, newest first within each
+    page_entries = entries.select_related('alert__created_by', 'alert__student__user')
+    try:
+        page, next_cursor = paginate_keyset(
+            page_entries, INBOX_ORDERING,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request)
+        )
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Count unacknowledged alerts
-    unacknowledged_count = sum(1 for alert in alerts if not alert.acknowledgements.filter(user=user).exists())
+    acknowledgement_counts = dict(
+        AlertAcknowledgement.objects.filter(alert_id__in=[entry.alert_id for entry in page])
+        .values('alert_id').annotate(count=Count('id')).values_list('alert_id', 'count')
+    )
+    alerts = []
+    for entry in page:
+        alert = entry.alert
+        alert.user_acknowledged = entry.acknowledged
+        alert.acknowledgement_count = acknowledgement_counts.get(alert.id, 0)
+        alerts.append(alert)
     
-    return Response({
+    serializer = AlertListSerializer(alerts, many=True, context={'request': request})
+    data = {
         'alerts': serializer.data,
-        'unacknowledged_count': unacknowledged_count,
-        'total_count': len(alerts)
-    })
+        'next': next_page_url(request, next_cursor),
+        'unacknowledged_count': inbox.unread_count(user)
+    }
+    # Counting scans the whole inbox, so only on request
+    if request.GET.get('totals') in ('1', 'true'):
+        data['total_count'] = entries.count()
+    
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_unread_count(request):
+    """
+    Get the current user's unread alert badge count
+    """
+    return Response({'unread_count': inbox.unread_count(request.user)})
+
+def _authenticate(request):
+    """Resolve the JWT user for views that run outside DRF"""
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+def _missed_events(user, last_event_id, limit):
+    """
+    Inbox entries the client may not have seen as alert events, and whether
+    there were more.
+    
+    Entry ids follow insert order, not commit order: an entry written by a
+    long transaction (an SOS fan-out, say) can commit after a higher id was
+    already sent. Besides everything after last_event_id, entries with lower
+    ids created within ALERT_STREAM_REPLAY_WINDOW seconds before it are
+    sent again; clients drop alert ids they already have.
+    """
+    window = timedelta(seconds=getattr(settings, 'ALERT_STREAM_REPLAY_WINDOW', 60))
+    missed = Q(id__gt=last_event_id)
+    anchor = (
+        AlertInbox.objects.filter(user=user, id__lte=last_event_id)
+        .order_by('-id').values_list('created_at', flat=True).first()
+    )
+    if anchor is not None:
+        missed |= Q(id__lt=last_event_id, created_at__gte=anchor - window)
+    entries = AlertInbox.objects.filter(missed, user=user, alert__status='active').exclude(
+        alert__expires_at__lt=timezone.now()
+    ).select_related('alert').order_by('id')[:limit + 1]
+    events = [alert_event(entry.id, entry.alert) for entry in entries]
+    return events[:limit], len(events) > limit
+
+def _sse(event):
+    event = dict(event)
+    name = event.pop('event')
+    entry_id = event.get('id') if name == 'alert' else None
+    prefix = f"id: {entry_id}\n" if entry_id is not None else ''
+    return f"{prefix}event: {name}\ndata: {json.dumps(event)}\n\n"
+
+async def _alert_stream(subscription, opening, replayed):
+    heartbeat = getattr(settings, 'ALERT_STREAM_HEARTBEAT', 15)
+    batch_interval = getattr(settings, 'ALERT_STREAM_BATCH_INTERVAL', 2)
+    try:
+        yield ''.join(_sse(event) for event in opening)
+        while True:
+            batch = await subscription.next_batch(heartbeat)
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+            chunk = []
+            for event in batch:
+                if event['event'] == 'alert' and event['id'] in replayed:
+                    # Published while the replay was read, so already sent
+                    continue
+                chunk.append(_sse(event))
+            if chunk:
+                yield ''.join(chunk)
+            # Gather a burst into the next write; emergencies cut the wait short
+            await subscription.pause(batch_interval)
+    finally:
+        alert_broadcaster.unsubscribe(subscription)
+
+async def stream_my_alerts(request):
+    """
+    Server-sent event stream of the current user's alerts (requires an ASGI server).
+    
+    Sends 'alert' events for new alerts, with the inbox entry id as the event
+    id, and 'acknowledged' events when the user acknowledges alerts elsewhere.
+    Reconnecting with a Last-Event-ID header (or ?last_event_id=) replays the
+    alerts delivered since, plus a short window of earlier ones that may
+    have committed late, so clients should ignore alert ids they already
+    have. A 'sync' event with the unread count follows the replay, and
+    'resync' means too much was missed and the client should reload its
+    first page of alerts instead.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+    
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=400)
+    
+    # Subscribe before reading the inbox so nothing falls in between
+    subscription = alert_broadcaster.subscribe(asyncio.get_running_loop(), user.id)
+    try:
+        opening = []
+        replayed = set()
+        if last_event_id:
+            limit = getattr(settings, 'ALERT_STREAM_REPLAY_LIMIT', 200)
+            missed, truncated = await sync_to_async(_missed_events)(user, last_event_id, limit)
+            if truncated:
+                opening.append({'event': 'resync'})
+            else:
+                opening.extend(missed)
+                replayed = {event['id'] for event in missed}
+        unread = await sync_to_async(inbox.unread_count)(user)
+        opening.append({'event': 'sync', 'unread_count': unread})
+    except Exception:
+        alert_broadcaster.unsubscribe(subscription)
+        raise
+    
+    response = StreamingHttpResponse(
+        _alert_stream(subscription, opening, replayed),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsTeacher | IsAdmin])
@@ -134,45 +325,39 @@ def acknowledge_alert(request, alert_id):
     """
     Acknowledge an alert
     """
-    try:
-        alert = Alert.objects.get(id=alert_id, status='active')
-        
-        # Check if user has permission to acknowledge this alert
-        user = request.user
-        has_access = (
-            alert.target_users.filter(id=user.id).exists() or
-            user.user_type in alert.target_user_types or
-            (user.user_type == 'parent' and alert.student and alert.student.parent.user == user) or
-            (user.user_type == 'student' and alert.student and alert.student.user == user)
-        )
-        
-        if not has_access:
-            return Response({
-                'error': 'You do not have permission to acknowledge this alert'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Check if already acknowledged
-        if alert.acknowledgements.filter(user=user).exists():
-            return Response({
-                'error': 'Alert already acknowledged'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        serializer = AcknowledgeAlertSerializer(data=request.data)
-        if serializer.is_valid():
+    user = request.user
+    if not Alert.objects.filter(id=alert_id, status='active').exists():
+        return Response({
+            'error': 'Alert not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Only recipients have an inbox entry for the alert
+    entry = AlertInbox.objects.filter(user=user, alert_id=alert_id).first()
+    if entry is None:
+        return Response({
+            'error': 'You do not have permission to acknowledge this alert'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if entry.acknowledged:
+        return Response({
+            'error': 'Alert already acknowledged'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = AcknowledgeAlertSerializer(data=request.data)
+    if serializer.is_valid():
+        with transaction.atomic():
             AlertAcknowledgement.objects.create(
-                alert=alert,
+                alert_id=alert_id,
                 user=user,
                 notes=serializer.validated_data.get('notes', '')
             )
-            
-            return Response({
-                'message': 'Alert acknowledged successfully'
-            })
-    
-    except Alert.DoesNotExist:
+            inbox.mark_acknowledged(user, [alert_id])
+        
         return Response({
-            'error': 'Alert not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+            'message': 'Alert acknowledged successfully'
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsTeacher | IsAdmin])
@@ -186,7 +371,7 @@ def create_emergency_alert(request):
     
     try:
         from accounts.models import Student
-        student = Student.objects.get(id=student_id) if student_id else None
+        student = Student.objects.get(pk=student_id) if student_id else None
         
         if alert_template not in ALERT_TEMPLATES:
             return Response({
@@ -207,8 +392,8 @@ def create_emergency_alert(request):
         
         # Create alert from template
         alert = Alert.objects.create(
-            title=template['title'].format(**context),
-            message=template['message'].format(**context),
+            title=templating.render(templating.builtin_key(alert_template, 'title'), template['title'], context),
+            message=templating.render(templating.builtin_key(alert_template, 'message'), template['message'], context),
             alert_type=template['type'],
             priority=template['priority'],
             student=student,
@@ -281,7 +466,7 @@ def create_parent_meeting_alert(request):
     
     try:
         from accounts.models import Student
-        student = Student.objects.get(id=student_id)
+        student = Student.objects.get(pk=student_id)
         
         priority_map = {'low': 'low', 'medium': 'medium', 'high': 'high', 'urgent': 'high'}
         
@@ -308,6 +493,85 @@ def create_parent_meeting_alert(request):
             'error': 'Student not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+def _transport_alert(student, alert_type, created_by, now):
+    """Unsaved transport alert about a student, or None for an unknown alert_type"""
+    name = student.user.get_full_name()
+    if alert_type == 'bus_boarded':
+        return Alert(
+            title=f"Bus Safety - {name}",
+            message=f"{name} has safely boarded the bus at {student.bus_stop} at {now.strftime('%H:%M')}",
+            alert_type='transport_safety',
+            priority='medium',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent'],
+            expires_at=now + timedelta(hours=12)
+        )
+    elif alert_type == 'bus_departed':
+        return Alert(
+            title=f"Bus Departed - {name}",
+            message=f"The bus carrying {name} has departed from school. Expected arrival: {now + timedelta(minutes=45)}",
+            alert_type='transport_safety',
+            priority='medium',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent'],
+            expires_at=now + timedelta(hours=6)
+        )
+    elif alert_type == 'bus_delayed':
+        return Alert(
+            title=f"Bus Delayed - {name}",
+            message=f"Bus for {name} is delayed. Expected delay: 30 minutes. Student is safe at school.",
+            alert_type='transport_safety',
+            priority='medium',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent']
+        )
+    return None
+
+def _academic_alert(student, issue_type, created_by):
+    """Unsaved academic alert about a student, or None when the issue doesn't apply"""
+    name = student.user.get_full_name()
+    if issue_type == 'attendance' and student.attendance_rate < 80:
+        return Alert(
+            title=f"Attendance Concern - {name}",
+            message=f"{name} has low attendance rate: {student.attendance_rate}%. This affects academic progress.",
+            alert_type='attendance',
+            priority='high',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent'],
+            action_required=True,
+            action_text="View Attendance Details",
+            action_url=f"/student/{student.pk}/attendance"
+        )
+    elif issue_type == 'grades' and student.average_grade < 50:
+        return Alert(
+            title=f"Academic Performance - {name}",
+            message=f"{name} is struggling academically. Current average: {student.average_grade}%. Additional support recommended.",
+            alert_type='academic_performance',
+            priority='high',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent'],
+            action_required=True,
+            action_text="View Academic Report",
+            action_url=f"/student/{student.pk}/grades"
+        )
+    elif issue_type == 'behavior':
+        return Alert(
+            title=f"Behavioral Concern - {name}",
+            message=f"{name} has behavioral incidents requiring attention. Please contact school counselor.",
+            alert_type='behavior',
+            priority='high',
+            student=student,
+            created_by=created_by,
+            target_user_types=['parent'],
+            action_required=True
+        )
+    return None
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsTeacher | IsAdmin])
 def create_transport_alert(request):
@@ -319,40 +583,14 @@ def create_transport_alert(request):
     
     try:
         from accounts.models import Student
-        student = Student.objects.get(id=student_id)
+        student = Student.objects.select_related('user').get(pk=student_id)
         
-        if alert_type == 'bus_boarded':
-            alert = Alert.objects.create(
-                title=f"Bus Safety - {student.user.get_full_name()}",
-                message=f"{student.user.get_full_name()} has safely boarded the bus at {student.bus_stop} at {timezone.now().strftime('%H:%M')}",
-                alert_type='transport_safety',
-                priority='medium',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent'],
-                expires_at=timezone.now() + timedelta(hours=12)
-            )
-        elif alert_type == 'bus_departed':
-            alert = Alert.objects.create(
-                title=f"Bus Departed - {student.user.get_full_name()}",
-                message=f"The bus carrying {student.user.get_full_name()} has departed from school. Expected arrival: {timezone.now() + timedelta(minutes=45)}",
-                alert_type='transport_safety',
-                priority='medium',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent'],
-                expires_at=timezone.now() + timedelta(hours=6)
-            )
-        elif alert_type == 'bus_delayed':
-            alert = Alert.objects.create(
-                title=f"Bus Delayed - {student.user.get_full_name()}",
-                message=f"Bus for {student.user.get_full_name()} is delayed. Expected delay: 30 minutes. Student is safe at school.",
-                alert_type='transport_safety',
-                priority='medium',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent']
-            )
+        alert = _transport_alert(student, alert_type, request.user, timezone.now())
+        if alert is None:
+            return Response({
+                'error': 'alert_type must be bus_boarded, bus_departed or bus_delayed'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        alert.save()
         
         return Response({
             'message': 'Transport alert created successfully',
@@ -375,45 +613,14 @@ def create_academic_alert(request):
     
     try:
         from accounts.models import Student
-        student = Student.objects.get(id=student_id)
+        student = Student.objects.select_related('user').get(pk=student_id)
         
-        if issue_type == 'attendance' and student.attendance_rate < 80:
-            alert = Alert.objects.create(
-                title=f"Attendance Concern - {student.user.get_full_name()}",
-                message=f"{student.user.get_full_name()} has low attendance rate: {student.attendance_rate}%. This affects academic progress.",
-                alert_type='attendance',
-                priority='high',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent'],
-                action_required=True,
-                action_text="View Attendance Details",
-                action_url=f"/student/{student.id}/attendance"
-            )
-        elif issue_type == 'grades' and student.average_grade < 50:
-            alert = Alert.objects.create(
-                title=f"Academic Performance - {student.user.get_full_name()}",
-                message=f"{student.user.get_full_name()} is struggling academically. Current average: {student.average_grade}%. Additional support recommended.",
-                alert_type='academic_performance',
-                priority='high',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent'],
-                action_required=True,
-                action_text="View Academic Report",
-                action_url=f"/student/{student.id}/grades"
-            )
-        elif issue_type == 'behavior':
-            alert = Alert.objects.create(
-                title=f"Behavioral Concern - {student.user.get_full_name()}",
-                message=f"{student.user.get_full_name()} has behavioral incidents requiring attention. Please contact school counselor.",
-                alert_type='behavior',
-                priority='high',
-                student=student,
-                created_by=request.user,
-                target_user_types=['parent'],
-                action_required=True
-            )
+        alert = _academic_alert(student, issue_type, request.user)
+        if alert is None:
+            return Response({
+                'error': 'No alert needed for this issue_type and student'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        alert.save()
         
         return Response({
             'message': 'Academic alert created successfully',
@@ -425,6 +632,165 @@ def create_academic_alert(request):
             'error': 'Student not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+def _bulk_students(request):
+    """
+    Students named by student_ids or riding route_id, or an error Response.
+    
+    Route riders are matched on Student.bus_route holding the route's name
+    or id, as elsewhere in transport.
+    """
+    from accounts.models import Student
+    
+    student_ids = request.data.get('student_ids')
+    route_id = request.data.get('route_id')
+    if student_ids is not None:
+        if not isinstance(student_ids, list) or not student_ids:
+            return None, Response({'error': 'student_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            student_ids = {int(student_id) for student_id in student_ids}
+        except (TypeError, ValueError):
+            return None, Response({'error': 'student_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        students = Student.objects.filter(pk__in=student_ids)
+    elif route_id is not None:
+        from transport.models import Route
+        
+        try:
+            route_id = int(route_id)
+        except (TypeError, ValueError):
+            return None, Response({'error': 'route_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        route = Route.objects.filter(id=route_id).values_list('id', 'name').first()
+        if route is None:
+            return None, Response({'error': 'Route not found'}, status=status.HTTP_404_NOT_FOUND)
+        students = Student.objects.filter(Q(bus_route__iexact=route[1]) | Q(bus_route=str(route[0])))
+    else:
+        return None, Response({'error': 'student_ids or route_id required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    max_students = getattr(settings, 'ALERT_BULK_MAX_STUDENTS', 2000)
+    students = list(students.select_related('user')[:max_students + 1])
+    if len(students) > max_students:
+        return None, Response({'error': f'At most {max_students} students per request'}, status=status.HTTP_400_BAD_REQUEST)
+    return students, None
+
+def _create_bulk(alerts):
+    """Insert alerts in one statement per batch and deliver them to their inboxes"""
+    with transaction.atomic():
+        Alert.objects.bulk_create(alerts, batch_size=500)
+        inbox.deliver(alerts, include_target_users=False)
+    return alerts
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacher | IsAdmin])
+def create_bulk_transport_alerts(request):
+    """
+    Create one transport alert per student in a single request
+    
+    Expected POST data:
+    - alert_type: bus_boarded, bus_departed or bus_delayed
+    - student_ids: list of student ids, or
+    - route_id: a transport route; every student riding it gets an alert
+    """
+    alert_type = request.data.get('alert_type')
+    if alert_type not in ('bus_boarded', 'bus_departed', 'bus_delayed'):
+        return Response({
+            'error': 'alert_type must be bus_boarded, bus_departed or bus_delayed'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    students, error = _bulk_students(request)
+    if error is not None:
+        return error
+    
+    now = timezone.now()
+    alerts = [_transport_alert(student, alert_type, request.user, now) for student in students]
+    _create_bulk(alerts)
+    
+    return Response({
+        'message': f'{len(alerts)} transport alerts created successfully',
+        'created': len(alerts),
+        'alert_ids': [alert.id for alert in alerts]
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacher | IsAdmin])
+def create_bulk_academic_alerts(request):
+    """
+    Create academic alerts for many students in a single request
+    
+    Expected POST data:
+    - issue_type: attendance, grades or behavior
+    - student_ids: list of student ids, or route_id
+    
+    Students the issue doesn't apply to (e.g. attendance above 80%) are skipped.
+    """
+    issue_type = request.data.get('issue_type')
+    if issue_type not in ('attendance', 'grades', 'behavior'):
+        return Response({
+            'error': 'issue_type must be attendance, grades or behavior'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    students, error = _bulk_students(request)
+    if error is not None:
+        return error
+    
+    alerts = []
+    skipped = []
+    for student in students:
+        alert = _academic_alert(student, issue_type, request.user)
+        if alert is None:
+            skipped.append(student.pk)
+        else:
+            alerts.append(alert)
+    _create_bulk(alerts)
+    
+    return Response({
+        'message': f'{len(alerts)} academic alerts created successfully',
+        'created': len(alerts),
+        'alert_ids': [alert.id for alert in alerts],
+        'skipped_student_ids': skipped
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_acknowledge_alerts(request):
+    """
+    Acknowledge many alerts at once
+    
+    Expected POST data:
+    - alert_ids: list of alert ids
+    - notes: optional, stored on every acknowledgement
+    
+    Alerts the user can't see, that aren't active or that are already
+    acknowledged are reported as skipped.
+    """
+    alert_ids = request.data.get('alert_ids')
+    if not isinstance(alert_ids, list) or not alert_ids:
+        return Response({'error': 'alert_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        alert_ids = {int(alert_id) for alert_id in alert_ids}
+    except (TypeError, ValueError):
+        return Response({'error': 'alert_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = AcknowledgeAlertSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    notes = serializer.validated_data.get('notes', '')
+    
+    user = request.user
+    with transaction.atomic():
+        pending = list(
+            AlertInbox.objects.filter(
+                user=user, alert_id__in=alert_ids, acknowledged=False, alert__status='active'
+            ).values_list('alert_id', flat=True)
+        )
+        AlertAcknowledgement.objects.bulk_create(
+            [AlertAcknowledgement(alert_id=alert_id, user=user, notes=notes) for alert_id in pending],
+            ignore_conflicts=True
+        )
+        inbox.mark_acknowledged(user, pending)
+    
+    return Response({
+        'message': f'{len(pending)} alerts acknowledged',
+        'acknowledged': sorted(pending),
+        'skipped': sorted(alert_ids - set(pending))
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, IsAdmin])
 def get_alert_templates(request):
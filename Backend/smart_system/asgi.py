@@ -3,6 +3,9 @@ ASGI config for smart_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Streaming endpoints such as transport/stream/ need to be served from here
+(e.g. with uvicorn or daphne) rather than through WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination shared by the API apps.
+
+Instead of OFFSET, each page is fetched with a WHERE clause on the sort
+key of the last row already seen, so every page costs the same no matter
+how deep the client scrolls. The sort key must end with a unique field
+(normally the primary key) to keep pages stable.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+MAX_PAGE_SIZE = 200
+
+
+def get_page_size(request):
+    """PAGE_SIZE from the REST_FRAMEWORK settings, overridable with ?limit="""
+    default = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    try:
+        return max(1, min(int(request.GET.get('limit', default)), MAX_PAGE_SIZE))
+    except ValueError:
+        return default
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into its key values, raising ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _field(model, name):
+    """Model field behind an ordering name such as 'created_at' or 'alert__id'"""
+    *relations, last = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.pk if last == 'pk' else model._meta.get_field(last)
+
+
+def _cursor_values(model, ordering, values):
+    """Convert decoded cursor values to their fields' types, raising ValueError on a mismatch"""
+    if len(values) != len(ordering):
+        raise ValueError('Invalid cursor')
+    converted = []
+    for field, value in zip(ordering, values):
+        if value is None:
+            raise ValueError('Invalid cursor')
+        try:
+            converted.append(_field(model, field.lstrip('-')).to_python(value))
+        except (ValidationError, TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+    return converted
+
+
+def _after(ordering, values):
+    """Q matching rows that sort strictly after the given key values"""
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def _key(row, ordering):
+    values = []
+    for field in ordering:
+        value = row[field.lstrip('-')] if isinstance(row, dict) else getattr(row, field.lstrip('-'))
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=20):
+    """
+    Return (rows, next_cursor) for one page of queryset sorted by ordering.
+
+    ordering is a list such as ['-created_at', '-id']; next_cursor is None
+    on the last page. Raises ValueError for a malformed cursor, including
+    one whose values don't fit their fields.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = _cursor_values(queryset.model, ordering, decode_cursor(cursor))
+        queryset = queryset.filter(_after(ordering, values))
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(_key(rows[-1], ordering))
+
+
+def next_page_url(request, next_cursor):
+    if next_cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
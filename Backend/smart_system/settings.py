@@ -164,4 +164,110 @@ cloudinary.config(
     api_secret = config('CLOUDINARY_API_SECRET')
 )
 
-GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
\ No newline at end of file
+GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
+
+# Maps backend: 'google' for the live APIs, 'local' for the deterministic
+# offline stand-in (tests, development, load benchmarks)
+MAPS_PROVIDER = config('MAPS_PROVIDER', default='google')
+MAPS_CONNECT_TIMEOUT = 3  # seconds
+MAPS_READ_TIMEOUT = 5  # seconds
+MAPS_RETRY_TIMEOUT = 10  # total seconds spent retrying one call
+MAPS_MAX_CONCURRENCY = 8  # simultaneous calls (and pooled connections)
+MAPS_QUEUE_TIMEOUT = 2  # seconds to wait for a free slot before failing
+MAPS_BREAKER_THRESHOLD = 5  # consecutive failures that open the circuit
+MAPS_BREAKER_RESET = 30  # seconds before a trial call is let through
+MAPS_LOCAL_CENTER = (-1.2921, 36.8219)  # where the local provider places addresses
+
+# Reverse-geocode cache: coordinates rounded to this many decimal places
+# share one address (4 places is roughly 11 m)
+GEOCODE_CACHE_PRECISION = 4
+GEOCODE_CACHE_TTL = 7 * 24 * 3600  # seconds
+GEOCODE_CACHE_MAX_ENTRIES = 10000
+
+# Maximum number of fixes accepted by one bulk location upload
+TRANSPORT_BULK_MAX_FIXES = 1000
+
+# Deferred address enrichment for transport logs
+ADDRESS_ENRICHMENT_BACKGROUND = True  # run the in-process worker thread
+ADDRESS_ENRICHMENT_BATCH_SIZE = 200
+ADDRESS_ENRICHMENT_RATE = 10  # external lookups per second
+ADDRESS_ENRICHMENT_POLL_INTERVAL = 30  # seconds
+
+# Live bus position stream (server-sent events, served under ASGI)
+TRANSPORT_STREAM_HEARTBEAT = 15  # seconds between keepalive comments
+TRANSPORT_STREAM_MIN_INTERVAL = 1  # seconds between pushes to one client
+
+# In-memory live fleet state
+TRANSPORT_TRACK_BUFFER_SIZE = 120  # recent fixes kept per bus
+TRANSPORT_SYNC_DISTANCE = 50  # metres moved before the Bus row is rewritten
+TRANSPORT_SYNC_INTERVAL = 60  # seconds before a stale Bus row is rewritten
+TRANSPORT_LIVE_STATE_RELOAD = 60  # seconds between reloads from the database
+TRANSPORT_SPATIAL_CELL_SIZE = 500  # metres per grid cell for nearby-bus/stop lookups
+TRANSPORT_SPATIAL_MAX_RADIUS_KM = 50  # largest radius_km/max_km accepted by nearby-bus/stop lookups
+
+# TransportLog retention: location_update rows older than this are
+# compacted into simplified Trajectory rows and deleted
+TRANSPORT_LOG_RETENTION_DAYS = 30
+TRAJECTORY_TOLERANCE_M = 10  # Douglas-Peucker tolerance in metres
+TRAJECTORY_TRIP_GAP = 600  # seconds without fixes that end a trip
+
+# Offline ETA engine
+TRANSPORT_DEFAULT_SPEED = 25  # km/h when a route has no distance/duration
+TRANSPORT_ETA_PRIOR_WEIGHT = 5  # the route's scheduled speed counts as this many fixes
+TRANSPORT_ETA_MIN_SPEED = 5  # km/h floor so stopped buses get a finite ETA
+TRANSPORT_ETA_SPEED_WINDOW = 300  # seconds of recent fixes used for observed speed
+# Local (approximate) distance matrices
+DISTANCE_MATRIX_PRECISION = 5  # decimal places of the memoization key (~1 m)
+DISTANCE_MATRIX_CACHE_SIZE = 256  # memoized matrices
+TRANSPORT_DETOUR_FACTOR = 1.3  # road distance / straight-line distance for time estimates
+
+# Geofences for automatic stop/school arrival and departure events
+TRANSPORT_GEOFENCE_RADIUS = 50  # metres, for waypoints without their own radius/polygon
+TRANSPORT_GEOFENCE_EXIT_MARGIN = 30  # metres outside a fence before a departure counts
+TRANSPORT_GEOFENCE_ALERTS = False  # notify parents of students on the route
+# e.g. {'name': 'School', 'lat': -1.28, 'lng': 36.82, 'radius': 150}
+# or {'name': 'School', 'polygon': [[lat, lng], ...]}
+SCHOOL_GEOFENCE = None
+
+# Driving-anomaly detection on the location feed
+TRANSPORT_SPEED_LIMIT = 50  # km/h for routes without their own speed_limit
+TRANSPORT_SPEEDING_TOLERANCE = 5  # km/h over the limit before speeding is flagged
+TRANSPORT_HARSH_ACCEL = 3.0  # m/s^2
+TRANSPORT_HARSH_BRAKE = 4.0  # m/s^2
+TRANSPORT_ACCEL_MAX_GAP = 10  # seconds; longer gaps between fixes are not checked
+TRANSPORT_STOP_SPEED = 2  # km/h below which a bus counts as stopped
+TRANSPORT_STOP_DURATION = 300  # seconds stopped away from a stop before flagging
+TRANSPORT_GPS_JUMP_SPEED = 150  # km/h implied between fixes
+TRANSPORT_GPS_JUMP_MIN_DISTANCE = 200  # metres
+TRANSPORT_ANOMALY_ALERTS = False  # raise transport-safety alerts for admins
+
+# SOS fan-out: route -> parent recipients are precomputed and refreshed
+# at least this often (seconds), besides on Student/Admin/Route changes
+SOS_RECIPIENTS_TTL = 300
+# Invalidation only reaches the local process, so an SOS rebuilds
+# recipients older than this (seconds) before fanning out
+SOS_RECIPIENTS_MAX_AGE = 5
+
+# Map matching and route progress
+TRANSPORT_MATCH_CELL_SIZE = 200  # metres per cell of the per-route segment index
+TRANSPORT_MATCH_RADIUS = 100  # metres around a fix searched for route segments
+TRANSPORT_MATCH_TOLERANCE = 20  # metres; near-ties go to the segment nearest the last progress
+TRANSPORT_MATCH_MAX_OFFSET = 150  # metres off the route before a fix no longer moves progress
+TRANSPORT_PROGRESS_RESET_M = 500  # a bus this close to the start after being further on begins a new trip
+TRANSPORT_PROGRESS_STALE = 1800  # seconds without fixes before progress starts over
+
+# Downsampled track endpoint
+TRANSPORT_TRACK_DEFAULT_POINTS = 500
+TRANSPORT_TRACK_MAX_POINTS = 5000
+TRANSPORT_TRACK_CACHE_SIZE = 512  # downsampled tracks kept in memory
+TRANSPORT_TRACK_CACHE_TTL = 3600  # seconds, covers late imports and compaction of past days
+
+# Per-user alert streams
+ALERT_STREAM_HEARTBEAT = 15  # seconds between keepalive comments
+ALERT_STREAM_BATCH_INTERVAL = 2  # seconds to gather non-emergency alerts into one write
+ALERT_STREAM_REPLAY_LIMIT = 200  # alerts replayed on resume before asking the client to resync
+ALERT_STREAM_REPLAY_WINDOW = 60  # seconds before Last-Event-ID replayed again, for late commits
+ALERT_BULK_MAX_STUDENTS = 2000  # students per bulk alert request
+
+# Alert templates
+ALERT_TEMPLATE_CACHE_SIZE = 256  # compiled title/message templates kept in memory
@@ -0,0 +1,204 @@
+"""
+Streaming driving-anomaly detection on the location feed.
+
+Each bus keeps a few numbers of state (last position, speed and time, and
+when it stopped), so every fix is checked in O(1) without touching the
+database. Four checks run per fix:
+
+- speeding: speed above the route's speed_limit (or TRANSPORT_SPEED_LIMIT)
+  plus TRANSPORT_SPEEDING_TOLERANCE, flagged once per episode
+- harsh acceleration / braking: change in speed between consecutive fixes
+  beyond TRANSPORT_HARSH_ACCEL / TRANSPORT_HARSH_BRAKE m/s^2
+- prolonged stop: stationary for TRANSPORT_STOP_DURATION seconds away
+  from any stop or school geofence
+- GPS jump: implied speed between fixes above TRANSPORT_GPS_JUMP_SPEED;
+  such fixes are not used for the acceleration check and do not move the
+  bus's last known position, so the next good fix is compared with the
+  track again. Only when a second fix agrees with the jumped-to position
+  is it taken as the bus's new position, without flagging it again.
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+from .geo import haversine_m
+
+Anomaly = namedtuple('Anomaly', 'bus_id kind timestamp latitude longitude value description')
+
+ANOMALY_LABELS = {
+    'speeding': 'Speeding',
+    'harsh_acceleration': 'Harsh acceleration',
+    'harsh_braking': 'Harsh braking',
+    'prolonged_stop': 'Prolonged stop',
+    'gps_jump': 'GPS jump',
+}
+
+
+class _BusState:
+    __slots__ = ('lat', 'lng', 'speed', 'timestamp', 'speeding', 'stopped_since', 'stop_flagged', 'jump')
+
+    def __init__(self, lat, lng, speed, timestamp):
+        self.lat = lat
+        self.lng = lng
+        self.speed = speed
+        self.timestamp = timestamp
+        self.speeding = False
+        self.stopped_since = None
+        self.stop_flagged = False
+        self.jump = None  # (lat, lng, unix time) of the last unconfirmed jump
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self.default_limit = getattr(settings, 'TRANSPORT_SPEED_LIMIT', 50)
+        self.speeding_tolerance = getattr(settings, 'TRANSPORT_SPEEDING_TOLERANCE', 5)
+        self.harsh_accel = getattr(settings, 'TRANSPORT_HARSH_ACCEL', 3.0)
+        self.harsh_brake = getattr(settings, 'TRANSPORT_HARSH_BRAKE', 4.0)
+        self.max_accel_gap = getattr(settings, 'TRANSPORT_ACCEL_MAX_GAP', 10)
+        self.stop_speed = getattr(settings, 'TRANSPORT_STOP_SPEED', 2)
+        self.stop_duration = getattr(settings, 'TRANSPORT_STOP_DURATION', 300)
+        self.jump_speed = getattr(settings, 'TRANSPORT_GPS_JUMP_SPEED', 150)
+        self.jump_distance = getattr(settings, 'TRANSPORT_GPS_JUMP_MIN_DISTANCE', 200)
+
+        self._states = {}
+        self._limits = None  # route_id -> speed limit, loaded on first use
+        self._lock = threading.Lock()
+
+    def invalidate_limits(self):
+        self._limits = None
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._states.pop(bus_id, None)
+
+    def speed_limit(self, route_id):
+        limits = self._limits
+        if limits is None:
+            from .models import Route
+
+            limits = dict(Route.objects.exclude(speed_limit=None).values_list('id', 'speed_limit'))
+            self._limits = limits
+        return limits.get(route_id) or self.default_limit
+
+    def _jumped(self, lat1, lng1, time1, lat2, lng2, time2):
+        """(whether it is a GPS jump, metres, implied km/h) for moving between two fixes"""
+        distance = haversine_m(lat1, lng1, lat2, lng2)
+        implied_kmh = distance / (time2 - time1) * 3.6
+        return implied_kmh > self.jump_speed and distance > self.jump_distance, distance, implied_kmh
+
+    def observe(self, bus_id, route_id, lat, lng, speed, timestamp, at_stop=False):
+        """
+        Feed one fix; returns the anomalies it triggers.
+
+        speed is the reported km/h (None to derive it from the previous
+        fix). at_stop marks fixes inside a stop or school geofence, where
+        standing still is expected. Late fixes are ignored.
+        """
+        limit = self.speed_limit(route_id)
+        lat, lng = float(lat), float(lng)
+        unix_time = timestamp.timestamp()
+        anomalies = []
+
+        def flag(kind, value, description):
+            anomalies.append(Anomaly(bus_id, kind, timestamp, lat, lng, round(value, 1), description))
+
+        with self._lock:
+            state = self._states.get(bus_id)
+            if state is None:
+                self._states[bus_id] = _BusState(lat, lng, speed if speed is not None else 0.0, unix_time)
+                return anomalies
+            elapsed = unix_time - state.timestamp
+            if elapsed <= 0:
+                return anomalies
+
+            jumped, distance, implied_kmh = self._jumped(state.lat, state.lng, state.timestamp, lat, lng, unix_time)
+            relocated = False
+            if jumped and state.jump is not None and unix_time > state.jump[2]:
+                # A second fix near the jumped-to position: the bus is there
+                relocated = not self._jumped(*state.jump, lat, lng, unix_time)[0]
+            if jumped and not relocated:
+                flag('gps_jump', distance, f"Position jumped {distance:.0f} m in {elapsed:.0f} s")
+            if speed is None:
+                speed = state.speed if jumped else implied_kmh
+
+            if speed > limit + self.speeding_tolerance:
+                if not state.speeding:
+                    state.speeding = True
+                    flag('speeding', speed, f"{speed:.0f} km/h in a {limit} km/h limit")
+            elif speed <= limit:
+                state.speeding = False
+
+            if not jumped and elapsed <= self.max_accel_gap:
+                acceleration = (speed - state.speed) / 3.6 / elapsed
+                if acceleration > self.harsh_accel:
+                    flag('harsh_acceleration', acceleration, f"Accelerated at {acceleration:.1f} m/s²")
+                elif -acceleration > self.harsh_brake:
+                    flag('harsh_braking', -acceleration, f"Braked at {-acceleration:.1f} m/s²")
+
+            if speed < self.stop_speed and not at_stop:
+                if state.stopped_since is None:
+                    state.stopped_since = unix_time
+                stopped_for = unix_time - state.stopped_since
+                if stopped_for >= self.stop_duration and not state.stop_flagged:
+                    state.stop_flagged = True
+                    flag('prolonged_stop', stopped_for / 60, f"Stopped for {stopped_for / 60:.0f} min away from a stop")
+            else:
+                state.stopped_since = None
+                state.stop_flagged = False
+
+            if jumped and not relocated:
+                # Keep the last good position until the jump is confirmed
+                state.jump = (lat, lng, unix_time)
+            else:
+                state.lat, state.lng, state.speed, state.timestamp = lat, lng, speed, unix_time
+                state.jump = None
+        return anomalies
+
+
+def record_anomalies(anomalies, actor=None):
+    """
+    Write a TransportLog row per anomaly and, with TRANSPORT_ANOMALY_ALERTS
+    on, a transport-safety alert for admins on behalf of actor. Call inside
+    the caller's transaction.
+    """
+    from .models import TransportLog
+
+    if not anomalies:
+        return []
+    TransportLog.objects.bulk_create([
+        TransportLog(
+            bus_id=anomaly.bus_id,
+            log_type='anomaly',
+            description=f"{ANOMALY_LABELS[anomaly.kind]}: {anomaly.description}",
+            latitude=round(anomaly.latitude, 6),
+            longitude=round(anomaly.longitude, 6),
+            created_at=anomaly.timestamp
+        )
+        for anomaly in anomalies
+    ])
+    if actor is None or not getattr(settings, 'TRANSPORT_ANOMALY_ALERTS', False):
+        return []
+
+    from alerts import inbox
+    from alerts.models import Alert
+    from .models import Bus
+
+    plates = dict(Bus.objects.filter(id__in={a.bus_id for a in anomalies}).values_list('id', 'plate_number'))
+    alerts = [
+        Alert(
+            title=f"{ANOMALY_LABELS[anomaly.kind]} - Bus {plates.get(anomaly.bus_id, anomaly.bus_id)}",
+            message=anomaly.description,
+            alert_type='transport_safety',
+            priority='low' if anomaly.kind == 'gps_jump' else 'high',
+            created_by=actor,
+            target_user_types=['admin'],
+        )
+        for anomaly in anomalies
+    ]
+    Alert.objects.bulk_create(alerts, batch_size=500)
+    inbox.deliver(alerts, include_target_users=False)
+    return alerts
+
+
+anomaly_detector = AnomalyDetector()
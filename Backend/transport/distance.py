@@ -0,0 +1,152 @@
+"""
+Local great-circle distance matrices.
+
+A NumPy-vectorized haversine computes an M x N matrix of straight-line
+distances in one pass, with optional travel-time estimates from a speed
+(or a speed per origin). Results are memoized by coordinates rounded to
+DISTANCE_MATRIX_PRECISION decimal places, and returned in the same shape
+as the Google Distance Matrix API so callers can switch between the
+approximate and exact backends freely.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geo import EARTH_RADIUS_M
+
+
+def parse_coordinates(value):
+    """(lat, lng) from a tuple/list, a {'lat', 'lng'} dict or a 'lat,lng' string"""
+    if isinstance(value, dict):
+        return float(value['lat']), float(value['lng'])
+    if isinstance(value, str):
+        lat, lng = value.split(',')
+        return float(lat), float(lng)
+    lat, lng = value
+    return float(lat), float(lng)
+
+
+def haversine_matrix(origins, destinations):
+    """M x N array of great-circle distances in metres"""
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+
+    lat1 = origins[:, 0:1]
+    lng1 = origins[:, 1:2]
+    lat2 = destinations[:, 0][np.newaxis, :]
+    lng2 = destinations[:, 1][np.newaxis, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimate_durations(distances_m, speed_kmh, detour_factor=None):
+    """
+    Travel time in seconds for a distance matrix.
+
+    speed_kmh is a single speed or one speed per origin row. Straight-line
+    distances are stretched by TRANSPORT_DETOUR_FACTOR to approximate the
+    road network. Raises ValueError when there is not one speed per origin.
+    """
+    detour_factor = detour_factor if detour_factor is not None else getattr(settings, 'TRANSPORT_DETOUR_FACTOR', 1.3)
+    speeds = np.asarray(speed_kmh, dtype=np.float64)
+    if speeds.ndim == 1:
+        # A row per origin; numpy would otherwise broadcast a per-destination length silently
+        if len(speeds) != distances_m.shape[0]:
+            raise ValueError(f'Expected {distances_m.shape[0]} speeds, one per origin, got {len(speeds)}')
+        speeds = speeds[:, np.newaxis]
+    return distances_m * detour_factor / (np.maximum(speeds, 1.0) / 3.6)
+
+
+def _distance_text(metres):
+    return f"{metres / 1000:.1f} km" if metres >= 1000 else f"{metres} m"
+
+
+def _duration_text(minutes):
+    if minutes < 60:
+        return f"{max(minutes, 1)} min" + ("s" if minutes > 1 else "")
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} hour{'s' if hours > 1 else ''} {minutes} min{'s' if minutes != 1 else ''}"
+
+
+class DistanceMatrixCache:
+    def __init__(self, precision=None, max_entries=None):
+        self.precision = precision if precision is not None else getattr(settings, 'DISTANCE_MATRIX_PRECISION', 5)
+        self.max_entries = max_entries or getattr(settings, 'DISTANCE_MATRIX_CACHE_SIZE', 256)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, points):
+        return tuple((round(lat, self.precision), round(lng, self.precision)) for lat, lng in points)
+
+    def distances(self, origins, destinations):
+        """Memoized haversine_matrix (the returned array is read-only)"""
+        key = (self._key(origins), self._key(destinations))
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return matrix
+            self.misses += 1
+
+        matrix = haversine_matrix(key[0], key[1])
+        matrix.setflags(write=False)
+        with self._lock:
+            self._entries[key] = matrix
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return matrix
+
+
+def approximate_distance_matrix(origins, destinations, speed_kmh=None):
+    """
+    Google Distance Matrix-shaped response computed locally.
+
+    origins/destinations accept anything parse_coordinates understands;
+    raises ValueError if one of them is not a coordinate (e.g. an address).
+    """
+    try:
+        origin_points = [parse_coordinates(origin) for origin in origins]
+        destination_points = [parse_coordinates(destination) for destination in destinations]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Approximate distance matrix needs coordinates') from e
+
+    distances = matrix_cache.distances(origin_points, destination_points)
+    if speed_kmh is None:
+        speed_kmh = getattr(settings, 'TRANSPORT_DEFAULT_SPEED', 25)
+    durations = estimate_durations(distances, speed_kmh)
+
+    metres = np.rint(distances).astype(np.int64)
+    seconds = np.rint(durations).astype(np.int64)
+    # Texts only show 100 m / 1 min resolution, so format each distinct value once
+    shown_metres = np.where(metres < 1000, metres, np.rint(metres / 100).astype(np.int64) * 100)
+    shown_minutes = np.rint(durations / 60).astype(np.int64)
+    distance_text = {value: _distance_text(value) for value in np.unique(shown_metres).tolist()}
+    duration_text = {value: _duration_text(value) for value in np.unique(shown_minutes).tolist()}
+
+    rows = []
+    for row in zip(metres.tolist(), seconds.tolist(), shown_metres.tolist(), shown_minutes.tolist()):
+        rows.append({'elements': [
+            {
+                'status': 'OK',
+                'distance': {'value': distance, 'text': distance_text[shown_distance]},
+                'duration': {'value': duration, 'text': duration_text[shown_duration]},
+            }
+            for distance, duration, shown_distance, shown_duration in zip(*row)
+        ]})
+
+    return {
+        'status': 'OK',
+        'approximate': True,
+        'origin_addresses': [f"{lat},{lng}" for lat, lng in origin_points],
+        'destination_addresses': [f"{lat},{lng}" for lat, lng in destination_points],
+        'rows': rows,
+    }
+
+
+matrix_cache = DistanceMatrixCache()
@@ -0,0 +1,149 @@
+"""
+Deferred address enrichment for TransportLog rows.
+
+Location logs are written with an empty address and filled in later, in
+batches, so that GPS ingestion never waits on the maps API. Logs that
+share a geocode cache bucket are resolved with a single lookup, and
+external lookups are limited by a token-bucket rate budget.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .geocache import geocode_cache
+from .models import TransportLog
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """Token bucket limiting external lookups per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available, without blocking"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a token is available"""
+        while not self.try_acquire():
+            time.sleep(1 / self.rate if self.rate > 0 else 1)
+
+
+def pending_logs():
+    """Logs with coordinates whose address has not been resolved yet"""
+    return TransportLog.objects.filter(
+        address='',
+        latitude__isnull=False,
+        longitude__isnull=False
+    )
+
+
+def enrich_pending_addresses(batch_size=None, budget=None, wait=False):
+    """
+    Resolve addresses for one batch of pending logs.
+
+    Cache hits are free; each cache miss spends one token from the budget.
+    When the budget is exhausted the remaining logs stay pending, unless
+    wait is set, in which case the call blocks for tokens instead. A failed
+    lookup ends the batch and leaves its logs pending to be retried.
+    Returns the number of logs updated.
+    """
+    from .services import maps_service
+
+    batch_size = batch_size or getattr(settings, 'ADDRESS_ENRICHMENT_BATCH_SIZE', 200)
+    budget = budget or default_budget
+
+    logs = list(
+        pending_logs().order_by('id').only('id', 'latitude', 'longitude')[:batch_size]
+    )
+
+    groups = {}
+    for log in logs:
+        groups.setdefault(geocode_cache.bucket(log.latitude, log.longitude), []).append(log)
+
+    updated = []
+    for group in groups.values():
+        lat, lng = float(group[0].latitude), float(group[0].longitude)
+        address = geocode_cache.get(lat, lng)
+        if address is None:
+            if wait:
+                budget.acquire()
+            elif not budget.try_acquire():
+                continue
+            address = maps_service.lookup_address(lat, lng)
+            if address is None:
+                # The provider is failing (or its circuit is open): leave
+                # the rest pending for the next poll instead of storing
+                # a failure message as the address
+                break
+
+        for log in group:
+            log.address = address
+        updated.extend(group)
+
+    if updated:
+        TransportLog.objects.bulk_update(updated, ['address'], batch_size=500)
+    return len(updated)
+
+
+class AddressEnricher:
+    """
+    Background worker thread that drains pending logs.
+
+    Views call notify() after committing new logs; the worker also wakes up
+    every ADDRESS_ENRICHMENT_POLL_INTERVAL seconds to retry logs that were
+    left pending because the rate budget ran out.
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        if not getattr(settings, 'ADDRESS_ENRICHMENT_BACKGROUND', True):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='address-enricher', daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        interval = getattr(settings, 'ADDRESS_ENRICHMENT_POLL_INTERVAL', 30)
+        while True:
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            try:
+                while enrich_pending_addresses():
+                    pass
+            except Exception:
+                logger.exception("Address enrichment failed")
+            finally:
+                connection.close()
+
+
+default_budget = RateBudget(getattr(settings, 'ADDRESS_ENRICHMENT_RATE', 10))
+address_enricher = AddressEnricher()
@@ -0,0 +1,247 @@
+"""
+Offline ETA engine built on Route.waypoints.
+
+Each route's waypoint polyline is turned into a RouteGeometry holding the
+cumulative distance to every waypoint and a grid index of its segments, so
+matching a fix only projects it onto the segments passing near it. A bus
+fix is projected onto the polyline to find how far along the route it is
+(see transport.progress for per-bus tracking), and the ETA to each
+downstream stop is the remaining distance divided by an expected speed:
+the route's scheduled average speed (distance / estimated_duration) used
+as a prior, blended with the speeds the bus reported recently.
+"""
+import bisect
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import haversine_m
+
+METRES_PER_DEGREE = 111320.0
+
+
+class RouteGeometry:
+    def __init__(self, route):
+        self.route_id = route.id
+        self.points = []
+        self.names = []
+        for waypoint in route.waypoints or []:
+            try:
+                point = (float(waypoint['lat']), float(waypoint['lng']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.names.append(waypoint.get('name', f'Stop {len(self.points) + 1}'))
+            self.points.append(point)
+
+        self.cumulative = [0.0]
+        for a, b in zip(self.points, self.points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_m(a[0], a[1], b[0], b[1]))
+        self.length_m = self.cumulative[-1]
+        self.cos_lat = math.cos(math.radians(self.points[0][0])) if self.points else 1.0
+
+        if route.estimated_duration and route.distance:
+            self.prior_speed_kmh = float(route.distance) / (route.estimated_duration / 60)
+        else:
+            self.prior_speed_kmh = getattr(settings, 'TRANSPORT_DEFAULT_SPEED', 25)
+
+        self.cell_size_m = getattr(settings, 'TRANSPORT_MATCH_CELL_SIZE', 200)
+        self.cell_deg = self.cell_size_m / METRES_PER_DEGREE
+        self._segment_cells = {}
+        for index in range(len(self.points) - 1):
+            for cell in self._cells_along(index):
+                self._segment_cells.setdefault(cell, []).append(index)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng * self.cos_lat / self.cell_deg)
+
+    def _cells_along(self, index):
+        """Grid cells a segment's bounding box touches"""
+        (a_lat, a_lng), (b_lat, b_lng) = self.points[index], self.points[index + 1]
+        (x1, y1), (x2, y2) = self._cell(a_lat, a_lng), self._cell(b_lat, b_lng)
+        return [
+            (x, y)
+            for x in range(min(x1, x2), max(x1, x2) + 1)
+            for y in range(min(y1, y2), max(y1, y2) + 1)
+        ]
+
+    def candidate_segments(self, lat, lng, radius_m):
+        """Indexes of segments that may lie within radius_m of the point"""
+        center_x, center_y = self._cell(lat, lng)
+        span = math.ceil(radius_m / self.cell_size_m)
+        found = set()
+        for x in range(center_x - span, center_x + span + 1):
+            for y in range(center_y - span, center_y + span + 1):
+                found.update(self._segment_cells.get((x, y), ()))
+        return found
+
+    def project_on_segment(self, index, lat, lng):
+        """Project a point onto segment index; returns (distance_along_m, offset_m)"""
+        (a_lat, a_lng), (b_lat, b_lng) = self.points[index], self.points[index + 1]
+        ax, ay = a_lng * self.cos_lat, a_lat
+        dx, dy = b_lng * self.cos_lat - ax, b_lat - ay
+        px, py = lng * self.cos_lat, lat
+        length_sq = dx * dx + dy * dy
+        t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+        offset = math.hypot(px - (ax + t * dx), py - (ay + t * dy)) * METRES_PER_DEGREE
+        segment_length = self.cumulative[index + 1] - self.cumulative[index]
+        return self.cumulative[index] + t * segment_length, offset
+
+    def project(self, lat, lng, near_m=None):
+        """
+        Closest point on the route as (distance_along_m, offset_m).
+
+        Only segments passing within TRANSPORT_MATCH_RADIUS are considered;
+        when there are several (a route doubling back on itself), the one
+        closest to near_m along the route wins among those nearly as close
+        as the best. Falls back to every segment for fixes far off route.
+        """
+        if len(self.points) < 2:
+            return 0.0, haversine_m(lat, lng, *self.points[0])
+
+        radius = getattr(settings, 'TRANSPORT_MATCH_RADIUS', 100)
+        candidates = self.candidate_segments(lat, lng, radius) or range(len(self.points) - 1)
+        projections = [self.project_on_segment(index, lat, lng) for index in candidates]
+        best = min(projections, key=lambda projection: projection[1])
+        if near_m is None or best[1] > radius:
+            return best
+
+        # Prefer continuity over a marginally closer segment elsewhere on the route
+        tolerance = getattr(settings, 'TRANSPORT_MATCH_TOLERANCE', 20)
+        close = [projection for projection in projections if projection[1] <= best[1] + tolerance]
+        return min(close, key=lambda projection: abs(projection[0] - near_m))
+
+    def point_at(self, distance_along_m):
+        """(lat, lng) at a distance along the route"""
+        if len(self.points) < 2:
+            return self.points[0]
+        distance_along_m = max(0.0, min(distance_along_m, self.length_m))
+        index = min(bisect.bisect_right(self.cumulative, distance_along_m) - 1, len(self.points) - 2)
+        segment = self.cumulative[index + 1] - self.cumulative[index]
+        t = 0.0 if segment == 0 else (distance_along_m - self.cumulative[index]) / segment
+        (a_lat, a_lng), (b_lat, b_lng) = self.points[index], self.points[index + 1]
+        return a_lat + t * (b_lat - a_lat), a_lng + t * (b_lng - a_lng)
+
+    def next_stop(self, distance_along_m):
+        """Index of the first waypoint beyond distance_along_m, or None at the end"""
+        index = bisect.bisect_right(self.cumulative, distance_along_m)
+        return index if index < len(self.points) else None
+
+    def stops_after(self, distance_along_m):
+        """Downstream waypoints as (index, name, lat, lng, remaining_m)"""
+        return [
+            (index, self.names[index], lat, lng, self.cumulative[index] - distance_along_m)
+            for index, (lat, lng) in enumerate(self.points)
+            if self.cumulative[index] > distance_along_m
+        ]
+
+
+class GeometryCache:
+    """RouteGeometry per route id, cleared whenever a Route changes"""
+
+    def __init__(self):
+        self._geometries = {}
+        self._lock = threading.Lock()
+
+    def get(self, route):
+        with self._lock:
+            geometry = self._geometries.get(route.id)
+        if geometry is None:
+            geometry = RouteGeometry(route)
+            with self._lock:
+                self._geometries[route.id] = geometry
+        return geometry
+
+    def get_by_id(self, route_id):
+        """Geometry for a route id, loading the Route only on a miss; None if it doesn't exist"""
+        with self._lock:
+            geometry = self._geometries.get(route_id)
+        if geometry is not None:
+            return geometry
+        from .models import Route
+
+        route = Route.objects.filter(id=route_id).first()
+        return self.get(route) if route is not None else None
+
+    def invalidate(self, route_id=None):
+        with self._lock:
+            if route_id is None:
+                self._geometries.clear()
+            else:
+                self._geometries.pop(route_id, None)
+
+
+def expected_speed_kmh(prior_kmh, observed_kmh):
+    """
+    Blend the route prior with observed speeds.
+
+    The prior counts as TRANSPORT_ETA_PRIOR_WEIGHT observations, so a few
+    fixes nudge the estimate and a steady stream dominates it. Never drops
+    below TRANSPORT_ETA_MIN_SPEED so a parked bus still gets a finite ETA.
+    """
+    weight = getattr(settings, 'TRANSPORT_ETA_PRIOR_WEIGHT', 5)
+    minimum = getattr(settings, 'TRANSPORT_ETA_MIN_SPEED', 5)
+    speed = (prior_kmh * weight + sum(observed_kmh)) / (weight + len(observed_kmh))
+    return max(speed, minimum)
+
+
+def estimate_bus_etas(bus, route=None, distance_along_m=None):
+    """
+    ETA to every downstream stop for a bus snapshot from the live store.
+
+    Returns None when the bus has no route or no position.
+    """
+    from .live import live_state
+
+    if bus.current_latitude is None or bus.current_longitude is None:
+        return None
+    if route is not None:
+        geometry = geometry_cache.get(route)
+    elif bus.current_route_id is not None:
+        geometry = geometry_cache.get_by_id(bus.current_route_id)
+    else:
+        return None
+    if geometry is None or not geometry.points:
+        return None
+
+    lat, lng = float(bus.current_latitude), float(bus.current_longitude)
+    projected_along, offset = geometry.project(lat, lng, near_m=distance_along_m)
+    if distance_along_m is None:
+        distance_along_m = projected_along
+
+    window = getattr(settings, 'TRANSPORT_ETA_SPEED_WINDOW', 300)
+    observed = live_state.recent_speeds(bus.id, time.time() - window)
+    speed_kmh = expected_speed_kmh(geometry.prior_speed_kmh, observed)
+    metres_per_second = speed_kmh / 3.6
+
+    now = timezone.now()
+    stops = []
+    for index, name, stop_lat, stop_lng, remaining in geometry.stops_after(distance_along_m):
+        seconds = remaining / metres_per_second
+        stops.append({
+            'stop_index': index,
+            'name': name,
+            'latitude': stop_lat,
+            'longitude': stop_lng,
+            'distance_m': round(remaining, 1),
+            'eta_seconds': round(seconds),
+            'eta': now + timedelta(seconds=seconds),
+        })
+
+    return {
+        'bus_id': bus.id,
+        'route_id': geometry.route_id,
+        'route_length_m': round(geometry.length_m, 1),
+        'distance_along_m': round(distance_along_m, 1),
+        'off_route_m': round(offset, 1),
+        'speed_kmh': round(speed_kmh, 1),
+        'prior_speed_kmh': round(geometry.prior_speed_kmh, 1),
+        'observed_fixes': len(observed),
+        'stops': stops,
+    }
+
+
+geometry_cache = GeometryCache()
@@ -0,0 +1,67 @@
+"""
+Small geodesy helpers shared by the transport services.
+"""
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres between two points in degrees"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def encode_signed(values):
+    """Encode integers with the Google polyline varint scheme"""
+    chunks = []
+    for value in values:
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def decode_signed(encoded):
+    """Inverse of encode_signed"""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    return values
+
+
+def encode_polyline(points, precision=5):
+    """Encode (lat, lng) pairs as a Google encoded polyline"""
+    scale = 10 ** precision
+    deltas = []
+    previous_lat = previous_lng = 0
+    for lat, lng in points:
+        lat_i, lng_i = round(lat * scale), round(lng * scale)
+        deltas.extend((lat_i - previous_lat, lng_i - previous_lng))
+        previous_lat, previous_lng = lat_i, lng_i
+    return encode_signed(deltas)
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode a Google encoded polyline into (lat, lng) pairs"""
+    scale = 10 ** precision
+    values = decode_signed(encoded)
+    points = []
+    lat = lng = 0
+    for index in range(0, len(values) - 1, 2):
+        lat += values[index]
+        lng += values[index + 1]
+        points.append((lat / scale, lng / scale))
+    return points
@@ -0,0 +1,130 @@
+"""
+Two-tier reverse-geocode cache.
+
+Coordinates are bucketed to a fixed number of decimal places so that a
+parked or crawling bus keeps hitting the same entry. Lookups go to an
+in-process LRU first, then to the GeocodeCacheEntry table, and only then
+to the maps API.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import GeocodeCacheEntry
+
+
+class ReverseGeocodeCache:
+    def __init__(self, precision=None, ttl_seconds=None, max_entries=None):
+        self.precision = precision if precision is not None else getattr(settings, 'GEOCODE_CACHE_PRECISION', 4)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else getattr(settings, 'GEOCODE_CACHE_TTL', 7 * 24 * 3600)
+        self.max_entries = max_entries if max_entries is not None else getattr(settings, 'GEOCODE_CACHE_MAX_ENTRIES', 10000)
+
+        self._entries = OrderedDict()  # bucket -> (address, fetched_at)
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def bucket(self, lat, lng):
+        """Round coordinates to the configured precision as integers"""
+        scale = 10 ** self.precision
+        return round(float(lat) * scale), round(float(lng) * scale)
+
+    def _is_fresh(self, fetched_at):
+        return timezone.now() - fetched_at < timedelta(seconds=self.ttl_seconds)
+
+    def _remember(self, key, address, fetched_at):
+        with self._lock:
+            self._entries[key] = (address, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def peek(self, lat, lng):
+        """Return a fresh in-memory address without touching the database"""
+        key = self.bucket(lat, lng)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self._is_fresh(entry[1]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._stats['memory_hits'] += 1
+            return entry[0]
+
+    def get(self, lat, lng):
+        """Return a cached address, or None if both tiers miss"""
+        address = self.peek(lat, lng)
+        if address is not None:
+            return address
+
+        lat_bucket, lng_bucket = self.bucket(lat, lng)
+        entry = GeocodeCacheEntry.objects.filter(
+            precision=self.precision,
+            lat_bucket=lat_bucket,
+            lng_bucket=lng_bucket,
+            fetched_at__gte=timezone.now() - timedelta(seconds=self.ttl_seconds)
+        ).values_list('address', 'fetched_at').first()
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        self._count('db_hits')
+        self._remember((lat_bucket, lng_bucket), *entry)
+        return entry[0]
+
+    def set(self, lat, lng, address):
+        """Store an address in both tiers"""
+        lat_bucket, lng_bucket = self.bucket(lat, lng)
+        fetched_at = timezone.now()
+        GeocodeCacheEntry.objects.update_or_create(
+            precision=self.precision,
+            lat_bucket=lat_bucket,
+            lng_bucket=lng_bucket,
+            defaults={'address': address, 'fetched_at': fetched_at}
+        )
+        self._remember((lat_bucket, lng_bucket), address, fetched_at)
+
+    def purge_expired(self):
+        """Drop stale entries from both tiers, returns deleted row count"""
+        with self._lock:
+            stale = [key for key, (_, fetched_at) in self._entries.items() if not self._is_fresh(fetched_at)]
+            for key in stale:
+                del self._entries[key]
+
+        deleted, _ = GeocodeCacheEntry.objects.filter(
+            fetched_at__lt=timezone.now() - timedelta(seconds=self.ttl_seconds)
+        ).delete()
+        return deleted
+
+    def clear(self):
+        """Empty the in-process tier and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        hits = stats['memory_hits'] + stats['db_hits']
+        lookups = hits + stats['misses']
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['precision'] = self.precision
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
+
+
+# Shared instance used by the maps service
+geocode_cache = ReverseGeocodeCache()
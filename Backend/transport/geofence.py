@@ -0,0 +1,299 @@
+"""
+Geofence engine for automatic stop and school arrival/departure events.
+
+Every stop in Route.waypoints gets a fence: a circle of
+TRANSPORT_GEOFENCE_RADIUS metres (or the waypoint's own "radius"), or a
+polygon when the waypoint has a "polygon" list of points. SCHOOL_GEOFENCE
+adds a school fence that applies to every route.
+
+Stop fences live in a GridIndex, so each fix is only tested against the
+fences near it and the ones the bus is already inside. A bus enters a
+fence when it is inside it, but only leaves once it is more than
+TRANSPORT_GEOFENCE_EXIT_MARGIN metres outside, so GPS jitter at the edge
+does not produce a stream of arrivals and departures.
+"""
+import math
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .distance import parse_coordinates
+from .geo import haversine_m
+from .spatial import GridIndex
+
+METRES_PER_DEGREE = 111320.0
+
+GeofenceEvent = namedtuple('GeofenceEvent', 'bus_id route_id fence kind timestamp latitude longitude')
+
+
+class Fence:
+    def __init__(self, key, kind, name, lat, lng, radius_m=None, polygon=None, route_id=None, route_name=None):
+        self.key = key
+        self.kind = kind  # 'stop' or 'school'
+        self.name = name
+        self.route_id = route_id
+        self.route_name = route_name
+        self.lat, self.lng = lat, lng
+        self.polygon = polygon
+        self.cos_lat = math.cos(math.radians(lat))
+        if polygon:
+            self.radius_m = max(haversine_m(lat, lng, p_lat, p_lng) for p_lat, p_lng in polygon)
+        else:
+            self.radius_m = radius_m or getattr(settings, 'TRANSPORT_GEOFENCE_RADIUS', 50)
+
+    @classmethod
+    def from_spec(cls, key, kind, spec, default_name='Stop', **kwargs):
+        """Fence from a waypoint-style dict; None if it has no usable position"""
+        polygon = None
+        try:
+            if spec.get('polygon'):
+                polygon = [parse_coordinates(point) for point in spec['polygon']]
+                lat = sum(p[0] for p in polygon) / len(polygon)
+                lng = sum(p[1] for p in polygon) / len(polygon)
+            else:
+                lat, lng = float(spec['lat']), float(spec['lng'])
+            radius = float(spec['radius']) if spec.get('radius') else None
+        except (KeyError, TypeError, ValueError):
+            return None
+        return cls(key, kind, spec.get('name', default_name), lat, lng,
+                   radius_m=radius, polygon=polygon, **kwargs)
+
+    def _xy(self, lat, lng):
+        return lng * self.cos_lat * METRES_PER_DEGREE, lat * METRES_PER_DEGREE
+
+    def _contains_polygon(self, lat, lng):
+        x, y = self._xy(lat, lng)
+        inside = False
+        points = [self._xy(*point) for point in self.polygon]
+        for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+    def _polygon_edge_distance(self, lat, lng):
+        x, y = self._xy(lat, lng)
+        points = [self._xy(*point) for point in self.polygon]
+        best = math.inf
+        for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+            dx, dy = x2 - x1, y2 - y1
+            length_sq = dx * dx + dy * dy
+            t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length_sq))
+            best = min(best, math.hypot(x - (x1 + t * dx), y - (y1 + t * dy)))
+        return best
+
+    def contains(self, lat, lng):
+        if self.polygon:
+            return self._contains_polygon(lat, lng)
+        return haversine_m(self.lat, self.lng, lat, lng) <= self.radius_m
+
+    def has_left(self, lat, lng, margin_m):
+        """True once the point is more than margin_m outside the fence"""
+        if self.polygon:
+            return not self._contains_polygon(lat, lng) and self._polygon_edge_distance(lat, lng) > margin_m
+        return haversine_m(self.lat, self.lng, lat, lng) > self.radius_m + margin_m
+
+
+class GeofenceEngine:
+    """
+    Tracks which fences each bus is inside and turns fixes into events.
+
+    Fences are built lazily from active routes and rebuilt after any Route
+    is saved or deleted. The first fix seen for a bus only records where it
+    is, so a restart does not replay arrivals for buses parked at a stop.
+    """
+
+    def __init__(self):
+        self.index = GridIndex()
+        self.margin_m = getattr(settings, 'TRANSPORT_GEOFENCE_EXIT_MARGIN', 30)
+        self.school_fences = []
+        self._fences = {}
+        self._reach_m = 0.0
+        self._inside = {}  # bus_id -> set of fence keys
+        self._built = False
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._built = False
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._inside.pop(bus_id, None)
+
+    def ensure_built(self):
+        if self._built:
+            return
+        from .models import Route
+
+        with self._lock:
+            if self._built:
+                return
+            self.index.clear()
+            self._fences = {}
+            for route_id, name, waypoints in Route.objects.filter(is_active=True).values_list('id', 'name', 'waypoints'):
+                for position, waypoint in enumerate(waypoints or []):
+                    if not isinstance(waypoint, dict):
+                        continue
+                    fence = Fence.from_spec(
+                        ('stop', route_id, position), 'stop', waypoint,
+                        default_name=f'Stop {position + 1}', route_id=route_id, route_name=name
+                    )
+                    if fence is not None:
+                        self._fences[fence.key] = fence
+                        self.index.insert(fence.key, fence.lat, fence.lng, fence)
+
+            school = getattr(settings, 'SCHOOL_GEOFENCE', None)
+            school_fence = Fence.from_spec(('school',), 'school', school, default_name='School') if school else None
+            self.school_fences = [school_fence] if school_fence else []
+            for fence in self.school_fences:
+                self._fences[fence.key] = fence
+
+            stop_fences = [fence for fence in self._fences.values() if fence.kind == 'stop']
+            self._reach_m = max((fence.radius_m for fence in stop_fences), default=0.0)
+            self._built = True
+
+    def evaluate(self, bus_id, route_id, lat, lng, timestamp):
+        """Arrival/departure events for one fix, in the order they happened"""
+        self.ensure_built()
+        lat, lng = float(lat), float(lng)
+
+        candidates = [
+            fence for _, _, fence in self.index.within(
+                lat, lng, self._reach_m, predicate=lambda key, fence: fence.route_id == route_id
+            )
+        ] + self.school_fences
+
+        with self._lock:
+            first_fix = bus_id not in self._inside
+            inside = self._inside.setdefault(bus_id, set())
+            events = []
+
+            for key in list(inside):
+                fence = self._fences.get(key)
+                if fence is None:
+                    inside.discard(key)  # fence removed when its route changed
+                elif fence.has_left(lat, lng, self.margin_m):
+                    inside.discard(key)
+                    events.append(GeofenceEvent(bus_id, route_id, fence, 'departure', timestamp, lat, lng))
+
+            for fence in candidates:
+                if fence.key not in inside and fence.contains(lat, lng):
+                    inside.add(fence.key)
+                    events.append(GeofenceEvent(bus_id, route_id, fence, 'arrival', timestamp, lat, lng))
+
+        return [] if first_fix else events
+
+    def inside(self, bus_id):
+        """Fences the bus is currently inside"""
+        with self._lock:
+            return [self._fences[key] for key in self._inside.get(bus_id, ()) if key in self._fences]
+
+
+def _describe(event):
+    place = 'school' if event.fence.kind == 'school' else event.fence.name
+    verb = 'Arrived at' if event.kind == 'arrival' else 'Departed from'
+    if event.fence.route_name:
+        return f"{verb} {place} ({event.fence.route_name})"
+    return f"{verb} {place}"
+
+
+# (fence kind, event kind) -> (alerts.views.ALERT_TEMPLATES entry, hours the alert lasts)
+EVENT_ALERTS = {
+    ('school', 'departure'): ('bus_departed_school', 6),
+    ('school', 'arrival'): ('bus_arrived_school', 6),
+    ('stop', 'arrival'): ('bus_at_stop', 2),
+}
+
+
+def _route_students(route_names):
+    """route id -> students riding it (bus_route names the route or its id), in one query"""
+    from accounts.models import Student
+
+    routes_by_key = {}
+    riders = Q()
+    for route_id, name in route_names.items():
+        routes_by_key.setdefault(name.lower(), set()).add(route_id)
+        routes_by_key.setdefault(str(route_id), set()).add(route_id)
+        riders |= Q(bus_route__iexact=name) | Q(bus_route=str(route_id))
+
+    students = {route_id: [] for route_id in route_names}
+    for student in Student.objects.filter(riders).select_related('user'):
+        for route_id in routes_by_key.get(student.bus_route.lower(), ()):
+            students[route_id].append(student)
+    return students
+
+
+def _student_alerts(events, actor):
+    """Parent alerts for students whose bus_route/bus_stop match the events"""
+    from alerts import inbox, templating
+    from alerts.models import Alert
+    from alerts.views import ALERT_TEMPLATES
+    from .models import Route
+
+    events = [event for event in events if (event.fence.kind, event.kind) in EVENT_ALERTS]
+    route_names = dict(Route.objects.filter(id__in={e.route_id for e in events}).values_list('id', 'name'))
+    riders = _route_students(route_names) if route_names else {}
+    alerts = []
+    for event in events:
+        students = riders.get(event.route_id, [])
+        if event.fence.kind == 'stop':
+            stop = event.fence.name.lower()
+            students = [student for student in students if student.bus_stop.lower() == stop]
+        if not students:
+            continue
+
+        name, hours = EVENT_ALERTS[(event.fence.kind, event.kind)]
+        template = ALERT_TEMPLATES[name]
+        when = timezone.localtime(event.timestamp).strftime('%H:%M')
+        contexts = [
+            {'student_name': student.user.get_full_name(), 'stop_name': event.fence.name, 'time': when}
+            for student in students
+        ]
+        titles = templating.render_many(templating.builtin_key(name, 'title'), template['title'], contexts)
+        messages = templating.render_many(templating.builtin_key(name, 'message'), template['message'], contexts)
+        for student, title, message in zip(students, titles, messages):
+            alerts.append(Alert(
+                title=title,
+                message=message,
+                alert_type=template['type'],
+                priority=template['priority'],
+                student=student,
+                created_by=actor,
+                target_user_types=['parent'],
+                expires_at=event.timestamp + timedelta(hours=hours)
+            ))
+    Alert.objects.bulk_create(alerts, batch_size=500)
+    inbox.deliver(alerts, include_target_users=False)
+    return alerts
+
+
+def record_geofence_events(events, actor=None):
+    """
+    Write a TransportLog row per event and, with TRANSPORT_GEOFENCE_ALERTS
+    on, parent alerts on behalf of actor. Call inside the caller's
+    transaction.
+    """
+    from .models import TransportLog
+
+    if not events:
+        return []
+    TransportLog.objects.bulk_create([
+        TransportLog(
+            bus_id=event.bus_id,
+            log_type='stop_arrival' if event.kind == 'arrival' else 'stop_departure',
+            description=_describe(event),
+            latitude=round(event.latitude, 6),
+            longitude=round(event.longitude, 6),
+            created_at=event.timestamp
+        )
+        for event in events
+    ])
+    if actor is not None and getattr(settings, 'TRANSPORT_GEOFENCE_ALERTS', False):
+        return _student_alerts(events, actor)
+    return []
+
+
+geofence_engine = GeofenceEngine()
@@ -0,0 +1,380 @@
+"""
+Process-level live fleet state.
+
+Keeps every bus in memory together with a fixed-size ring buffer of its
+recent fixes, so current positions and recent tracks can be served
+without touching the database. The Bus table is only written when a fix
+moves a bus significantly or its persisted position gets too old; every
+fix is still recorded as a TransportLog row, so nothing is lost if the
+process restarts before a sync.
+
+Each process keeps its own store. Positions are reloaded from the
+database every TRANSPORT_LIVE_STATE_RELOAD seconds (keeping whichever
+fix is newer), so fixes ingested by other worker processes show up.
+Positions are written with a guard on last_location_update, so one
+process never replaces a newer fix another process already stored.
+"""
+import copy
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+
+from .geo import haversine_m
+from .models import Bus, TransportLog
+from .spatial import GridIndex
+
+
+class BusTrack:
+    """Fixed-size ring buffer of (lat, lng, speed, timestamp) fixes"""
+
+    __slots__ = ('size', 'start', 'count', 'latitudes', 'longitudes', 'speeds', 'timestamps')
+
+    def __init__(self, size):
+        self.size = size
+        self.start = 0
+        self.count = 0
+        self.latitudes = array('d', bytes(8 * size))
+        self.longitudes = array('d', bytes(8 * size))
+        self.speeds = array('d', bytes(8 * size))
+        self.timestamps = array('d', bytes(8 * size))  # unix seconds
+
+    def append(self, lat, lng, speed, timestamp):
+        """
+        Add a fix, keeping the buffer in time order: a late fix is moved
+        back past the newer ones. Returns False, dropping the fix, when the
+        buffer is full and the fix is older than all of it.
+        """
+        if self.count == self.size and timestamp < self.timestamps[self.start]:
+            return False
+        if self.count < self.size:
+            index = (self.start + self.count) % self.size
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.size
+        self.latitudes[index] = lat
+        self.longitudes[index] = lng
+        self.speeds[index] = math.nan if speed is None else speed
+        self.timestamps[index] = timestamp
+
+        columns = (self.latitudes, self.longitudes, self.speeds, self.timestamps)
+        position = self.count - 1
+        while position > 0:
+            here = (self.start + position) % self.size
+            before = (self.start + position - 1) % self.size
+            if self.timestamps[before] <= timestamp:
+                break
+            for column in columns:
+                column[here], column[before] = column[before], column[here]
+            position -= 1
+        return True
+
+    def _indexes(self, limit=None):
+        count = self.count if limit is None else min(limit, self.count)
+        first = self.count - count
+        return [(self.start + offset) % self.size for offset in range(first, self.count)]
+
+    def fixes(self, limit=None):
+        """Recent fixes, oldest first"""
+        return [
+            {
+                'latitude': self.latitudes[i],
+                'longitude': self.longitudes[i],
+                'speed': None if math.isnan(self.speeds[i]) else self.speeds[i],
+                'timestamp': datetime.fromtimestamp(self.timestamps[i], tz=dt_timezone.utc),
+            }
+            for i in self._indexes(limit)
+        ]
+
+    def speeds_since(self, since):
+        """Observed speeds (km/h) of fixes newer than the given unix time"""
+        return [
+            self.speeds[i] for i in self._indexes()
+            if self.timestamps[i] >= since and not math.isnan(self.speeds[i])
+        ]
+
+
+class FleetStateStore:
+    SYNC_FIELDS = ['current_latitude', 'current_longitude', 'current_speed', 'last_location_update']
+
+    def __init__(self, buffer_size=None, sync_distance=None, sync_interval=None, reload_interval=None):
+        self.buffer_size = buffer_size or getattr(settings, 'TRANSPORT_TRACK_BUFFER_SIZE', 120)
+        self.sync_distance = sync_distance if sync_distance is not None else getattr(settings, 'TRANSPORT_SYNC_DISTANCE', 50)
+        self.sync_interval = sync_interval if sync_interval is not None else getattr(settings, 'TRANSPORT_SYNC_INTERVAL', 60)
+        self.reload_interval = reload_interval if reload_interval is not None else getattr(settings, 'TRANSPORT_LIVE_STATE_RELOAD', 60)
+
+        self._lock = threading.RLock()
+        self._buses = {}
+        self._tracks = {}
+        self._synced = {}  # bus_id -> (lat, lng, unix time) last written to the Bus table
+        self._fix_counts = {}  # bus_id -> fixes recorded by this process, late ones included
+        self._dirty = set()
+        self._loaded_at = None
+        self._flushed_at = time.monotonic()
+        self.index = GridIndex()  # current bus positions
+
+    # ---- loading ----
+
+    def _merge(self, bus, persisted=True):
+        """
+        Take a bus unless we hold a newer fix for it. persisted says its
+        position is what the Bus row holds; only then is a pending
+        (dirty) position considered written.
+        """
+        current = self._buses.get(bus.id)
+        if current is not None and current.last_location_update and (
+            not bus.last_location_update or current.last_location_update > bus.last_location_update
+        ):
+            for field in self.SYNC_FIELDS:
+                setattr(bus, field, getattr(current, field))
+        elif persisted:
+            self._dirty.discard(bus.id)
+            if bus.current_latitude is not None and bus.current_longitude is not None:
+                self._synced[bus.id] = (
+                    float(bus.current_latitude),
+                    float(bus.current_longitude),
+                    bus.last_location_update.timestamp() if bus.last_location_update else 0,
+                )
+        self._buses[bus.id] = bus
+        if bus.current_latitude is not None and bus.current_longitude is not None:
+            self.index.insert(bus.id, bus.current_latitude, bus.current_longitude)
+        else:
+            self.index.remove(bus.id)
+
+    def load(self):
+        buses = list(Bus.objects.select_related('current_route'))
+        with self._lock:
+            known = set(self._buses)
+            for bus in buses:
+                self._merge(bus)
+            for bus_id in known - {bus.id for bus in buses}:
+                self._forget(bus_id)
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            self.load()
+
+    def refresh_bus(self, bus, persisted=True):
+        """
+        Replace cached metadata after a Bus row was saved elsewhere. Pass
+        persisted=False when the save did not write the position fields.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._merge(copy.copy(bus), persisted)
+
+    def set_sos(self, bus_id, activated, activated_at=None):
+        """
+        Update the SOS flag of a cached bus, leaving its position and sync
+        state alone. Returns the new snapshot, or None for unknown buses.
+        """
+        with self._lock:
+            bus = self._buses.get(bus_id)
+            if bus is None:
+                return None
+            bus.sos_activated = activated
+            if activated_at is not None:
+                bus.sos_activated_at = activated_at
+            return copy.copy(bus)
+
+    def _forget(self, bus_id):
+        self._buses.pop(bus_id, None)
+        self._tracks.pop(bus_id, None)
+        self._synced.pop(bus_id, None)
+        self._fix_counts.pop(bus_id, None)
+        self._dirty.discard(bus_id)
+        self.index.remove(bus_id)
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._forget(bus_id)
+
+    def reset(self):
+        with self._lock:
+            self._buses.clear()
+            self._tracks.clear()
+            self._synced.clear()
+            self._fix_counts.clear()
+            self._dirty.clear()
+            self.index.clear()
+            self._loaded_at = None
+
+    # ---- reads ----
+
+    def get_bus(self, bus_id):
+        """Snapshot of one bus, or None if it does not exist"""
+        self.ensure_loaded()
+        with self._lock:
+            bus = self._buses.get(bus_id)
+            return copy.copy(bus) if bus is not None else None
+
+    def buses(self, status=None):
+        """Snapshots of all buses, optionally filtered by status"""
+        self.ensure_loaded()
+        with self._lock:
+            return [
+                copy.copy(bus) for bus_id, bus in sorted(self._buses.items())
+                if status is None or bus.status == status
+            ]
+
+    def active_buses(self):
+        return self.buses(status='active')
+
+    def _is_active(self, bus_id, payload):
+        bus = self._buses.get(bus_id)
+        return bus is not None and bus.status == 'active'
+
+    def buses_within(self, lat, lng, radius_m):
+        """Active buses within radius_m metres as (bus snapshot, distance_m)"""
+        self.ensure_loaded()
+        matches = self.index.within(lat, lng, radius_m, predicate=self._is_active)
+        with self._lock:
+            return [(copy.copy(self._buses[bus_id]), distance) for bus_id, distance, _ in matches if bus_id in self._buses]
+
+    def nearest_buses(self, lat, lng, k=1, max_distance_m=None):
+        """The k nearest active buses as (bus snapshot, distance_m)"""
+        self.ensure_loaded()
+        matches = self.index.nearest(lat, lng, k, max_distance_m, predicate=self._is_active)
+        with self._lock:
+            return [(copy.copy(self._buses[bus_id]), distance) for bus_id, distance, _ in matches if bus_id in self._buses]
+
+    def track(self, bus_id):
+        """The ring buffer for a bus, seeded from recent logs on first use"""
+        with self._lock:
+            track = self._tracks.get(bus_id)
+            if track is not None:
+                return track
+
+        logs = list(
+            TransportLog.objects.filter(
+                bus_id=bus_id, log_type='location_update',
+                latitude__isnull=False, longitude__isnull=False
+            ).order_by('-created_at').values_list('latitude', 'longitude', 'created_at')[:self.buffer_size]
+        )
+        with self._lock:
+            track = self._tracks.get(bus_id)
+            if track is None:
+                track = BusTrack(self.buffer_size)
+                for lat, lng, created_at in reversed(logs):
+                    track.append(float(lat), float(lng), None, created_at.timestamp())
+                self._tracks[bus_id] = track
+            return track
+
+    def recent_fixes(self, bus_id, limit=None):
+        track = self.track(bus_id)
+        with self._lock:
+            return track.fixes(limit)
+
+    def recent_speeds(self, bus_id, since):
+        """Speeds (km/h) the bus reported since the given unix time"""
+        track = self.track(bus_id)
+        with self._lock:
+            return track.speeds_since(since)
+
+    def fix_count(self, bus_id):
+        """
+        Fixes this process has recorded for a bus. Unlike the last fix time
+        it also moves on a late fix, so it can version cached tracks.
+        """
+        with self._lock:
+            return self._fix_counts.get(bus_id, 0)
+
+    # ---- writes ----
+
+    def record_fix(self, bus_id, lat, lng, speed, timestamp):
+        """
+        Apply a fix to the in-memory state.
+
+        Returns (bus snapshot, needs_sync); needs_sync is True when the bus
+        moved more than TRANSPORT_SYNC_DISTANCE metres or its persisted
+        position is older than TRANSPORT_SYNC_INTERVAL seconds. Returns
+        (None, False) for unknown buses.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            if bus_id not in self._buses:
+                return None, False
+        track = self.track(bus_id)
+        unix_time = timestamp.timestamp()
+        with self._lock:
+            bus = self._buses.get(bus_id)
+            if bus is None:
+                return None, False
+
+            track.append(lat, lng, speed, unix_time)
+            self._fix_counts[bus_id] = self._fix_counts.get(bus_id, 0) + 1
+            if bus.last_location_update and bus.last_location_update > timestamp:
+                # Late fix: in the track, in time order, but not the current position
+                return copy.copy(bus), False
+
+            bus.current_latitude = round(lat, 6)
+            bus.current_longitude = round(lng, 6)
+            bus.last_location_update = timestamp
+            if speed is not None:
+                bus.current_speed = round(speed, 2)
+            self._dirty.add(bus_id)
+            self.index.insert(bus_id, lat, lng)
+
+            synced = self._synced.get(bus_id)
+            needs_sync = (
+                synced is None
+                or unix_time - synced[2] >= self.sync_interval
+                or haversine_m(synced[0], synced[1], lat, lng) >= self.sync_distance
+            )
+            return copy.copy(bus), needs_sync
+
+    def mark_synced(self, buses):
+        """Record that these bus snapshots were written to the Bus table"""
+        with self._lock:
+            for bus in buses:
+                current = self._buses.get(bus.id)
+                if current is not None and current.last_location_update == bus.last_location_update:
+                    self._dirty.discard(bus.id)
+                self._synced[bus.id] = (
+                    float(bus.current_latitude),
+                    float(bus.current_longitude),
+                    bus.last_location_update.timestamp(),
+                )
+
+    def write_positions(self, buses):
+        """
+        Write bus snapshots' positions with one bulk update. A row whose
+        last_location_update is already as new as the snapshot's keeps
+        its own position.
+        """
+        rows = []
+        for bus in buses:
+            if bus.last_location_update is None:
+                continue
+            older = Q(last_location_update__isnull=True) | Q(last_location_update__lt=bus.last_location_update)
+            row = Bus(id=bus.id)
+            for field in self.SYNC_FIELDS:
+                value = Value(getattr(bus, field), output_field=Bus._meta.get_field(field))
+                setattr(row, field, Case(When(older, then=value), default=F(field)))
+            rows.append(row)
+        if rows:
+            Bus.objects.bulk_update(rows, self.SYNC_FIELDS, batch_size=500)
+
+    def flush(self):
+        """Write every unsynced position with one bulk update"""
+        with self._lock:
+            buses = [copy.copy(self._buses[bus_id]) for bus_id in self._dirty if bus_id in self._buses]
+            self._flushed_at = time.monotonic()
+        if buses:
+            self.write_positions(buses)
+            self.mark_synced(buses)
+        return len(buses)
+
+    def flush_if_due(self):
+        if time.monotonic() - self._flushed_at >= self.sync_interval:
+            return self.flush()
+        return 0
+
+
+live_state = FleetStateStore()
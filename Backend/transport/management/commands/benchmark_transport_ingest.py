@@ -0,0 +1,208 @@
+import json
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from transport.simulator import (
+    LiveServerTarget, TestClientTarget, VirtualBus, run_simulation, synthetic_waypoints
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive simulated buses through the location endpoints and report latency "
+        "percentiles, throughput, DB queries and Maps calls per fix"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buses', type=int, default=20, help="Number of simulated buses")
+        parser.add_argument('--ticks', type=int, default=30, help="Fixes per bus")
+        parser.add_argument('--interval', type=float, default=5, help="Simulated seconds between fixes")
+        parser.add_argument(
+            '--mode', choices=['single', 'bulk', 'both'], default='both',
+            help="Post to update-location, the bulk endpoint, or both in turn"
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help="Fixes per bulk request")
+        parser.add_argument(
+            '--url',
+            help="Benchmark a running server instead of an in-process test database"
+        )
+        parser.add_argument('--token', help="JWT access token for --url (transport admin)")
+        parser.add_argument(
+            '--output', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'transport_ingest.jsonl'),
+            help="JSON lines file the results are appended to"
+        )
+        parser.add_argument('--no-save', action='store_true', help="Print the results without saving them")
+        parser.add_argument('--label', default='', help="Free-form note stored with the results")
+
+    def handle(self, *args, **options):
+        modes = ['single', 'bulk'] if options['mode'] == 'both' else [options['mode']]
+        if options['url']:
+            if not options['token']:
+                raise CommandError("--url needs --token")
+            results = self._run_live(options, modes)
+        else:
+            results = self._run_in_process(options, modes)
+
+        record = {
+            'recorded_at': timezone.now().isoformat(),
+            'commit': self._commit(),
+            'label': options['label'],
+            'target': options['url'] or 'test-client',
+            'buses': options['buses'],
+            'ticks': options['ticks'],
+            'interval': options['interval'],
+            'batch_size': options['batch_size'],
+            'results': results,
+        }
+        previous = self._previous(options['output'], record)
+        for result in results:
+            self._report(result, previous.get(result['mode']))
+
+        if not options['no_save']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+            with open(options['output'], 'a') as fileobj:
+                fileobj.write(json.dumps(record) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results appended to {options['output']}"))
+
+    def _run_in_process(self, options, modes):
+        """Run against a throwaway test database with the local maps provider"""
+        from accounts.models import Admin, User
+        from transport.enrichment import enrich_pending_addresses, RateBudget
+        from transport.geocache import geocode_cache
+        from transport.live import live_state
+        from transport.models import Bus, GeocodeCacheEntry, Route
+        from transport.providers import LocalMapsProvider
+        from transport.services import maps_service
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        maps_service.use_provider(LocalMapsProvider())
+        results = []
+        try:
+            with override_settings(ADDRESS_ENRICHMENT_BACKGROUND=False):
+                user = User.objects.create(username='benchmark-admin', user_type='admin')
+                Admin.objects.create(user=user, department='Transport', role='Benchmark', can_manage_transport=True)
+                center = getattr(settings, 'MAPS_LOCAL_CENTER', (-1.2921, 36.8219))
+                route_count = max(options['buses'] // 10, 1)
+                routes = [
+                    Route.objects.create(
+                        name=f'Sim Route {index + 1}', start_point='Depot', end_point='School',
+                        waypoints=synthetic_waypoints(center, index), estimated_duration=30, distance=3
+                    )
+                    for index in range(route_count)
+                ]
+                buses = Bus.objects.bulk_create([
+                    Bus(plate_number=f'SIM{index:04d}', driver_name='Sim Driver', driver_contact='0',
+                        current_route=routes[index % route_count])
+                    for index in range(options['buses'])
+                ])
+                for mode in modes:
+                    # Each mode starts cold so the numbers are comparable
+                    live_state.reset()
+                    geocode_cache.clear()
+                    GeocodeCacheEntry.objects.all().delete()
+                    virtual = [
+                        VirtualBus(bus.id, [(w['lat'], w['lng']) for w in routes[i % route_count].waypoints])
+                        for i, bus in enumerate(buses)
+                    ]
+                    result = run_simulation(
+                        TestClientTarget(user), virtual, options['ticks'], options['interval'],
+                        mode=mode, batch_size=options['batch_size']
+                    )
+                    # Addresses are resolved off the request path; count those lookups too
+                    before = sum(maps_service.stats()['calls'].values())
+                    while enrich_pending_addresses(budget=RateBudget(1e9)):
+                        pass
+                    calls = sum(maps_service.stats()['calls'].values()) - before
+                    result['enrichment_maps_calls_per_fix'] = round(calls / result['fixes'], 4) if result['fixes'] else None
+                    results.append(result)
+        finally:
+            live_state.reset()
+            maps_service.use_provider(None)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return results
+
+    def _run_live(self, options, modes):
+        import requests
+
+        target = LiveServerTarget(options['url'], options['token'])
+        response = target.session.get(f"{target.base_url}/transport/", timeout=30)
+        if response.status_code != 200:
+            raise CommandError(f"Could not list buses: HTTP {response.status_code}")
+        buses = response.json()[:options['buses']]
+        if not buses:
+            raise CommandError("The server has no active buses to drive")
+
+        center = getattr(settings, 'MAPS_LOCAL_CENTER', (-1.2921, 36.8219))
+        results = []
+        for mode in modes:
+            virtual = []
+            for index, bus in enumerate(buses):
+                waypoints = synthetic_waypoints(center, index)
+                virtual.append(VirtualBus(bus['id'], [(w['lat'], w['lng']) for w in waypoints]))
+            try:
+                results.append(run_simulation(
+                    target, virtual, options['ticks'], options['interval'],
+                    mode=mode, batch_size=options['batch_size']
+                ))
+            except requests.RequestException as e:
+                raise CommandError(f"Benchmark request failed: {e}")
+        return results
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def _previous(self, path, record):
+        """Latest saved result per mode from a run with the same parameters"""
+        keys = ('target', 'buses', 'ticks', 'interval', 'batch_size')
+        previous = {}
+        if not os.path.exists(path):
+            return previous
+        with open(path) as fileobj:
+            for line in fileobj:
+                try:
+                    saved = json.loads(line)
+                except ValueError:
+                    continue
+                if all(saved.get(key) == record[key] for key in keys):
+                    for result in saved.get('results', []):
+                        previous[result['mode']] = result
+        return previous
+
+    def _report(self, result, previous):
+        latency = result['latency_ms']
+
+        def change(value, key, subkey=None):
+            if previous is None or value is None:
+                return ''
+            old = previous.get(key)
+            if subkey is not None:
+                old = (old or {}).get(subkey)
+            if not old:
+                return ''
+            return f" ({(value - old) / old * 100:+.0f}% vs last run)"
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{result['mode']}: {result['fixes']} fixes in {result['requests']} requests, "
+            f"{result['errors']} errors"
+        ))
+        self.stdout.write(f"  fixes/s           {result['fixes_per_second']}{change(result['fixes_per_second'], 'fixes_per_second')}")
+        for key in ('p50', 'p95', 'p99'):
+            self.stdout.write(f"  latency {key} (ms)  {latency[key]}{change(latency[key], 'latency_ms', key)}")
+        self.stdout.write(f"  queries/fix       {result['queries_per_fix']}{change(result['queries_per_fix'], 'queries_per_fix')}")
+        self.stdout.write(f"  maps calls/fix    {result['maps_calls_per_fix']}")
+        if 'enrichment_maps_calls_per_fix' in result:
+            self.stdout.write(f"  enrichment calls/fix {result['enrichment_maps_calls_per_fix']}")
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transport.trajectory import compact_transport_logs
+
+
+class Command(BaseCommand):
+    help = "Compact old location_update logs into simplified trajectories and delete the raw rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int,
+            default=getattr(settings, 'TRANSPORT_LOG_RETENTION_DAYS', 30),
+            help="Keep raw location logs newer than this many days"
+        )
+        parser.add_argument(
+            '--tolerance', type=float,
+            default=getattr(settings, 'TRAJECTORY_TOLERANCE_M', 10),
+            help="Simplification tolerance in metres"
+        )
+        parser.add_argument(
+            '--keep-raw', action='store_true',
+            help="Create trajectories but do not delete the raw rows"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report what would be compacted without writing anything"
+        )
+
+    def handle(self, *args, **options):
+        summary = compact_transport_logs(
+            retention_days=options['retention_days'],
+            tolerance_m=options['tolerance'],
+            delete_raw=not options['keep_raw'],
+            dry_run=options['dry_run'],
+        )
+        prefix = "Would compact" if options['dry_run'] else "Compacted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {summary['raw_rows']} location logs from {summary['buses']} buses "
+            f"older than {summary['cutoff']:%Y-%m-%d %H:%M} into {summary['trips']} trips "
+            f"({summary['points_kept']} points kept)"
+        ))
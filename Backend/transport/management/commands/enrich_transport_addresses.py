@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transport.enrichment import RateBudget, enrich_pending_addresses, pending_logs
+
+
+class Command(BaseCommand):
+    help = "Fill in addresses for transport logs recorded without one (backfill or worker mode)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'ADDRESS_ENRICHMENT_BATCH_SIZE', 200),
+            help="Logs to load per batch"
+        )
+        parser.add_argument(
+            '--rate', type=float,
+            default=getattr(settings, 'ADDRESS_ENRICHMENT_RATE', 10),
+            help="Maximum external lookups per second"
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and poll for new pending logs"
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            default=getattr(settings, 'ADDRESS_ENRICHMENT_POLL_INTERVAL', 30),
+            help="Seconds to sleep between polls in --loop mode"
+        )
+
+    def handle(self, *args, **options):
+        budget = RateBudget(options['rate'])
+        self.stdout.write(f"{pending_logs().count()} logs pending address enrichment")
+
+        while True:
+            total = 0
+            while True:
+                updated = enrich_pending_addresses(
+                    batch_size=options['batch_size'], budget=budget, wait=True
+                )
+                if not updated:
+                    break
+                total += updated
+                self.stdout.write(f"Enriched {total} logs")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Address enrichment complete"))
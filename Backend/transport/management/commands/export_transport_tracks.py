@@ -0,0 +1,56 @@
+import os
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transport.models import Bus
+from transport.trackfile import bus_day_fixes, write_track
+
+
+class Command(BaseCommand):
+    help = "Export location history as compact binary track files, one per bus per day"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help="Directory to write <bus_id>/<YYYY-MM-DD>.trk files into")
+        parser.add_argument(
+            '--date', dest='dates', action='append',
+            help="Day to export (YYYY-MM-DD); repeatable. Defaults to yesterday"
+        )
+        parser.add_argument('--from', dest='date_from', help="First day of a range to export")
+        parser.add_argument('--to', dest='date_to', help="Last day of a range to export")
+        parser.add_argument('--bus', type=int, action='append', help="Bus id to export; repeatable")
+        parser.add_argument('--no-compress', action='store_true', help="Skip the zlib pass")
+
+    def _days(self, options):
+        try:
+            days = [date.fromisoformat(value) for value in options['dates'] or []]
+            if options['date_from'] or options['date_to']:
+                first = date.fromisoformat(options['date_from'] or options['date_to'])
+                last = date.fromisoformat(options['date_to'] or options['date_from'])
+                days += [first + timedelta(days=n) for n in range((last - first).days + 1)]
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        return sorted(set(days)) or [timezone.localdate() - timedelta(days=1)]
+
+    def handle(self, *args, **options):
+        bus_ids = options['bus'] or list(Bus.objects.values_list('id', flat=True))
+        files = fixes = size = 0
+        for day in self._days(options):
+            for bus_id in bus_ids:
+                points = list(bus_day_fixes(bus_id, day))
+                if not points:
+                    continue
+                directory = os.path.join(options['output_dir'], str(bus_id))
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"{day.isoformat()}.trk")
+                with open(path, 'wb') as fileobj:
+                    write_track(fileobj, bus_id, day, points, compress=not options['no_compress'])
+                files += 1
+                fixes += len(points)
+                size += os.path.getsize(path)
+
+        per_fix = f" ({size / fixes:.1f} bytes per fix)" if fixes else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {fixes} fixes into {files} track files, {size} bytes{per_fix}"
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.models import Bus
+from transport.trackfile import TrackFormatError, TrackReader, import_track
+
+
+class Command(BaseCommand):
+    help = "Load binary track files back into location_update transport logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Track files written by export_transport_tracks")
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Delete existing location logs for each bus day before importing; "
+                 "otherwise fixes already logged are skipped"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only read and validate the files"
+        )
+
+    def _load(self, path, fileobj, known, options):
+        """Fixes read (dry run) or imported from one open file; None if skipped"""
+        reader = TrackReader(fileobj)
+        if reader.bus_id not in known:
+            self.stderr.write(f"{path}: bus {reader.bus_id} does not exist, skipped")
+            return None
+        if options['dry_run']:
+            count = sum(1 for _ in reader)
+        else:
+            count = import_track(reader, replace=options['replace'])
+        self.stdout.write(f"{path}: {count} fixes for bus {reader.bus_id} on {reader.day}")
+        return count
+
+    def handle(self, *args, **options):
+        known = set(Bus.objects.values_list('id', flat=True))
+        total = 0
+        for path in options['files']:
+            # The reader streams, so the file stays open while it is read
+            try:
+                with open(path, 'rb') as fileobj:
+                    total += self._load(path, fileobj, known, options) or 0
+            except (OSError, TrackFormatError) as e:
+                raise CommandError(f"{path}: {e}")
+
+        prefix = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {total} fixes"))
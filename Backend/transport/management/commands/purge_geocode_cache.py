@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from transport.geocache import geocode_cache
+
+
+class Command(BaseCommand):
+    help = "Delete reverse-geocode cache entries older than GEOCODE_CACHE_TTL"
+
+    def handle(self, *args, **options):
+        deleted = geocode_cache.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} expired geocode cache entries"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField(help_text='Decimal places used for bucketing')),
+                ('lat_bucket', models.BigIntegerField()),
+                ('lng_bucket', models.BigIntegerField()),
+                ('address', models.TextField()),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('precision', 'lat_bucket', 'lng_bucket')},
+            },
+        ),
+    ]
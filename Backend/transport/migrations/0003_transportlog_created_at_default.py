@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0002_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transportlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0003_transportlog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transportlog',
+            index=models.Index(condition=models.Q(('address', '')), fields=['id'], name='transportlog_pending_address'),
+        ),
+    ]
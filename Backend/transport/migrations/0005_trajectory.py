@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0004_transportlog_pending_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trajectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('polyline', models.TextField()),
+                ('time_offsets', models.TextField()),
+                ('raw_point_count', models.PositiveIntegerField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('tolerance_m', models.FloatField()),
+                ('distance_m', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bus', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trajectories', to='transport.bus')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['bus', 'started_at'], name='transport_t_bus_id_8dd1d8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0005_trajectory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transportlog',
+            index=models.Index(fields=['created_at', 'id'], name='transport_t_created_76c7f5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportlog',
+            index=models.Index(fields=['bus', 'created_at'], name='transport_t_bus_id_2bbac2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportlog',
+            index=models.Index(fields=['log_type', 'created_at'], name='transport_t_log_typ_1cfb1a_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0006_transportlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transportlog',
+            name='log_type',
+            field=models.CharField(choices=[('location_update', 'Location Update'), ('sos_activated', 'SOS Activated'), ('sos_resolved', 'SOS Resolved'), ('maintenance', 'Maintenance'), ('route_change', 'Route Change'), ('stop_arrival', 'Stop Arrival'), ('stop_departure', 'Stop Departure')], max_length=20),
+        ),
+    ]
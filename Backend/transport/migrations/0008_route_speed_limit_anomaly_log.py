@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0007_transportlog_geofence_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='speed_limit',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Speed limit in km/h', null=True),
+        ),
+        migrations.AlterField(
+            model_name='transportlog',
+            name='log_type',
+            field=models.CharField(choices=[('location_update', 'Location Update'), ('sos_activated', 'SOS Activated'), ('sos_resolved', 'SOS Resolved'), ('maintenance', 'Maintenance'), ('route_change', 'Route Change'), ('stop_arrival', 'Stop Arrival'), ('stop_departure', 'Stop Departure'), ('anomaly', 'Driving Anomaly')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0008_route_speed_limit_anomaly_log'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transportlog',
+            name='transportlog_pending_address',
+        ),
+        migrations.AddIndex(
+            model_name='transportlog',
+            index=models.Index(condition=models.Q(('address', ''), ('latitude__isnull', False), ('longitude__isnull', False)), fields=['id'], name='transportlog_pending_address'),
+        ),
+    ]
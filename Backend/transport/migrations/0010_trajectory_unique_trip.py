@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:28
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def drop_duplicate_trips(apps, schema_editor):
+    """Keep the most recently written trajectory of each (bus, started_at)"""
+    Trajectory = apps.get_model('transport', 'Trajectory')
+    duplicates = (
+        Trajectory.objects.values('bus_id', 'started_at')
+        .annotate(keep=Max('id'), first=Min('id'))
+        .exclude(keep=models.F('first'))
+    )
+    for row in duplicates:
+        Trajectory.objects.filter(bus_id=row['bus_id'], started_at=row['started_at']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0009_transportlog_pending_address_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_trips, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='trajectory',
+            name='transport_t_bus_id_8dd1d8_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='trajectory',
+            constraint=models.UniqueConstraint(fields=('bus', 'started_at'), name='trajectory_unique_bus_trip'),
+        ),
+    ]
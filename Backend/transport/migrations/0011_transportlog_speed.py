@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:44
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+SPEED_PATTERN = re.compile(r'Speed: ([\d.]+) km/h')
+
+
+def copy_speed_from_description(apps, schema_editor):
+    """Fill speed on existing location logs from their 'Speed: N km/h' description"""
+    TransportLog = apps.get_model('transport', 'TransportLog')
+    logs = TransportLog.objects.filter(log_type='location_update', description__contains='Speed: ').only('id', 'description')
+    batch = []
+    for log in logs.iterator(chunk_size=BATCH_SIZE):
+        match = SPEED_PATTERN.search(log.description)
+        if not match:
+            continue
+        try:
+            log.speed = round(Decimal(match.group(1)), 2)
+        except InvalidOperation:
+            continue
+        if log.speed >= 1000:
+            continue
+        batch.append(log)
+        if len(batch) >= BATCH_SIZE:
+            TransportLog.objects.bulk_update(batch, ['speed'])
+            batch = []
+    TransportLog.objects.bulk_update(batch, ['speed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0010_trajectory_unique_trip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transportlog',
+            name='speed',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.RunPython(copy_speed_from_description, migrations.RunPython.noop),
+    ]
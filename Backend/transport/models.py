@@ -39,6 +39,7 @@ class Route(models.Model):
     waypoints = models.JSONField(default=list, blank=True)  # Store coordinates as [{"lat": x, "lng": y}]
     estimated_duration = models.IntegerField(help_text="Duration in minutes")
     distance = models.DecimalField(max_digits=6, decimal_places=2, help_text="Distance in km")
+    speed_limit = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Speed limit in km/h")
     is_active = models.BooleanField(default=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
@@ -53,6 +54,9 @@ class TransportLog(models.Model):
         ('sos_resolved', 'SOS Resolved'),
         ('maintenance', 'Maintenance'),
         ('route_change', 'Route Change'),
+        ('stop_arrival', 'Stop Arrival'),
+        ('stop_departure', 'Stop Departure'),
+        ('anomaly', 'Driving Anomaly'),
     )
     
     bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='logs')
@@ -63,11 +67,85 @@ class TransportLog(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     address = models.TextField(blank=True)
+    speed = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # km/h, location updates only
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Defaults to now, but batched tracker fixes keep their own timestamp
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['bus', 'created_at']),
+            models.Index(fields=['log_type', 'created_at']),
+            # Keeps the address enrichment backlog scan cheap
+            models.Index(
+                fields=['id'],
+                condition=models.Q(address='', latitude__isnull=False, longitude__isnull=False),
+                name='transportlog_pending_address'
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.bus.plate_number} - {self.get_log_type_display()} - {self.created_at}"
\ No newline at end of file
+        return f"{self.bus.plate_number} - {self.get_log_type_display()} - {self.created_at}"
+
+class GeocodeCacheEntry(models.Model):
+    """
+    Persistent reverse-geocode results, bucketed by rounded coordinates
+    so nearby fixes share one address.
+    """
+    precision = models.PositiveSmallIntegerField(help_text="Decimal places used for bucketing")
+    lat_bucket = models.BigIntegerField()
+    lng_bucket = models.BigIntegerField()
+    address = models.TextField()
+    
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['precision', 'lat_bucket', 'lng_bucket']
+
+    def __str__(self):
+        return f"({self.lat_bucket}, {self.lng_bucket}) @ {self.precision} - {self.address}"
+
+class Trajectory(models.Model):
+    """
+    Simplified track of one bus trip, compacted from old location_update logs.
+    
+    Points are stored as an encoded polyline at 6 decimal places, with the
+    whole seconds between consecutive points encoded the same way.
+    """
+    bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='trajectories')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    
+    polyline = models.TextField()
+    time_offsets = models.TextField()
+    raw_point_count = models.PositiveIntegerField()
+    point_count = models.PositiveIntegerField()
+    tolerance_m = models.FloatField()
+    distance_m = models.FloatField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            # One trajectory per trip, so compacting the same logs twice is harmless
+            models.UniqueConstraint(fields=['bus', 'started_at'], name='trajectory_unique_bus_trip'),
+        ]
+
+    def __str__(self):
+        return f"{self.bus.plate_number} trip {self.started_at} - {self.ended_at}"
+
+    def get_points(self):
+        """Decoded (lat, lng, timestamp) tuples"""
+        from datetime import timedelta
+        from .geo import decode_polyline, decode_signed
+        
+        offsets = decode_signed(self.time_offsets)
+        elapsed = 0
+        points = []
+        for (lat, lng), delta in zip(decode_polyline(self.polyline, precision=6), offsets):
+            elapsed += delta
+            points.append((lat, lng, self.started_at + timedelta(seconds=elapsed)))
+        return points
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Route progress tracking: map-matched position along each bus's route.
+
+Every current fix is snapped to the nearest segment of the bus's route
+polyline through the segment grid index in RouteGeometry, and the bus
+keeps how far along the route it is and which stop comes next. Progress
+only moves forward, so GPS noise around a stop or a fix briefly matched
+to the opposite carriageway can't make the bus look like it went back.
+It restarts when the route changes, after a long gap, or when the bus is
+clearly back near the start of the route (the next trip).
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+RouteProgress = namedtuple(
+    'RouteProgress',
+    'bus_id route_id distance_along_m route_length_m next_stop_index next_stop_name '
+    'snapped_latitude snapped_longitude offset_m on_route updated_at'
+)
+
+
+class RouteProgressTracker:
+    def __init__(self):
+        self.max_offset = getattr(settings, 'TRANSPORT_MATCH_MAX_OFFSET', 150)
+        self.reset_distance = getattr(settings, 'TRANSPORT_PROGRESS_RESET_M', 500)
+        self.stale_after = getattr(settings, 'TRANSPORT_PROGRESS_STALE', 1800)
+
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._progress.clear()
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._progress.pop(bus_id, None)
+
+    def get(self, bus_id):
+        return self._progress.get(bus_id)
+
+    def for_route(self, route_id):
+        return [progress for progress in list(self._progress.values()) if progress.route_id == route_id]
+
+    def update(self, bus_id, route_id, lat, lng, timestamp):
+        """
+        Feed one current fix; returns the bus's RouteProgress, or None when
+        it has no route with waypoints. Fixes further than
+        TRANSPORT_MATCH_MAX_OFFSET from the route leave progress unchanged.
+        """
+        from .eta import geometry_cache
+
+        if route_id is None:
+            self.forget(bus_id)
+            return None
+        geometry = geometry_cache.get_by_id(route_id)
+        if geometry is None or not geometry.points:
+            self.forget(bus_id)
+            return None
+
+        lat, lng = float(lat), float(lng)
+        with self._lock:
+            previous = self._progress.get(bus_id)
+            if previous is not None and (
+                previous.route_id != route_id
+                or (timestamp - previous.updated_at).total_seconds() > self.stale_after
+            ):
+                previous = None
+
+            along, offset = geometry.project(lat, lng, near_m=previous.distance_along_m if previous else None)
+            on_route = offset <= self.max_offset
+            if previous is not None:
+                if not on_route:
+                    along = previous.distance_along_m
+                elif along < previous.distance_along_m - self.reset_distance and along < self.reset_distance:
+                    pass  # back at the start: a new trip
+                else:
+                    along = max(along, previous.distance_along_m)
+            elif not on_route:
+                along = 0.0
+
+            next_stop = geometry.next_stop(along)
+            snapped_lat, snapped_lng = geometry.point_at(along)
+            progress = RouteProgress(
+                bus_id=bus_id,
+                route_id=route_id,
+                distance_along_m=along,
+                route_length_m=geometry.length_m,
+                next_stop_index=next_stop,
+                next_stop_name=geometry.names[next_stop] if next_stop is not None else None,
+                snapped_latitude=snapped_lat,
+                snapped_longitude=snapped_lng,
+                offset_m=offset,
+                on_route=on_route,
+                updated_at=timestamp
+            )
+            self._progress[bus_id] = progress
+        return progress
+
+
+def progress_data(progress):
+    """JSON-ready dict for a RouteProgress"""
+    data = progress._asdict()
+    # Kept exact in the tracker so a bus on a stop isn't rounded back before it
+    for field, digits in (('distance_along_m', 1), ('route_length_m', 1), ('offset_m', 1),
+                          ('snapped_latitude', 6), ('snapped_longitude', 6)):
+        data[field] = round(data[field], digits)
+    data['fraction_complete'] = (
+        round(progress.distance_along_m / progress.route_length_m, 4) if progress.route_length_m else None
+    )
+    data['updated_at'] = progress.updated_at.isoformat()
+    return data
+
+
+route_progress = RouteProgressTracker()
@@ -0,0 +1,246 @@
+"""
+Maps providers behind GoogleMapsService.
+
+MAPS_PROVIDER selects the implementation:
+
+- 'google' talks to the Google Maps APIs through a lazily built client
+  with a pooled HTTP session, connect/read timeouts, a bounded retry
+  window, a concurrency limit and a circuit breaker that fails fast while
+  the upstream is degraded.
+- 'local' is a deterministic, network-free stand-in returning responses
+  in the same shape, for tests, development and load benchmarks.
+
+Both return raw Google-shaped results; GoogleMapsService does the parsing.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+from .distance import approximate_distance_matrix, parse_coordinates
+from .geo import encode_polyline, haversine_m
+
+
+class MapsProviderError(Exception):
+    pass
+
+
+class CircuitOpenError(MapsProviderError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls
+    for reset_timeout seconds, then lets a single trial call through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or getattr(settings, 'MAPS_BREAKER_THRESHOLD', 5)
+        self.reset_timeout = reset_timeout or getattr(settings, 'MAPS_BREAKER_RESET', 30)
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class GoogleMapsProvider:
+    name = 'google'
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.max_concurrency = getattr(settings, 'MAPS_MAX_CONCURRENCY', 8)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.calls = Counter()
+        self.failures = Counter()
+
+    @property
+    def client(self):
+        """googlemaps.Client, built on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import googlemaps
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                    session.mount('https://', adapter)
+                    self._client = googlemaps.Client(
+                        key=settings.GOOGLE_MAPS_API_KEY,
+                        connect_timeout=getattr(settings, 'MAPS_CONNECT_TIMEOUT', 3),
+                        read_timeout=getattr(settings, 'MAPS_READ_TIMEOUT', 5),
+                        retry_timeout=getattr(settings, 'MAPS_RETRY_TIMEOUT', 10),
+                        requests_session=session,
+                    )
+        return self._client
+
+    def _call(self, method, *args, **kwargs):
+        # Take a slot first: a half-open breaker hands out a single trial,
+        # which must not be lost to a queue timeout
+        if not self._slots.acquire(timeout=getattr(settings, 'MAPS_QUEUE_TIMEOUT', 2)):
+            raise MapsProviderError(f"Too many concurrent Maps API calls, skipping {method}")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise CircuitOpenError(f"Maps API circuit open, skipping {method}")
+        try:
+            self.calls[method] += 1
+            result = getattr(self.client, method)(*args, **kwargs)
+        except Exception:
+            self.failures[method] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._slots.release()
+        self.breaker.record_success()
+        return result
+
+    def geocode(self, address):
+        return self._call('geocode', address)
+
+    def reverse_geocode(self, latlng):
+        return self._call('reverse_geocode', latlng)
+
+    def directions(self, origin, destination, waypoints=None, departure_time=None):
+        return self._call(
+            'directions', origin, destination,
+            waypoints=waypoints, mode='driving', departure_time=departure_time or datetime.now()
+        )
+
+    def distance_matrix(self, origins, destinations):
+        return self._call('distance_matrix', origins, destinations)
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            'circuit': self.breaker.state,
+            'calls': dict(self.calls),
+            'failures': dict(self.failures),
+        }
+
+
+class LocalMapsProvider:
+    """
+    Deterministic stand-in: addresses hash to a point within about 5 km of
+    MAPS_LOCAL_CENTER, and routes are straight lines driven at
+    TRANSPORT_DEFAULT_SPEED.
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        self.center = getattr(settings, 'MAPS_LOCAL_CENTER', (-1.2921, 36.8219))
+        self.calls = Counter()
+
+    def _point(self, value):
+        try:
+            return parse_coordinates(value)
+        except (KeyError, TypeError, ValueError):
+            digest = hashlib.sha256(str(value).strip().lower().encode()).digest()
+            lat_offset = int.from_bytes(digest[:4], 'big') / 2 ** 32 - 0.5
+            lng_offset = int.from_bytes(digest[4:8], 'big') / 2 ** 32 - 0.5
+            return round(self.center[0] + lat_offset * 0.1, 6), round(self.center[1] + lng_offset * 0.1, 6)
+
+    def geocode(self, address):
+        self.calls['geocode'] += 1
+        lat, lng = self._point(address)
+        return [{
+            'formatted_address': str(address),
+            'geometry': {'location': {'lat': lat, 'lng': lng}},
+        }]
+
+    def reverse_geocode(self, latlng):
+        self.calls['reverse_geocode'] += 1
+        lat, lng = self._point(latlng)
+        return [{
+            'formatted_address': f"Near {lat:.4f}, {lng:.4f}",
+            'geometry': {'location': {'lat': lat, 'lng': lng}},
+        }]
+
+    def directions(self, origin, destination, waypoints=None, departure_time=None):
+        self.calls['directions'] += 1
+        points = [self._point(origin)] + [self._point(w) for w in waypoints or []] + [self._point(destination)]
+        metres_per_second = getattr(settings, 'TRANSPORT_DEFAULT_SPEED', 25) / 3.6
+
+        steps = []
+        for start, end in zip(points, points[1:]):
+            distance = round(haversine_m(start[0], start[1], end[0], end[1]))
+            duration = round(distance / metres_per_second)
+            steps.append({
+                'distance': {'value': distance, 'text': f"{distance / 1000:.1f} km"},
+                'duration': {'value': duration, 'text': f"{max(round(duration / 60), 1)} mins"},
+                'start_location': {'lat': start[0], 'lng': start[1]},
+                'end_location': {'lat': end[0], 'lng': end[1]},
+            })
+        distance = sum(step['distance']['value'] for step in steps)
+        duration = sum(step['duration']['value'] for step in steps)
+        return [{
+            'legs': [{
+                'distance': {'value': distance, 'text': f"{distance / 1000:.1f} km"},
+                'duration': {'value': duration, 'text': f"{max(round(duration / 60), 1)} mins"},
+                'steps': steps,
+            }],
+            'overview_polyline': {'points': encode_polyline(points)},
+        }]
+
+    def distance_matrix(self, origins, destinations):
+        self.calls['distance_matrix'] += 1
+        return approximate_distance_matrix(
+            [self._point(origin) for origin in origins],
+            [self._point(destination) for destination in destinations],
+        )
+
+    def stats(self):
+        return {'provider': self.name, 'circuit': 'closed', 'calls': dict(self.calls), 'failures': {}}
+
+
+PROVIDERS = {
+    'google': GoogleMapsProvider,
+    'local': LocalMapsProvider,
+}
+
+
+def build_provider(name=None):
+    name = name or getattr(settings, 'MAPS_PROVIDER', 'google')
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise MapsProviderError(f"Unknown MAPS_PROVIDER {name!r}") from None
@@ -23,6 +23,11 @@ class BusSerializer(serializers.ModelSerializer):
     
     def get_current_address(self, obj):
         if obj.current_latitude and obj.current_longitude:
+            # Pass resolve_address=False in the context to stay off the Maps API
+            if not self.context.get('resolve_address', True):
+                from .geocache import geocode_cache
+                address = geocode_cache.get(obj.current_latitude, obj.current_longitude)
+                return address if address is not None else "Address pending"
             from .services import maps_service
             return maps_service.reverse_geocode(
                 float(obj.current_latitude), 
@@ -30,6 +35,14 @@ class BusSerializer(serializers.ModelSerializer):
             )
         return "Location not available"
 
+class LocationFixSerializer(serializers.Serializer):
+    """A single GPS fix submitted through the bulk ingestion endpoint"""
+    bus_id = serializers.IntegerField()
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    speed = serializers.FloatField(min_value=0, max_value=999.99, required=False, allow_null=True)
+    timestamp = serializers.DateTimeField(required=False)
+
 class RouteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Route
@@ -1,50 +1,81 @@
-import googlemaps
-from django.conf import settings
-from django.utils import timezone
-from datetime import datetime
+import logging
+import threading
+
+from .distance import approximate_distance_matrix
+from .geocache import geocode_cache
+from .providers import build_provider
+
+logger = logging.getLogger(__name__)
+
 
 class GoogleMapsService:
-    def __init__(self):
-        self.gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
-    
+    def __init__(self, provider=None):
+        self._provider = provider
+        self._lock = threading.Lock()
+
+    @property
+    def provider(self):
+        """The MAPS_PROVIDER backend, built on first use rather than at import"""
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    self._provider = build_provider()
+        return self._provider
+
+    def use_provider(self, provider):
+        """Swap the backend, e.g. LocalMapsProvider() in benchmarks"""
+        with self._lock:
+            self._provider = provider
+
     def geocode_address(self, address):
         """Convert address to coordinates"""
         try:
-            geocode_result = self.gmaps.geocode(address)
+            geocode_result = self.provider.geocode(address)
             if geocode_result:
                 location = geocode_result[0]['geometry']['location']
                 return location['lat'], location['lng']
             return None, None
         except Exception as e:
-            print(f"Geocoding error: {e}")
+            logger.warning("Geocoding error: %s", e)
             return None, None
-    
+
     def reverse_geocode(self, lat, lng):
-        """Convert coordinates to address"""
+        """Convert coordinates to address, served from the geocode cache when possible"""
+        address = self.lookup_address(lat, lng)
+        return address if address is not None else "Address lookup failed"
+
+    def lookup_address(self, lat, lng):
+        """
+        Like reverse_geocode, but returns None when the lookup itself failed
+        (provider error, open circuit), so callers that store the address
+        can leave it unresolved and retry later.
+        """
+        cached = geocode_cache.get(lat, lng)
+        if cached is not None:
+            return cached
+
         try:
-            reverse_geocode_result = self.gmaps.reverse_geocode((lat, lng))
-            if reverse_geocode_result:
-                return reverse_geocode_result[0]['formatted_address']
-            return "Address not found"
+            reverse_geocode_result = self.provider.reverse_geocode((lat, lng))
         except Exception as e:
-            print(f"Reverse geocoding error: {e}")
-            return "Address lookup failed"
-    
+            logger.warning("Reverse geocoding error: %s", e)
+            return None
+
+        if reverse_geocode_result:
+            address = reverse_geocode_result[0]['formatted_address']
+        else:
+            address = "Address not found"
+        geocode_cache.set(lat, lng, address)
+        return address
+
     def get_route_directions(self, origin, destination, waypoints=None):
         """Get route directions and estimated time"""
         try:
-            directions_result = self.gmaps.directions(
-                origin,
-                destination,
-                waypoints=waypoints,
-                mode="driving",
-                departure_time=datetime.now()
-            )
-            
+            directions_result = self.provider.directions(origin, destination, waypoints=waypoints)
+
             if directions_result:
                 route = directions_result[0]
                 leg = route['legs'][0]
-                
+
                 return {
                     'distance': leg['distance']['text'],
                     'duration': leg['duration']['text'],
@@ -54,17 +85,31 @@ class GoogleMapsService:
                 }
             return None
         except Exception as e:
-            print(f"Directions error: {e}")
+            logger.warning("Directions error: %s", e)
             return None
-    
-    def calculate_distance_matrix(self, origins, destinations):
-        """Calculate distance between multiple points"""
+
+    def calculate_distance_matrix(self, origins, destinations, mode='remote', speed_kmh=None):
+        """
+        Calculate distance between multiple points
+
+        mode='approximate' computes great-circle distances locally (see
+        transport.distance); it falls back to the API when an origin or
+        destination is an address rather than coordinates.
+        """
+        if mode == 'approximate':
+            try:
+                return approximate_distance_matrix(origins, destinations, speed_kmh)
+            except ValueError:
+                pass
         try:
-            matrix = self.gmaps.distance_matrix(origins, destinations)
+            matrix = self.provider.distance_matrix(origins, destinations)
             return matrix
         except Exception as e:
-            print(f"Distance matrix error: {e}")
+            logger.warning("Distance matrix error: %s", e)
             return None
 
+    def stats(self):
+        return self.provider.stats()
+
 # Singleton instance
-maps_service = GoogleMapsService()
\ No newline at end of file
+maps_service = GoogleMapsService()
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .anomalies import anomaly_detector
+from .eta import geometry_cache
+from .geofence import geofence_engine
+from .live import live_state
+from .models import Bus, Route
+from .progress import route_progress
+from .sos import sos_recipients
+from .spatial import stop_index
+from .tracks import track_cache
+
+
+@receiver(post_save, sender=Bus)
+def refresh_live_bus(sender, instance, update_fields=None, **kwargs):
+    """Keep the live fleet state in step with saves made outside the location views"""
+    persisted = update_fields is None or set(live_state.SYNC_FIELDS) <= set(update_fields)
+    live_state.refresh_bus(instance, persisted)
+
+
+@receiver(post_delete, sender=Bus)
+def forget_live_bus(sender, instance, **kwargs):
+    live_state.forget(instance.id)
+    geofence_engine.forget(instance.id)
+    anomaly_detector.forget(instance.id)
+    route_progress.forget(instance.id)
+    track_cache.forget(instance.id)
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_route_geometry(sender, instance, **kwargs):
+    stop_index.invalidate()
+    geofence_engine.invalidate()
+    sos_recipients.invalidate()
+    anomaly_detector.invalidate_limits()
+    geometry_cache.invalidate(instance.id)
+
+
+# Student routes, parent links and admin accounts decide who gets SOS alerts
+for model in ('accounts.Student', 'accounts.Admin'):
+    post_save.connect(sos_recipients.invalidate, sender=model, dispatch_uid=f'sos-recipients-save-{model}')
+    post_delete.connect(sos_recipients.invalidate, sender=model, dispatch_uid=f'sos-recipients-delete-{model}')
@@ -0,0 +1,209 @@
+"""
+Synthetic fleet simulator for ingestion benchmarks.
+
+Virtual buses drive back and forth along Route.waypoints, producing one fix
+per bus per tick. The fixes are posted to the location endpoints either
+in-process through the DRF test client (where DB queries can be counted)
+or to a live server over HTTP, and per-request latencies, throughput,
+queries and Maps calls per fix are collected.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .geo import haversine_m
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class VirtualBus:
+    """A bus shuttling along a polyline at a jittered cruising speed"""
+
+    def __init__(self, bus_id, points, speed_kmh=30, seed=None):
+        self.bus_id = bus_id
+        self.points = points
+        self.random = random.Random(seed if seed is not None else bus_id)
+        self.speed_kmh = speed_kmh * self.random.uniform(0.8, 1.2)
+        self.cumulative = [0.0]
+        for a, b in zip(points, points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_m(a[0], a[1], b[0], b[1]))
+        self.length_m = self.cumulative[-1]
+        self.travelled_m = self.random.uniform(0, 2 * self.length_m) if self.length_m else 0.0
+
+    def position(self):
+        if self.length_m == 0:
+            return self.points[0]
+        along = self.travelled_m % (2 * self.length_m)
+        if along > self.length_m:
+            along = 2 * self.length_m - along  # driving back
+        for index in range(len(self.points) - 1):
+            if along <= self.cumulative[index + 1]:
+                segment = self.cumulative[index + 1] - self.cumulative[index]
+                t = 0.0 if segment == 0 else (along - self.cumulative[index]) / segment
+                (a_lat, a_lng), (b_lat, b_lng) = self.points[index], self.points[index + 1]
+                return a_lat + t * (b_lat - a_lat), a_lng + t * (b_lng - a_lng)
+        return self.points[-1]
+
+    def step(self, seconds):
+        """Advance and return (lat, lng, speed_kmh) with a little GPS noise"""
+        speed = max(self.speed_kmh + self.random.gauss(0, 3), 0.0)
+        self.travelled_m += speed / 3.6 * seconds
+        lat, lng = self.position()
+        return (
+            round(lat + self.random.gauss(0, 0.00002), 6),
+            round(lng + self.random.gauss(0, 0.00002), 6),
+            round(speed, 1),
+        )
+
+
+class TestClientTarget:
+    """Posts through the DRF test client and counts queries and Maps calls"""
+
+    counts_queries = True
+
+    def __init__(self, user):
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def maps_calls(self):
+        from .services import maps_service
+
+        return sum(maps_service.stats()['calls'].values())
+
+    def _post(self, path, data):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.post(path, data, format='json')
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(queries)
+
+    def post_fix(self, bus_id, lat, lng, speed, timestamp):
+        return self._post(f'/transport/{bus_id}/update-location/', {'latitude': lat, 'longitude': lng, 'speed': speed})
+
+    def post_bulk(self, fixes):
+        return self._post('/transport/locations/bulk/', {'fixes': fixes})
+
+
+class LiveServerTarget:
+    """Posts to a running server with a JWT access token"""
+
+    counts_queries = False
+
+    def __init__(self, base_url, token):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def maps_calls(self):
+        response = self.session.get(f'{self.base_url}/transport/maps/stats/', timeout=10)
+        response.raise_for_status()
+        return sum(response.json()['calls'].values())
+
+    def _post(self, path, data):
+        started = time.perf_counter()
+        response = self.session.post(f'{self.base_url}{path}', json=data, timeout=30)
+        return response.status_code, time.perf_counter() - started, None
+
+    def post_fix(self, bus_id, lat, lng, speed, timestamp):
+        return self._post(f'/transport/{bus_id}/update-location/', {'latitude': lat, 'longitude': lng, 'speed': speed})
+
+    def post_bulk(self, fixes):
+        return self._post('/transport/locations/bulk/', {'fixes': fixes})
+
+
+def run_simulation(target, buses, ticks, interval, mode='single', batch_size=100, warmup_ticks=1):
+    """
+    Drive the virtual buses for ticks rounds, interval simulated seconds
+    apart, and return a metrics dict. The first warmup_ticks rounds are
+    posted but left out of the numbers.
+    """
+    clock = timezone.now() - timedelta(seconds=interval * (ticks + warmup_ticks))
+    latencies = []
+    fixes = errors = queries = 0
+    maps_before = None
+    started = None
+
+    for tick in range(warmup_ticks + ticks):
+        if tick == warmup_ticks:
+            maps_before = target.maps_calls()
+            started = time.perf_counter()
+        measured = tick >= warmup_ticks
+        clock += timedelta(seconds=interval)
+
+        batch = []
+        results = []
+        for bus in buses:
+            lat, lng, speed = bus.step(interval)
+            if mode == 'single':
+                results.append((target.post_fix(bus.bus_id, lat, lng, speed, clock), 1))
+            else:
+                batch.append({'bus_id': bus.bus_id, 'latitude': lat, 'longitude': lng, 'speed': speed,
+                              'timestamp': clock.isoformat()})
+        for offset in range(0, len(batch), batch_size):
+            chunk = batch[offset:offset + batch_size]
+            results.append((target.post_bulk(chunk), len(chunk)))
+
+        if not measured:
+            continue
+        for (status, elapsed, query_count), count in results:
+            latencies.append(elapsed * 1000)
+            fixes += count
+            errors += status >= 400
+            queries += query_count or 0
+
+    wall = time.perf_counter() - started if started is not None else 0.0
+    maps_calls = target.maps_calls() - maps_before if maps_before is not None else 0
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'fixes': fixes,
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'fixes_per_second': round(fixes / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': _round(percentile(latencies, 50)),
+            'p95': _round(percentile(latencies, 95)),
+            'p99': _round(percentile(latencies, 99)),
+            'max': _round(max(latencies) if latencies else None),
+        },
+        'queries_per_fix': round(queries / fixes, 2) if fixes and target.counts_queries else None,
+        'maps_calls_per_fix': round(maps_calls / fixes, 4) if fixes else None,
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def synthetic_waypoints(center, index, stops=8, radius_m=3000):
+    """Waypoints for a made-up route radiating from center"""
+    rng = random.Random(index)
+    bearing = rng.uniform(0, 2 * math.pi)
+    cos_lat = math.cos(math.radians(center[0]))
+    waypoints = []
+    for stop in range(stops):
+        distance = radius_m * (stop + 1) / stops
+        wobble = rng.uniform(-0.3, 0.3)
+        waypoints.append({
+            'lat': round(center[0] + distance * math.cos(bearing + wobble) / 111320.0, 6),
+            'lng': round(center[1] + distance * math.sin(bearing + wobble) / (111320.0 * cos_lat), 6),
+            'name': f'Sim Stop {index}-{stop + 1}',
+        })
+    return waypoints
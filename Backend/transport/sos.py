@@ -0,0 +1,239 @@
+"""
+Low-latency SOS pipeline.
+
+Activating SOS does the minimum on the request path, in one transaction:
+
+1. a narrow UPDATE of the bus's SOS columns
+2. the sos_activated TransportLog row, with an address only if the geocode
+   cache already has it (the enricher fills it in afterwards)
+3. the emergency Alert, created directly and delivered to its recipients
+   with one bulk insert into the target_users through table and one into
+   their inboxes
+
+Recipients are the parents of students riding the bus's route plus every
+admin. They come from SosRecipientDirectory, which precomputes route ->
+parent user ids and the admin ids in a few grouped queries, so no joins
+run when an SOS fires. The alert text is the 'bus_sos' entry of
+alerts.views.ALERT_TEMPLATES. Latency from the call to the alert being committed,
+and so visible in the recipients' alert lists, is recorded for every SOS.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SosRecipientDirectory:
+    """
+    Precomputed route_id -> parent user ids (and the reverse), plus admin
+    user ids.
+
+    Students name their route in Student.bus_route, by route name or id.
+    Rebuilt lazily after invalidate() (wired to Student, Admin and Route
+    changes) or once SOS_RECIPIENTS_TTL seconds have passed. invalidate()
+    only reaches this process, so the SOS path itself rebuilds anything
+    older than SOS_RECIPIENTS_MAX_AGE seconds.
+    """
+
+    def __init__(self, ttl=None, sos_max_age=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SOS_RECIPIENTS_TTL', 300)
+        self.sos_max_age = sos_max_age if sos_max_age is not None else getattr(settings, 'SOS_RECIPIENTS_MAX_AGE', 5)
+        self._parents_by_route = {}
+        self._routes_by_parent = {}
+        self._route_names = {}
+        self._admins = frozenset()
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, *args, **kwargs):
+        self._built_at = None
+
+    def _fresh(self, max_age):
+        return self._built_at is not None and time.monotonic() - self._built_at < max_age
+
+    def ensure_built(self, max_age=None):
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        if self._fresh(max_age):
+            return
+        from accounts.models import Student, User
+        from .models import Route
+
+        with self._lock:
+            if self._fresh(max_age):
+                return
+            route_ids = {}
+            route_names = {}
+            for route_id, name in Route.objects.values_list('id', 'name'):
+                route_names[route_id] = name
+                route_ids[str(route_id)] = route_id
+                route_ids.setdefault(name.strip().lower(), route_id)
+
+            parents_by_route = {}
+            students = Student.objects.exclude(parent=None).exclude(bus_route='')
+            for bus_route, parent_id in students.values_list('bus_route', 'parent_id'):
+                route_id = route_ids.get(bus_route.strip().lower())
+                if route_id is not None:
+                    parents_by_route.setdefault(route_id, set()).add(parent_id)
+
+            self._parents_by_route = {route_id: frozenset(ids) for route_id, ids in parents_by_route.items()}
+            routes_by_parent = {}
+            for route_id, parent_ids in parents_by_route.items():
+                for parent_id in parent_ids:
+                    routes_by_parent.setdefault(parent_id, set()).add(route_id)
+            self._routes_by_parent = {parent_id: frozenset(ids) for parent_id, ids in routes_by_parent.items()}
+            self._route_names = route_names
+            self._admins = frozenset(
+                User.objects.filter(user_type='admin', is_active=True).values_list('id', flat=True)
+            )
+            self._built_at = time.monotonic()
+
+    def for_route(self, route_id):
+        """User ids to notify about an SOS on a bus driving route_id"""
+        self.ensure_built(self.sos_max_age)
+        return self._parents_by_route.get(route_id, frozenset()) | self._admins
+
+    def routes_for_parent(self, user_id):
+        """Route ids the parent's children ride"""
+        self.ensure_built()
+        return self._routes_by_parent.get(user_id, frozenset())
+
+    def route_name(self, route_id):
+        self.ensure_built()
+        return self._route_names.get(route_id, 'Unassigned')
+
+
+class LatencyRecorder:
+    """The last few SOS latencies, for the stats endpoint"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, milliseconds):
+        with self._lock:
+            self._samples.append(milliseconds)
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {'count': 0, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        return {
+            'count': len(samples),
+            'p50_ms': samples[(len(samples) - 1) // 2],
+            'p95_ms': samples[max(math.ceil(0.95 * len(samples)) - 1, 0)],
+            'max_ms': samples[-1],
+        }
+
+
+def activate_sos(bus_id, actor, started=None):
+    """
+    Raise SOS for a bus on behalf of actor.
+
+    started is a time.perf_counter() value taken when the request arrived.
+    Returns (bus snapshot, alert, recipient count, latency in ms), or None
+    when the bus does not exist.
+    """
+    from alerts import inbox, templating
+    from alerts.models import Alert
+    from alerts.views import ALERT_TEMPLATES
+    from .enrichment import address_enricher
+    from .geocache import geocode_cache
+    from .live import live_state
+    from .models import Bus, TransportLog
+    from .streaming import fleet_broadcaster, position_from_bus
+
+    started = started if started is not None else time.perf_counter()
+    bus = live_state.get_bus(bus_id)
+    if bus is None:
+        return None
+    recipients = sos_recipients.for_route(bus.current_route_id)
+
+    now = timezone.now()
+    bus.sos_activated = True
+    bus.sos_activated_at = now
+    has_position = bus.current_latitude is not None and bus.current_longitude is not None
+    address = None
+    location = "Unknown location"
+    if has_position:
+        lat, lng = float(bus.current_latitude), float(bus.current_longitude)
+        address = geocode_cache.peek(lat, lng)
+        location = address or f"{lat:.5f}, {lng:.5f}"
+    template = ALERT_TEMPLATES['bus_sos']
+    context = {
+        'plate_number': bus.plate_number,
+        'driver_name': bus.driver_name,
+        'route_name': sos_recipients.route_name(bus.current_route_id),
+        'time': timezone.localtime(now).strftime('%H:%M'),
+        'location': location,
+    }
+    title = templating.render(templating.builtin_key('bus_sos', 'title'), template['title'], context)
+    message = templating.render(templating.builtin_key('bus_sos', 'message'), template['message'], context)
+
+    with transaction.atomic():
+        if not Bus.objects.filter(id=bus_id).update(sos_activated=True, sos_activated_at=now):
+            return None
+        TransportLog.objects.create(
+            bus_id=bus_id,
+            log_type='sos_activated',
+            description='SOS emergency activated by driver',
+            latitude=bus.current_latitude,
+            longitude=bus.current_longitude,
+            address=address or ('' if has_position else 'Unknown location'),
+            created_at=now
+        )
+        alert = Alert.objects.create(
+            title=title,
+            message=message,
+            alert_type=template['type'],
+            priority=template['priority'],
+            created_by=actor,
+            action_required=True,
+            action_text="Contact School",
+            action_url="/contact"
+        )
+        Through = Alert.target_users.through
+        Through.objects.bulk_create(
+            [Through(alert_id=alert.id, user_id=user_id) for user_id in recipients],
+            batch_size=1000
+        )
+        inbox.deliver_to_users(alert, recipients)
+        if has_position and not address:
+            transaction.on_commit(address_enricher.notify)
+
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    sos_latency.record(latency_ms)
+    logger.info("SOS for bus %s delivered to %s recipients in %.1f ms", bus_id, len(recipients), latency_ms)
+
+    bus = live_state.set_sos(bus_id, True, now) or bus
+    fleet_broadcaster.publish([position_from_bus(bus)])
+    return bus, alert, len(recipients), latency_ms
+
+
+def resolve_sos(bus_id):
+    """Clear the SOS flag; returns False when the bus does not exist"""
+    from .live import live_state
+    from .models import Bus, TransportLog
+
+    with transaction.atomic():
+        if not Bus.objects.filter(id=bus_id).update(sos_activated=False):
+            return False
+        TransportLog.objects.create(
+            bus_id=bus_id,
+            log_type='sos_resolved',
+            description='SOS emergency resolved'
+        )
+
+    live_state.set_sos(bus_id, False)
+    return True
+
+
+sos_recipients = SosRecipientDirectory()
+sos_latency = LatencyRecorder()
@@ -0,0 +1,208 @@
+"""
+Uniform-grid spatial indexes for buses and route stops.
+
+Points are bucketed into square cells of TRANSPORT_SPATIAL_CELL_SIZE
+metres. Radius queries only look at the cells overlapping the search
+circle, and nearest-k queries walk outwards ring by ring, so lookups cost
+O(nearby points) rather than O(all points). A query that would visit more
+cells than the index holds items scans the items instead, so no lookup
+costs more than O(all points) either.
+"""
+import math
+import threading
+
+from django.conf import settings
+
+from .geo import haversine_m
+
+METRES_PER_DEGREE = 111320.0
+
+
+def _ring_cells(center_x, center_y, ring):
+    """Cells at exactly Chebyshev distance ring from the centre cell"""
+    if ring == 0:
+        yield center_x, center_y
+        return
+    for y in range(center_y - ring, center_y + ring + 1):
+        yield center_x - ring, y
+        yield center_x + ring, y
+    for x in range(center_x - ring + 1, center_x + ring):
+        yield x, center_y - ring
+        yield x, center_y + ring
+
+
+class GridIndex:
+    def __init__(self, cell_size_m=None):
+        self.cell_size_m = cell_size_m or getattr(settings, 'TRANSPORT_SPATIAL_CELL_SIZE', 500)
+        self.cell_deg = self.cell_size_m / METRES_PER_DEGREE
+        self._cells = {}
+        self._items = {}  # key -> (lat, lng, cell, payload)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def insert(self, key, lat, lng, payload=None):
+        """Add or move an item"""
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._items.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard(key, previous[2])
+            self._items[key] = (lat, lng, cell, payload)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def _discard(self, key, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._items.clear()
+
+    def _cell_span(self, lat, radius_m):
+        """Cells to search in each direction to cover radius_m around lat"""
+        lat_cells = math.ceil(radius_m / self.cell_size_m)
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lng_cells = math.ceil(radius_m / (self.cell_size_m * cos_lat))
+        return lat_cells, lng_cells
+
+    def _all_candidates(self):
+        return [(key, item[0], item[1], item[3]) for key, item in self._items.items()]
+
+    def within(self, lat, lng, radius_m, predicate=None):
+        """Items within radius_m metres as (key, distance_m, payload), nearest first"""
+        lat, lng = float(lat), float(lng)
+        center_x, center_y = self._cell(lat, lng)
+        lat_cells, lng_cells = self._cell_span(lat, radius_m)
+
+        # Candidates are copied under the lock; distances are computed outside it
+        with self._lock:
+            if (2 * lat_cells + 1) * (2 * lng_cells + 1) > len(self._items):
+                # A wide search would visit more cells than there are items
+                candidates = self._all_candidates()
+            else:
+                candidates = []
+                for x in range(center_x - lat_cells, center_x + lat_cells + 1):
+                    for y in range(center_y - lng_cells, center_y + lng_cells + 1):
+                        for key in self._cells.get((x, y), ()):
+                            item_lat, item_lng, _, payload = self._items[key]
+                            candidates.append((key, item_lat, item_lng, payload))
+
+        found = []
+        for key, item_lat, item_lng, payload in candidates:
+            distance = haversine_m(lat, lng, item_lat, item_lng)
+            if distance <= radius_m and (predicate is None or predicate(key, payload)):
+                found.append((key, distance, payload))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def _ring_candidates(self, center_x, center_y, k, max_rings, min_side_m, predicate):
+        """
+        Items from rings around the centre cell that must contain the k
+        nearest. Once k items are found within ring r, the k-th nearest is
+        no farther than the corner of ring r, so only the rings that can
+        hold anything closer are still walked. Falls back to every item
+        once the walk would visit more cells than there are items.
+        """
+        total = len(self._items)
+        candidates = []
+        seen = 0
+        last_ring = max_rings
+        ring = 0
+        while seen < total and (last_ring is None or ring <= last_ring):
+            if (2 * ring + 1) ** 2 > total:
+                candidates = self._all_candidates()
+                if predicate is not None:
+                    candidates = [item for item in candidates if predicate(item[0], item[3])]
+                return candidates
+            for cell in _ring_cells(center_x, center_y, ring):
+                for key in self._cells.get(cell, ()):
+                    seen += 1
+                    item_lat, item_lng, _, payload = self._items[key]
+                    if predicate is None or predicate(key, payload):
+                        candidates.append((key, item_lat, item_lng, payload))
+            if len(candidates) >= k:
+                corner_m = (ring + 1) * self.cell_size_m * math.sqrt(2)
+                needed = math.ceil(corner_m / min_side_m)
+                last_ring = needed if last_ring is None else min(last_ring, needed)
+            ring += 1
+        return candidates
+
+    def nearest(self, lat, lng, k=1, max_distance_m=None, predicate=None):
+        """The k nearest items as (key, distance_m, payload), nearest first"""
+        lat, lng = float(lat), float(lng)
+        center_x, center_y = self._cell(lat, lng)
+        # The narrowest cell side bounds how far anything outside ring r can be
+        min_side_m = self.cell_size_m * max(math.cos(math.radians(lat)), 0.01)
+        max_rings = None if max_distance_m is None else math.ceil(max_distance_m / min_side_m) + 1
+
+        with self._lock:
+            candidates = self._ring_candidates(center_x, center_y, k, max_rings, min_side_m, predicate)
+
+        found = []
+        for key, item_lat, item_lng, payload in candidates:
+            distance = haversine_m(lat, lng, item_lat, item_lng)
+            if max_distance_m is None or distance <= max_distance_m:
+                found.append((key, distance, payload))
+        found.sort(key=lambda item: item[1])
+        return found[:k]
+
+
+class RouteStopIndex:
+    """
+    Grid index over the stops in Route.waypoints of active routes.
+
+    Built lazily on first use and rebuilt after any Route is saved or
+    deleted. Keys are (route_id, waypoint_index).
+    """
+
+    def __init__(self):
+        self.index = GridIndex()
+        self._built = False
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._built = False
+
+    def ensure_built(self):
+        if self._built:
+            return self.index
+        from .models import Route
+
+        with self._lock:
+            if not self._built:
+                self.index.clear()
+                for route_id, name, waypoints in Route.objects.filter(is_active=True).values_list('id', 'name', 'waypoints'):
+                    for position, waypoint in enumerate(waypoints or []):
+                        try:
+                            lat, lng = float(waypoint['lat']), float(waypoint['lng'])
+                        except (KeyError, TypeError, ValueError):
+                            continue
+                        self.index.insert((route_id, position), lat, lng, {
+                            'route_id': route_id,
+                            'route_name': name,
+                            'stop_index': position,
+                            'name': waypoint.get('name', f'Stop {position + 1}'),
+                            'latitude': lat,
+                            'longitude': lng,
+                        })
+                self._built = True
+        return self.index
+
+
+stop_index = RouteStopIndex()
@@ -0,0 +1,129 @@
+"""
+In-process fan-out of bus position updates to streaming clients.
+
+Each connected client owns a Subscription. Publishers (the location
+views, running in worker threads) hand positions to the broadcaster,
+which forwards them onto each subscriber's event loop. A subscription
+only ever holds the latest position per bus, so a slow client receives
+fewer, fresher updates instead of an ever-growing queue.
+
+The broadcaster lives in process memory: run the ASGI app with a single
+worker process, or put a shared pub/sub in front of it, for all clients
+to see every update.
+"""
+import asyncio
+import threading
+
+
+class Subscription:
+    """Per-connection mailbox coalescing updates to the latest fix per bus"""
+
+    def __init__(self, loop, bus_ids=None, route_ids=None, allowed_route_ids=None):
+        self.loop = loop
+        self.bus_ids = set(bus_ids) if bus_ids else set()
+        self.route_ids = set(route_ids) if route_ids else set()
+        # When set, only buses currently on these routes are ever delivered
+        self.allowed_route_ids = frozenset(allowed_route_ids) if allowed_route_ids is not None else None
+        self.coalesced = 0
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    @property
+    def watches_everything(self):
+        return not self.bus_ids and not self.route_ids
+
+    def _offer(self, positions):
+        # Runs on the subscriber's event loop
+        for position in positions:
+            if self.allowed_route_ids is not None and position.get('route_id') not in self.allowed_route_ids:
+                continue
+            if position['bus_id'] in self._pending:
+                self.coalesced += 1
+            self._pending[position['bus_id']] = position
+        if self._pending:
+            self._ready.set()
+
+    async def next_batch(self, timeout):
+        """Wait for updates and return them, or an empty list on timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class FleetBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._all = set()
+        self._by_bus = {}
+        self._by_route = {}
+
+    def subscribe(self, loop, bus_ids=None, route_ids=None, allowed_route_ids=None):
+        subscription = Subscription(loop, bus_ids, route_ids, allowed_route_ids)
+        with self._lock:
+            if subscription.watches_everything:
+                self._all.add(subscription)
+            for bus_id in subscription.bus_ids:
+                self._by_bus.setdefault(bus_id, set()).add(subscription)
+            for route_id in subscription.route_ids:
+                self._by_route.setdefault(route_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._all.discard(subscription)
+            for index, keys in ((self._by_bus, subscription.bus_ids), (self._by_route, subscription.route_ids)):
+                for key in keys:
+                    subscribers = index.get(key)
+                    if subscribers:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del index[key]
+
+    def subscriber_count(self):
+        with self._lock:
+            subscriptions = set(self._all)
+            for subscribers in self._by_bus.values():
+                subscriptions |= subscribers
+            for subscribers in self._by_route.values():
+                subscriptions |= subscribers
+        return len(subscriptions)
+
+    def publish(self, positions):
+        """Deliver positions to matching subscribers; safe to call from any thread"""
+        deliveries = {}
+        with self._lock:
+            for position in positions:
+                targets = set(self._all)
+                targets |= self._by_bus.get(position['bus_id'], set())
+                if position.get('route_id') is not None:
+                    targets |= self._by_route.get(position['route_id'], set())
+                for subscription in targets:
+                    deliveries.setdefault(subscription, []).append(position)
+
+        for subscription, batch in deliveries.items():
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, batch)
+            except RuntimeError:
+                # The client's event loop has already shut down
+                self.unsubscribe(subscription)
+
+
+def position_from_bus(bus):
+    """Compact position payload pushed to streaming clients"""
+    return {
+        'bus_id': bus.id,
+        'route_id': bus.current_route_id,
+        'latitude': float(bus.current_latitude) if bus.current_latitude is not None else None,
+        'longitude': float(bus.current_longitude) if bus.current_longitude is not None else None,
+        'speed': float(bus.current_speed) if bus.current_speed is not None else None,
+        'timestamp': bus.last_location_update.isoformat() if bus.last_location_update else None,
+        'sos_activated': bus.sos_activated,
+    }
+
+
+fleet_broadcaster = FleetBroadcaster()
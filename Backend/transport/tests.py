@@ -1,3 +1,1286 @@
-from django.test import TestCase
+import random
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .enrichment import RateBudget, enrich_pending_addresses, pending_logs
+from .geocache import geocode_cache
+from .models import Bus, TransportLog
+from .providers import LocalMapsProvider
+from .services import maps_service
+from .geo import haversine_m
+from .spatial import GridIndex
+
+
+class FailingProvider(LocalMapsProvider):
+    def reverse_geocode(self, latlng):
+        raise ConnectionError("maps down")
+
+
+@override_settings(ADDRESS_ENRICHMENT_BACKGROUND=False)
+class AddressEnrichmentTests(TestCase):
+    def setUp(self):
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        geocode_cache.clear()
+        self.addCleanup(maps_service.use_provider, None)
+
+    def log(self, lat, lng):
+        return TransportLog.objects.create(
+            bus=self.bus, log_type='location_update', description='fix', latitude=lat, longitude=lng
+        )
+
+    def test_failed_lookup_leaves_log_pending(self):
+        log = self.log(-1.2921, 36.8219)
+        maps_service.use_provider(FailingProvider())
+
+        self.assertEqual(enrich_pending_addresses(budget=RateBudget(100)), 0)
+        log.refresh_from_db()
+        self.assertEqual(log.address, '')
+        self.assertIn(log, pending_logs())
+
+        maps_service.use_provider(LocalMapsProvider())
+        self.assertEqual(enrich_pending_addresses(budget=RateBudget(100)), 1)
+        log.refresh_from_db()
+        self.assertTrue(log.address.startswith('Near '))
+
+    def test_logs_without_coordinates_are_not_pending(self):
+        TransportLog.objects.create(bus=self.bus, log_type='sos_resolved', description='resolved')
+        self.assertFalse(pending_logs().exists())
+
+
+class PositionStreamPermissionTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, Parent, Student, User
+        from .models import Route
+        from .sos import sos_recipients
+
+        self.route = Route.objects.create(
+            name='R1', start_point='A', end_point='School', estimated_duration=30, distance=10
+        )
+        self.other_route = Route.objects.create(
+            name='R2', start_point='B', end_point='School', estimated_duration=30, distance=10
+        )
+        manager = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=manager, department='Ops', role='Transport', can_manage_transport=True)
+        parent = User.objects.create(username='parent', user_type='parent')
+        Student.objects.create(
+            user=User.objects.create(username='kid', user_type='student'),
+            grade='4', parent=Parent.objects.create(user=parent), bus_route='R1'
+        )
+        self.users = {'manager': manager, 'parent': parent, 'student': User.objects.get(username='kid')}
+        sos_recipients.invalidate()
+
+    def stream(self, user, query=''):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .streaming import fleet_broadcaster
+
+        token = AccessToken.for_user(user)
+        response = self.client.get(f'/transport/stream/{query}', HTTP_AUTHORIZATION=f'Bearer {token}')
+        subscriptions = []
+        if response.status_code == 200:
+            subscriptions = list(fleet_broadcaster._all) + [
+                subscription
+                for index in (fleet_broadcaster._by_bus, fleet_broadcaster._by_route)
+                for subscribers in index.values()
+                for subscription in subscribers
+            ]
+            for subscription in subscriptions:
+                fleet_broadcaster.unsubscribe(subscription)
+        return response, subscriptions
+
+    def test_student_is_refused(self):
+        response, _ = self.stream(self.users['student'])
+        self.assertEqual(response.status_code, 403)
+
+    def test_parent_is_limited_to_childrens_routes(self):
+        response, subscriptions = self.stream(self.users['parent'], f'?route_ids={self.other_route.id}')
+        self.assertEqual(response.status_code, 200)
+        subscription = subscriptions[0]
+        self.assertEqual(subscription.allowed_route_ids, {self.route.id})
+        self.assertEqual(subscription.route_ids, set())
+
+        subscription._offer([
+            {'bus_id': 1, 'route_id': self.route.id},
+            {'bus_id': 2, 'route_id': self.other_route.id},
+        ])
+        self.assertEqual(list(subscription._pending), [1])
+
+    def test_manager_watches_whole_fleet(self):
+        response, subscriptions = self.stream(self.users['manager'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(subscriptions[0].allowed_route_ids)
+
+
+class LiveStateSyncTests(TestCase):
+    def setUp(self):
+        from .live import FleetStateStore
+
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        self.store = FleetStateStore(sync_interval=3600, sync_distance=10 ** 6)
+        self.store.load()
+
+    def test_refresh_with_unwritten_snapshot_keeps_position_dirty(self):
+        from django.utils import timezone
+
+        bus, needs_sync = self.store.record_fix(self.bus.id, -1.29, 36.82, 20, timezone.now())
+        bus.sos_activated = True
+        self.store.refresh_bus(bus, persisted=False)
+
+        self.assertEqual(self.store.flush(), 1)
+        self.bus.refresh_from_db()
+        self.assertEqual(float(self.bus.current_latitude), -1.29)
+        self.assertEqual(self.bus.last_location_update, bus.last_location_update)
+
+    def test_flush_does_not_overwrite_a_newer_fix(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        now = timezone.now()
+        self.store.record_fix(self.bus.id, -1.29, 36.82, 20, now - timedelta(seconds=30))
+        # Another worker process already stored a newer fix
+        Bus.objects.filter(id=self.bus.id).update(current_latitude=-1.3, current_longitude=36.8, last_location_update=now)
+
+        self.store.flush()
+        self.bus.refresh_from_db()
+        self.assertEqual(float(self.bus.current_latitude), -1.3)
+        self.assertEqual(self.bus.last_location_update, now)
+
+
+    def test_late_fixes_join_the_track_in_time_order(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        now = timezone.now()
+        for seconds, speed in ((0, 10), (20, 30), (10, 20), (30, 40), (5, 15)):
+            self.store.record_fix(self.bus.id, -1.29, 36.82, speed, now + timedelta(seconds=seconds))
+
+        fixes = self.store.recent_fixes(self.bus.id)
+        self.assertEqual([fix['speed'] for fix in fixes], [10, 15, 20, 30, 40])
+        self.assertEqual(self.store.get_bus(self.bus.id).last_location_update, now + timedelta(seconds=30))
+        self.assertEqual(self.store.recent_speeds(self.bus.id, (now + timedelta(seconds=15)).timestamp()), [30, 40])
+
+
+
+@override_settings(ADDRESS_ENRICHMENT_BACKGROUND=False)
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, User
+        from rest_framework.test import APIClient
+        from .live import live_state
+
+        manager = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=manager, department='Ops', role='Transport', can_manage_transport=True)
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+        self.buses = [
+            Bus.objects.create(plate_number=f'KAA00{n}', driver_name='D', driver_contact='1') for n in range(2)
+        ]
+        live_state.reset()
+        self.addCleanup(live_state.reset)
+
+    def post(self, fixes):
+        return self.client.post('/transport/locations/bulk/', {'fixes': fixes}, format='json')
+
+    def test_newest_fix_wins_whatever_the_submission_order(self):
+        first, second = self.buses
+        response = self.post([
+            {'bus_id': first.id, 'latitude': -1.30, 'longitude': 36.80, 'speed': 30, 'timestamp': '2026-05-04T07:00:10Z'},
+            {'bus_id': first.id, 'latitude': -1.29, 'longitude': 36.81, 'speed': 20, 'timestamp': '2026-05-04T07:00:00Z'},
+            {'bus_id': second.id, 'latitude': -1.28, 'longitude': 36.82, 'timestamp': '2026-05-04T07:00:05Z'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['accepted'], response.data['buses_updated']), (3, 2))
+
+        first.refresh_from_db()
+        self.assertEqual((float(first.current_latitude), float(first.current_speed)), (-1.30, 30))
+        logs = TransportLog.objects.filter(bus=first).order_by('created_at')
+        self.assertEqual([float(log.speed) for log in logs], [20, 30])
+        self.assertIsNone(TransportLog.objects.get(bus=second).speed)
+
+    def test_each_item_gets_a_result_in_order(self):
+        response = self.post([
+            {'bus_id': self.buses[0].id, 'latitude': -1.3, 'longitude': 36.8},
+            {'bus_id': self.buses[0].id, 'latitude': 91, 'longitude': 36.8},
+            {'bus_id': 9999, 'latitude': -1.3, 'longitude': 36.8},
+            {'latitude': -1.3, 'longitude': 36.8},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3])
+        self.assertEqual([result['status'] for result in results], ['accepted', 'rejected', 'rejected', 'rejected'])
+        self.assertIn('latitude', results[1]['errors'])
+        self.assertEqual(results[2]['errors'], {'bus_id': ['Bus not found']})
+        self.assertIn('bus_id', results[3]['errors'])
+
+    def test_request_validation(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.client.post('/transport/locations/bulk/', {'fixes': 'x'}, format='json').status_code, 400)
+        with override_settings(TRANSPORT_BULK_MAX_FIXES=1):
+            fix = {'bus_id': self.buses[0].id, 'latitude': -1.3, 'longitude': 36.8}
+            self.assertEqual(self.post([fix, fix]).status_code, 400)
+        response = self.post([{'bus_id': 9999, 'latitude': -1.3, 'longitude': 36.8}])
+        self.assertEqual((response.status_code, response.data['accepted']), (400, 0))
+
+    def test_bulk_ingest_flushes_dirty_positions_when_due(self):
+        from unittest import mock
+        from .live import live_state
+
+        with mock.patch.object(live_state, 'flush_if_due', wraps=live_state.flush_if_due) as flush_if_due:
+            self.post([{'bus_id': self.buses[0].id, 'latitude': -1.3, 'longitude': 36.8}])
+        flush_if_due.assert_called_once_with()
+
+class BusTrackTests(SimpleTestCase):
+    def test_full_buffer_keeps_the_newest_fixes_in_order(self):
+        from .live import BusTrack
+
+        track = BusTrack(4)
+        for timestamp in (1, 2, 4, 5, 3, 6, 0, 7):
+            track.append(timestamp, 0, None, timestamp)
+        self.assertEqual([fix['latitude'] for fix in track.fixes()], [4, 5, 6, 7])
+        self.assertFalse(track.append(1, 0, None, 1))
+        self.assertTrue(track.append(6.5, 0, None, 6.5))
+        self.assertEqual([fix['latitude'] for fix in track.fixes()], [5, 6, 6.5, 7])
+
+class GridIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = GridIndex(cell_size_m=500)
+
+    def brute_force(self, lat, lng):
+        return sorted(
+            (haversine_m(lat, lng, item[0], item[1]), key) for key, item in self.index._items.items()
+        )
+
+    def test_nearest_with_a_distant_item_is_bounded(self):
+        self.index.insert('a', -1.2921, 36.8219)
+        self.index.insert('b', -1.30, 36.80)
+        self.index.insert('far', 0, 0)
+
+        started = time.monotonic()
+        found = self.index.nearest(-1.29, 36.82, k=3)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([key for key, _, _ in found], ['a', 'b', 'far'])
+
+    def test_wide_radius_scans_items(self):
+        self.index.insert('a', -1.2921, 36.8219)
+        self.index.insert('far', 0, 0)
+
+        started = time.monotonic()
+        found = self.index.within(-1.29, 36.82, 500_000)
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual([key for key, _, _ in found], ['a'])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for key in range(300):
+            self.index.insert(key, -1.29 + rng.uniform(-0.2, 0.2), 36.82 + rng.uniform(-0.2, 0.2))
+        for _ in range(20):
+            lat, lng = -1.29 + rng.uniform(-0.3, 0.3), 36.82 + rng.uniform(-0.3, 0.3)
+            expected = self.brute_force(lat, lng)
+            nearest = self.index.nearest(lat, lng, k=5)
+            self.assertEqual([key for key, _, _ in nearest], [key for _, key in expected[:5]])
+            within = self.index.within(lat, lng, 3000)
+            self.assertEqual(
+                [key for key, _, _ in within],
+                [key for distance, key in expected if distance <= 3000]
+            )
+            capped = self.index.nearest(lat, lng, k=5, max_distance_m=1000)
+            self.assertEqual(
+                [key for key, _, _ in capped],
+                [key for distance, key in expected[:5] if distance <= 1000]
+            )
+
+
+class NearbyQueryValidationTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, User
+        from rest_framework.test import APIClient
+
+        manager = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=manager, department='Ops', role='Transport', can_manage_transport=True)
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+
+    def test_rejects_non_finite_and_oversized_distances(self):
+        for value in ('inf', 'nan', '-1', '0', '100000'):
+            for path in ('/transport/nearby/', '/transport/stops/nearby/'):
+                response = self.client.get(path, {'lat': -1.29, 'lng': 36.82, 'radius_km': value})
+                self.assertEqual(response.status_code, 400, (path, value))
+            response = self.client.get('/transport/nearest/', {'lat': -1.29, 'lng': 36.82, 'max_km': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_accepts_a_normal_radius(self):
+        response = self.client.get('/transport/nearby/', {'lat': -1.29, 'lng': 36.82, 'radius_km': 2})
+        self.assertEqual(response.status_code, 200)
+
+
+class CompactionTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        self.start = timezone.now() - timedelta(days=40)
+        TransportLog.objects.bulk_create([
+            TransportLog(
+                bus=self.bus, log_type='location_update', description='fix',
+                latitude=round(-1.29 + i * 0.0005, 6), longitude=36.82, address='x',
+                created_at=self.start + timedelta(seconds=10 * i)
+            )
+            for i in range(50)
+        ])
+
+    def test_running_again_after_keep_raw_does_not_duplicate(self):
+        from .models import Trajectory
+        from .trajectory import compact_transport_logs
+
+        compact_transport_logs(delete_raw=False)
+        compact_transport_logs()
+        self.assertEqual(Trajectory.objects.filter(bus=self.bus).count(), 1)
+        self.assertFalse(TransportLog.objects.filter(bus=self.bus).exists())
+
+    def test_fix_back_dated_during_compaction_is_kept(self):
+        from datetime import timedelta
+        from unittest import mock
+        from . import trajectory
+
+        build = trajectory.build_trajectory
+
+        def build_and_backfill(*args, **kwargs):
+            TransportLog.objects.create(
+                bus=self.bus, log_type='location_update', description='late fix',
+                latitude=-1.2, longitude=36.8, created_at=self.start - timedelta(days=1)
+            )
+            return build(*args, **kwargs)
+
+        with mock.patch.object(trajectory, 'build_trajectory', build_and_backfill):
+            trajectory.compact_transport_logs()
+        self.assertEqual(list(TransportLog.objects.values_list('description', flat=True)), ['late fix'])
+
+
+class TransportLogPaginationTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, User
+        from rest_framework.test import APIClient
+
+        manager = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=manager, department='Ops', role='Transport', can_manage_transport=True)
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+        bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        TransportLog.objects.bulk_create([
+            TransportLog(bus=bus, log_type='maintenance', description=f'log {i}') for i in range(5)
+        ])
+
+    def test_pages_through_every_log(self):
+        seen = []
+        response = self.client.get('/transport/logs/', {'limit': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(TransportLog.objects.values_list('id', flat=True)))
+
+    def test_cursor_with_wrongly_typed_values_is_rejected(self):
+        from smart_system.pagination import encode_cursor
+
+        for values in (['abc', 1], ['2026-01-01T00:00:00+00:00', 'abc'], [None, 1], [[1], 1]):
+            response = self.client.get('/transport/logs/', {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+
+
+@override_settings(MAPS_QUEUE_TIMEOUT=0.01, MAPS_MAX_CONCURRENCY=1, MAPS_BREAKER_RESET=30)
+class CircuitBreakerTests(SimpleTestCase):
+    def test_queue_timeout_in_half_open_state_does_not_wedge_the_breaker(self):
+        from .providers import GoogleMapsProvider, MapsProviderError
+
+        class HealthyClient:
+            def reverse_geocode(self, latlng):
+                return [{'formatted_address': 'Somewhere'}]
+
+        provider = GoogleMapsProvider()
+        provider._client = HealthyClient()
+        provider.breaker.opened_at = time.monotonic() - 60
+        self.assertEqual(provider.breaker.state, 'half_open')
+
+        provider._slots.acquire()
+        with self.assertRaises(MapsProviderError):
+            provider.reverse_geocode((-1.29, 36.82))
+        provider._slots.release()
+
+        self.assertFalse(provider.breaker._trial_running)
+        self.assertEqual(provider.reverse_geocode((-1.29, 36.82)), [{'formatted_address': 'Somewhere'}])
+        self.assertEqual(provider.breaker.state, 'closed')
+
+
+class SosLiveStateTests(TestCase):
+    def setUp(self):
+        from accounts.models import User
+        from .live import live_state
+
+        self.actor = User.objects.create(username='manager', user_type='admin')
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        live_state.reset()
+        self.addCleanup(live_state.reset)
+
+    def test_sos_keeps_unflushed_position(self):
+        from django.utils import timezone
+        from . import sos
+        from .live import live_state
+
+        live_state.record_fix(self.bus.id, -1.29, 36.82, 20, timezone.now())
+        sos.activate_sos(self.bus.id, self.actor)
+        self.assertTrue(live_state.get_bus(self.bus.id).sos_activated)
+        sos.resolve_sos(self.bus.id)
+
+        self.assertEqual(live_state.flush(), 1)
+        self.bus.refresh_from_db()
+        self.assertEqual(float(self.bus.current_latitude), -1.29)
+        self.assertFalse(self.bus.sos_activated)
+
+
+
+class SosRecipientTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, Parent, Student, User
+        from .live import live_state
+        from .models import Route
+
+        self.route = Route.objects.create(
+            name='R1', start_point='A', end_point='School', estimated_duration=30, distance=10
+        )
+        self.admin = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=self.admin, department='Ops', role='Transport')
+        self.parent = User.objects.create(username='parent', user_type='parent')
+        self.student = Student.objects.create(
+            user=User.objects.create(username='kid', user_type='student'),
+            grade='4', parent=Parent.objects.create(user=self.parent)
+        )
+        self.bus = Bus.objects.create(
+            plate_number='KAA 001', driver_name="Sean O'Neil", driver_contact='1', current_route=self.route
+        )
+        live_state.reset()
+        self.addCleanup(live_state.reset)
+
+    def test_alert_text_comes_from_the_template(self):
+        from . import sos
+
+        sos.sos_recipients.invalidate()
+        _, alert, recipients, _ = sos.activate_sos(self.bus.id, self.admin)
+        self.assertEqual(alert.title, 'BUS SOS EMERGENCY - KAA 001')
+        self.assertIn("The driver of bus KAA 001 (Sean O'Neil) on route R1", alert.message)
+        self.assertIn('Last known location: Unknown location.', alert.message)
+        self.assertEqual((alert.alert_type, alert.priority, recipients), ('transport_safety', 'emergency', 1))
+
+    def test_sos_path_rebuilds_recipients_another_process_changed(self):
+        from accounts.models import Student
+        from .sos import SosRecipientDirectory
+
+        directory = SosRecipientDirectory(ttl=300, sos_max_age=0)
+        self.assertEqual(directory.for_route(self.route.id), {self.admin.id})
+
+        # An update without signals, as another worker's invalidate() never arrives here
+        Student.objects.filter(pk=self.student.pk).update(bus_route='R1')
+        self.assertEqual(directory.for_route(self.route.id), {self.admin.id, self.parent.id})
+
+class TrackDownsamplingTests(SimpleTestCase):
+    def test_lttb_keeps_the_ends_and_the_turn(self):
+        from .tracks import lttb
+
+        # East for ten points, then north for ten: one corner at index 10
+        points = [(-1.29, 36.82 + n * 1e-3) for n in range(11)] + [(-1.29 + n * 1e-3, 36.83) for n in range(1, 11)]
+        self.assertEqual(lttb(points, 3), [points[0], points[10], points[-1]])
+        self.assertEqual(lttb(points, 2), [points[0], points[-1]])
+        self.assertEqual(lttb(points, 50), points)
+        self.assertEqual(len(lttb(points, 7)), 7)
+
+    def test_zoom_drops_points_within_a_pixel(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from .tracks import downsample, zoom_tolerance_m
+
+        self.assertAlmostEqual(zoom_tolerance_m(1, 0), zoom_tolerance_m(0, 0) / 2)
+        self.assertLess(zoom_tolerance_m(10, 60), zoom_tolerance_m(10, 0))
+
+        start = datetime(2026, 5, 4, 7, tzinfo=dt_timezone.utc)
+        # A straight road with a 30 m bend in the middle
+        fixes = [
+            (-1.29 + (3e-4 if n == 50 else 0), 36.82 + n * 1e-4, start + timedelta(seconds=n))
+            for n in range(101)
+        ]
+        self.assertEqual(len(downsample(fixes, 500, zoom=18)), 5)
+        self.assertEqual(downsample(fixes, 500, zoom=10), [fixes[0], fixes[-1]])
+        self.assertEqual(len(downsample(fixes, 500)), 101)
+
+
+class TrackCacheTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        self.day = timezone.localdate() - timedelta(days=1)
+        start = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time())) + timedelta(hours=7)
+        for n in range(10):
+            TransportLog.objects.create(
+                bus=self.bus, log_type='location_update', description='fix',
+                latitude=-1.29, longitude=round(36.82 + n * 1e-3, 6), created_at=start + timedelta(seconds=n * 10)
+            )
+
+    def test_build_track_encodes_points_and_offsets(self):
+        from .geo import decode_polyline, decode_signed
+        from .tracks import build_track
+
+        track = build_track(self.bus.id, self.day, 500)
+        self.assertEqual((track['raw_point_count'], track['point_count']), (10, 10))
+        self.assertEqual(decode_signed(track['time_offsets']), [0] + [10] * 9)
+        self.assertAlmostEqual(decode_polyline(track['polyline'])[-1][1], 36.829)
+        self.assertAlmostEqual(track['distance_m'], haversine_m(-1.29, 36.82, -1.29, 36.829), delta=1)
+
+    def test_hits_until_the_version_changes_or_the_entry_expires(self):
+        from unittest import mock
+        from .tracks import TrackCache
+
+        cache = TrackCache(max_entries=2, ttl=60)
+        first = cache.get(self.bus.id, self.day, 500, version=1)
+        self.assertIs(cache.get(self.bus.id, self.day, 500, version=1), first)
+        self.assertIsNot(cache.get(self.bus.id, self.day, 500, version=2), first)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 2))
+
+        with mock.patch('transport.tracks.time.monotonic', return_value=time.monotonic() + 61):
+            cache.get(self.bus.id, self.day, 500, version=2)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        from .tracks import TrackCache
+
+        cache = TrackCache(max_entries=2, ttl=60)
+        cache.get(self.bus.id, self.day, 100)
+        cache.get(self.bus.id, self.day, 200)
+        cache.get(self.bus.id, self.day, 100)
+        cache.get(self.bus.id, self.day, 300)
+        cache.get(self.bus.id, self.day, 100)
+        cache.get(self.bus.id, self.day, 200)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (2, 4))
+
+        cache.forget(self.bus.id)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+@override_settings(ADDRESS_ENRICHMENT_BACKGROUND=False)
+class BusTrackEndpointTests(TestCase):
+    def setUp(self):
+        from accounts.models import Admin, User
+        from rest_framework.test import APIClient
+        from .live import live_state
+        from .tracks import track_cache
+
+        manager = User.objects.create(username='manager', user_type='admin')
+        Admin.objects.create(user=manager, department='Ops', role='Transport', can_manage_transport=True)
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        live_state.reset()
+        track_cache.clear()
+        self.addCleanup(live_state.reset)
+        self.addCleanup(track_cache.clear)
+
+    def post_fix(self, minute, longitude):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        midnight = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), timezone.datetime.min.time()))
+        timestamp = midnight + timedelta(minutes=minute)
+        fix = {'bus_id': self.bus.id, 'latitude': -1.29, 'longitude': longitude, 'timestamp': timestamp.isoformat()}
+        self.assertEqual(self.client.post('/transport/locations/bulk/', {'fixes': [fix]}, format='json').status_code, 200)
+        return timestamp
+
+    def test_late_fix_refreshes_todays_cached_track(self):
+        from datetime import datetime
+        from .tracks import track_cache
+
+        self.post_fix(2, 36.82)
+        self.post_fix(3, 36.83)
+        self.assertEqual(self.client.get(f'/transport/{self.bus.id}/track/').data['raw_point_count'], 2)
+        self.assertEqual(self.client.get(f'/transport/{self.bus.id}/track/').data['raw_point_count'], 2)
+        self.assertEqual(track_cache.stats()['hits'], 1)
+
+        # Back-dated: the bus's last fix time does not move
+        late = self.post_fix(1, 36.81)
+        track = self.client.get(f'/transport/{self.bus.id}/track/').data
+        self.assertEqual(track['raw_point_count'], 3)
+        self.assertEqual(datetime.fromisoformat(track['started_at']), late)
+
+    def test_rejects_bad_parameters(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        url = f'/transport/{self.bus.id}/track/'
+        self.assertEqual(self.client.get(url, {'date': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'zoom': 'x'}).status_code, 400)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(url, {'date': tomorrow}).status_code, 400)
+        self.assertEqual(self.client.get('/transport/9999/track/').status_code, 404)
+        self.assertEqual(self.client.get(url, {'max_points': 0}).data['max_points'], 2)
+
+
+class TrackFileTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+        self.day = timezone.localdate() - timedelta(days=1)
+        noon = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time())) + timedelta(hours=12)
+        for n in range(50):
+            TransportLog.objects.create(
+                bus=self.bus, log_type='location_update', description='fix',
+                latitude=round(-1.29 + n * 1e-4, 6), longitude=round(36.82 + n * 2e-4, 6),
+                speed=None if n % 10 == 0 else 30 + n / 10,
+                created_at=noon + timedelta(seconds=n * 5, microseconds=1234)
+            )
+
+    def stored(self):
+        return [
+            (float(lat), float(lng), round(created_at.timestamp(), 3), speed if speed is None else float(speed))
+            for lat, lng, created_at, speed in TransportLog.objects.filter(bus=self.bus).order_by('created_at')
+            .values_list('latitude', 'longitude', 'created_at', 'speed')
+        ]
+
+    def test_export_import_round_trip(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .enrichment import address_enricher
+
+        before = self.stored()
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('export_transport_tracks', directory, '--date', self.day.isoformat(), stdout=StringIO())
+            path = os.path.join(directory, str(self.bus.id), f'{self.day.isoformat()}.trk')
+            TransportLog.objects.all().delete()
+
+            with mock.patch.object(address_enricher, 'notify') as notify:
+                with self.captureOnCommitCallbacks(execute=True):
+                    call_command('import_transport_tracks', path, stdout=StringIO())
+            notify.assert_called_once()
+            self.assertEqual(self.stored(), before)
+
+            # Importing again adds nothing; --replace rewrites the day
+            call_command('import_transport_tracks', path, stdout=StringIO())
+            self.assertEqual(self.stored(), before)
+            call_command('import_transport_tracks', path, '--replace', stdout=StringIO())
+            self.assertEqual(self.stored(), before)
+
+    def test_reader_streams_the_file(self):
+        import io
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from .trackfile import TrackReader, write_track
+
+        rng = random.Random(7)
+        start = datetime(2026, 1, 5, 6, tzinfo=dt_timezone.utc)
+        fixes, lat, lng = [], -1.3, 36.8
+        for n in range(60000):
+            lat += rng.uniform(-1e-4, 1e-4)
+            lng += rng.uniform(-1e-4, 1e-4)
+            fixes.append((round(lat, 6), round(lng, 6), start + timedelta(seconds=n), round(rng.uniform(0, 80), 1)))
+        fileobj = io.BytesIO()
+        self.assertEqual(write_track(fileobj, 3, start.date(), fixes), len(fixes))
+        size = fileobj.tell()
+
+        fileobj.seek(0)
+        reader = TrackReader(fileobj)
+        stream = iter(reader)
+        self.assertEqual(next(stream), fixes[0])
+        self.assertLess(fileobj.tell(), size / 2)
+        self.assertEqual([fixes[0]] + list(stream), fixes)
+
+    def test_damaged_files_are_rejected(self):
+        import io
+        from .trackfile import TrackFormatError, TrackReader, bus_day_fixes, write_track
+
+        fileobj = io.BytesIO()
+        write_track(fileobj, self.bus.id, self.day, bus_day_fixes(self.bus.id, self.day))
+        data = fileobj.getvalue()
+        for damaged in (data[:-6], data[:20], data + b'\x00', b'BTRK\x01'):
+            with self.assertRaises(TrackFormatError):
+                list(TrackReader(io.BytesIO(damaged)))
+
+
+class GeofenceTests(TestCase):
+    STOP = (-1.29, 36.82)
+    METRES = 1 / 111320  # degrees of latitude per metre
+
+    def setUp(self):
+        from .models import Route
+
+        self.route = Route.objects.create(
+            name='R1', start_point='A', end_point='School', estimated_duration=30, distance=10,
+            waypoints=[{'name': 'Gate A', 'lat': self.STOP[0], 'lng': self.STOP[1], 'radius': 50}]
+        )
+        self.bus = Bus.objects.create(
+            plate_number='KAA001', driver_name='D', driver_contact='1', current_route=self.route
+        )
+
+    def engine(self):
+        from .geofence import GeofenceEngine
+
+        with override_settings(TRANSPORT_GEOFENCE_EXIT_MARGIN=30):
+            return GeofenceEngine()
+
+    def fix(self, engine, metres_north, route_id=None):
+        from django.utils import timezone
+
+        lat = self.STOP[0] + metres_north * self.METRES
+        events = engine.evaluate(self.bus.id, route_id or self.route.id, lat, self.STOP[1], timezone.now())
+        return [(event.kind, event.fence.name) for event in events]
+
+    def test_first_fix_only_records_position(self):
+        engine = self.engine()
+        self.assertEqual(self.fix(engine, 0), [])
+        self.assertEqual([fence.name for fence in engine.inside(self.bus.id)], ['Gate A'])
+        self.assertEqual(self.fix(engine, 200), [('departure', 'Gate A')])
+
+    def test_exit_needs_the_margin(self):
+        engine = self.engine()
+        self.fix(engine, 500)
+        self.assertEqual(self.fix(engine, 40), [('arrival', 'Gate A')])
+        # Jitter around the edge, inside the 30 m exit margin
+        for metres in (55, 45, 70, 48, 79):
+            self.assertEqual(self.fix(engine, metres), [])
+        self.assertEqual(self.fix(engine, 81), [('departure', 'Gate A')])
+        self.assertEqual(self.fix(engine, 70), [])
+        self.assertEqual(self.fix(engine, 10), [('arrival', 'Gate A')])
+
+    def test_other_routes_fences_are_ignored(self):
+        from .models import Route
+
+        other = Route.objects.create(name='R2', start_point='B', end_point='School', estimated_duration=30, distance=10)
+        engine = self.engine()
+        self.fix(engine, 500, other.id)
+        self.assertEqual(self.fix(engine, 0, other.id), [])
+
+
+@override_settings(
+    TRANSPORT_GEOFENCE_ALERTS=True,
+    SCHOOL_GEOFENCE={'name': 'School', 'lat': -1.28, 'lng': 36.83, 'radius': 150}
+)
+class GeofenceAlertTests(TestCase):
+    def setUp(self):
+        from accounts.models import Parent, User
+        from .models import Route
+
+        self.actor = User.objects.create(username='manager', user_type='admin')
+        self.parent = Parent.objects.create(user=User.objects.create(username='parent', user_type='parent'))
+        self.routes = [
+            Route.objects.create(
+                name=f'Route {n}', start_point='A', end_point='School', estimated_duration=30, distance=10,
+                waypoints=[{'name': 'Gate A', 'lat': -1.29, 'lng': 36.82}]
+            )
+            for n in range(3)
+        ]
+        self.bus = Bus.objects.create(plate_number='KAA001', driver_name='D', driver_contact='1')
+
+    def rider(self, username, route, stop='', **names):
+        from accounts.models import Student, User
+
+        return Student.objects.create(
+            user=User.objects.create(username=username, user_type='student', **names),
+            grade='4', parent=self.parent, bus_route=route, bus_stop=stop
+        )
+
+    def events(self, kind, fence_kind='school', routes=None):
+        from django.utils import timezone
+        from .geofence import Fence, GeofenceEvent
+
+        fence = Fence(('school',), 'school', 'School', -1.28, 36.83) if fence_kind == 'school' else Fence(
+            ('stop', 0, 0), 'stop', 'Gate A', -1.29, 36.82
+        )
+        return [
+            GeofenceEvent(self.bus.id, route.id, fence, kind, timezone.now(), -1.28, 36.83)
+            for route in routes or self.routes
+        ]
+
+    def test_alerts_render_from_the_templates(self):
+        from .geofence import record_geofence_events
+
+        self.rider('kid', 'route 0', 'gate a', first_name='Liam', last_name="O'Brien")
+        self.rider('kid-2', str(self.routes[1].id), 'Gate B')
+
+        alerts = record_geofence_events(self.events('arrival'), self.actor)
+        self.assertEqual(sorted(alert.title for alert in alerts), ['Bus Arrived - ', "Bus Arrived - Liam O'Brien"])
+        self.assertTrue(alerts[0].message.startswith('The bus carrying '))
+
+        alerts = record_geofence_events(self.events('arrival', 'stop'), self.actor)
+        self.assertEqual([alert.title for alert in alerts], ["Bus At Stop - Liam O'Brien"])
+        self.assertIn('has arrived at Gate A at', alerts[0].message)
+        self.assertEqual(record_geofence_events(self.events('departure', 'stop'), self.actor), [])
+
+    def test_students_are_looked_up_once_for_all_events(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .geofence import record_geofence_events
+
+        for route in self.routes:
+            self.rider(f'kid-{route.id}', route.name)
+        with CaptureQueriesContext(connection) as captured:
+            alerts = record_geofence_events(self.events('departure'), self.actor)
+        self.assertEqual(len(alerts), len(self.routes))
+        lookups = [query for query in captured if 'bus_route' in query['sql'].partition('WHERE')[2]]
+        self.assertEqual(len(lookups), 1)
+
+
+class AnomalyDetectorTests(SimpleTestCase):
+    START = (-1.29, 36.82)
+
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .anomalies import AnomalyDetector
+
+        with override_settings(
+            TRANSPORT_SPEED_LIMIT=50, TRANSPORT_SPEEDING_TOLERANCE=5, TRANSPORT_HARSH_BRAKE=4.0,
+            TRANSPORT_HARSH_ACCEL=3.0, TRANSPORT_STOP_SPEED=2, TRANSPORT_STOP_DURATION=300,
+            TRANSPORT_GPS_JUMP_SPEED=150, TRANSPORT_GPS_JUMP_MIN_DISTANCE=200
+        ):
+            self.detector = AnomalyDetector()
+        self.detector._limits = {}
+        self.start = datetime(2026, 3, 2, 7, tzinfo=dt_timezone.utc)
+
+    def fix(self, seconds, metres_north, speed=None, at_stop=False):
+        from datetime import timedelta
+
+        anomalies = self.detector.observe(
+            1, None, self.START[0] + metres_north / 111320, self.START[1], speed,
+            self.start + timedelta(seconds=seconds), at_stop=at_stop
+        )
+        return [anomaly.kind for anomaly in anomalies]
+
+    def test_first_and_late_fixes_flag_nothing(self):
+        self.assertEqual(self.fix(0, 0, 120), [])
+        self.assertEqual(self.fix(-5, 5000, 120), [])
+
+    def test_speeding_is_flagged_once_per_episode(self):
+        self.fix(0, 0, 40)
+        self.assertEqual(self.fix(5, 60, 54), [])  # within the tolerance
+        self.assertEqual(self.fix(10, 140, 61), ['speeding'])
+        self.assertEqual(self.fix(15, 225, 62), [])
+        self.fix(20, 290, 45)
+        self.assertEqual(self.fix(25, 370, 62), ['speeding'])
+
+    def test_harsh_braking(self):
+        self.fix(0, 0, 50)
+        self.assertEqual(self.fix(2, 25, 10), ['harsh_braking'])
+
+    def test_prolonged_stop_away_from_stops(self):
+        self.fix(0, 0, 30)
+        self.fix(10, 0, 0)
+        self.assertEqual(self.fix(200, 0, 0), [])
+        self.assertEqual(self.fix(311, 0, 0), ['prolonged_stop'])
+        self.assertEqual(self.fix(400, 0, 0), [])
+        self.fix(500, 0, 0, at_stop=True)
+        self.assertEqual(self.fix(800, 0, 0), [])
+        self.assertEqual(self.fix(1100, 0, 0), ['prolonged_stop'])
+
+    def test_single_outlier_is_one_jump(self):
+        self.fix(0, 0, 36)
+        self.fix(5, 50, 36)
+        self.assertEqual(self.fix(10, 3000, 36), ['gps_jump'])
+        self.assertEqual(self.fix(15, 150, 36), [])
+        self.assertEqual(self.fix(20, 200, 36), [])
+
+    def test_confirmed_jump_becomes_the_new_position(self):
+        self.fix(0, 0, 36)
+        self.assertEqual(self.fix(10, 3000, 36), ['gps_jump'])
+        self.assertEqual(self.fix(15, 3050, 36), [])
+        self.assertEqual(self.fix(20, 3100, 36), [])
+
+
+class RouteGeometryTests(SimpleTestCase):
+    def geometry(self, waypoints, distance=6, duration=30):
+        from .eta import RouteGeometry
+        from .models import Route
+
+        route = Route(name='R', waypoints=[{'lat': lat, 'lng': lng} for lat, lng in waypoints],
+                      distance=distance, estimated_duration=duration)
+        return RouteGeometry(route)
+
+    def test_projects_fixes_onto_the_polyline(self):
+        geometry = self.geometry([(0, 0), (0, 0.01), (0, 0.02)])
+        segment = haversine_m(0, 0, 0, 0.01)
+        self.assertAlmostEqual(geometry.length_m, 2 * segment, places=3)
+
+        along, offset = geometry.project(1e-4, 0.005)
+        self.assertAlmostEqual(along, segment / 2, delta=1)
+        self.assertAlmostEqual(offset, 11.1, delta=0.2)
+        lat, lng = geometry.point_at(along)
+        self.assertEqual(lat, 0)
+        self.assertAlmostEqual(lng, 0.005, places=6)
+
+        # Beyond either end clamps to the end points
+        self.assertEqual(geometry.project(0, -0.01)[0], 0)
+        self.assertAlmostEqual(geometry.project(0, 0.03)[0], geometry.length_m)
+        self.assertEqual(geometry.point_at(10 ** 6), (0, 0.02))
+
+    def test_doubled_back_route_keeps_continuity(self):
+        # Out along the equator and back 11 m north of it
+        geometry = self.geometry([(0, 0), (0, 0.01), (1e-4, 0.01), (1e-4, 0)])
+        outbound, _ = geometry.project(5e-5, 0.005, near_m=400)
+        inbound, _ = geometry.project(5e-5, 0.005, near_m=1800)
+        self.assertAlmostEqual(outbound, 556, delta=2)
+        self.assertAlmostEqual(inbound, geometry.length_m - 556, delta=2)
+
+        # With no tolerance the closer carriageway wins over continuity
+        with override_settings(TRANSPORT_MATCH_TOLERANCE=0):
+            self.assertAlmostEqual(geometry.project(0, 0.005, near_m=1800)[0], 556, delta=2)
+
+    def test_downstream_stops(self):
+        geometry = self.geometry([(0, 0), (0, 0.01), (0, 0.02)])
+        self.assertEqual(geometry.next_stop(0), 1)
+        self.assertEqual(geometry.next_stop(geometry.length_m), None)
+        stops = geometry.stops_after(100)
+        self.assertEqual([(index, name) for index, name, *_ in stops], [(1, 'Stop 2'), (2, 'Stop 3')])
+        self.assertAlmostEqual(stops[0][4], geometry.cumulative[1] - 100)
+
+    def test_speed_prior_and_blend(self):
+        from .eta import expected_speed_kmh
+
+        self.assertEqual(self.geometry([(0, 0)], distance=6, duration=30).prior_speed_kmh, 12)
+        with override_settings(TRANSPORT_DEFAULT_SPEED=25):
+            self.assertEqual(self.geometry([(0, 0)], duration=0).prior_speed_kmh, 25)
+        with override_settings(TRANSPORT_ETA_PRIOR_WEIGHT=5, TRANSPORT_ETA_MIN_SPEED=5):
+            self.assertEqual(expected_speed_kmh(20, []), 20)
+            self.assertEqual(expected_speed_kmh(20, [40] * 5), 30)
+            self.assertEqual(expected_speed_kmh(6, [0] * 20), 5)
+
+
+class BusEtaTests(TestCase):
+    def setUp(self):
+        from .live import live_state
+        from .models import Route
+
+        self.route = Route.objects.create(
+            name='R', start_point='A', end_point='B', distance=6, estimated_duration=30,
+            waypoints=[{'lat': 0, 'lng': 0, 'name': 'Gate'}, {'lat': 0, 'lng': 0.01, 'name': 'Market'},
+                       {'lat': 0, 'lng': 0.02, 'name': 'School'}]
+        )
+        self.bus = Bus.objects.create(
+            plate_number='KAA001', driver_name='D', driver_contact='1', current_route=self.route,
+            current_latitude=0, current_longitude=0.005
+        )
+        live_state.reset()
+        self.addCleanup(live_state.reset)
+
+    def test_etas_use_the_route_prior_without_observed_speeds(self):
+        from .eta import estimate_bus_etas
+        from .live import live_state
+
+        etas = estimate_bus_etas(live_state.get_bus(self.bus.id))
+        self.assertEqual(etas['speed_kmh'], 12)
+        self.assertEqual([stop['name'] for stop in etas['stops']], ['Market', 'School'])
+        market = etas['stops'][0]
+        self.assertAlmostEqual(market['eta_seconds'], market['distance_m'] / (12 / 3.6), delta=1)
+
+    def test_tracked_progress_stops_the_eta_jumping_back(self):
+        from .eta import estimate_bus_etas
+        from .live import live_state
+
+        bus = live_state.get_bus(self.bus.id)
+        tracked = estimate_bus_etas(bus, distance_along_m=1200)
+        self.assertEqual(tracked['distance_along_m'], 1200)
+        self.assertEqual([stop['name'] for stop in tracked['stops']], ['School'])
+
+    def test_no_route_or_position(self):
+        from .eta import estimate_bus_etas
+        from .live import live_state
+
+        Bus.objects.filter(id=self.bus.id).update(current_route=None)
+        live_state.reset()
+        self.assertIsNone(estimate_bus_etas(live_state.get_bus(self.bus.id)))
+        bus = live_state.get_bus(self.bus.id)
+        bus.current_latitude = None
+        self.assertIsNone(estimate_bus_etas(bus, route=self.route))
+
+
+class DistanceMatrixTests(SimpleTestCase):
+    def test_haversine_matrix_matches_the_scalar_formula(self):
+        from .distance import haversine_matrix
+
+        origins = [(-1.29, 36.82), (-1.3, 36.8)]
+        destinations = [(-1.28, 36.83), (-1.29, 36.82), (0, 0)]
+        matrix = haversine_matrix(origins, destinations)
+        self.assertEqual(matrix.shape, (2, 3))
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                self.assertAlmostEqual(matrix[i, j], haversine_m(*origin, *destination), delta=1e-6 * matrix[i, j] + 1e-6)
+        self.assertEqual(matrix[0, 1], 0)
+
+    def test_durations_per_origin_speed(self):
+        import numpy as np
+        from .distance import estimate_durations
+
+        distances = np.array([[1000.0, 2000.0], [1000.0, 2000.0]])
+        self.assertEqual(estimate_durations(distances, 36, detour_factor=1).tolist(), [[100, 200], [100, 200]])
+        self.assertEqual(estimate_durations(distances, [36, 72], detour_factor=1).tolist(), [[100, 200], [50, 100]])
+        # A stopped bus still gets a finite duration
+        self.assertEqual(estimate_durations(distances, 0, detour_factor=1)[0, 0], 3600)
+
+    def test_speeds_must_match_the_origins(self):
+        import numpy as np
+        from .distance import estimate_durations
+
+        one_origin = np.array([[1000.0, 2000.0, 3000.0]])
+        with self.assertRaises(ValueError):
+            estimate_durations(one_origin, [30, 40, 50])
+        with self.assertRaises(ValueError):
+            estimate_durations(np.ones((3, 2)), [30, 40])
+
+    def test_text_formatting(self):
+        from .distance import _distance_text, _duration_text
+
+        self.assertEqual(_distance_text(850), '850 m')
+        self.assertEqual(_distance_text(1000), '1.0 km')
+        self.assertEqual(_distance_text(12300), '12.3 km')
+        self.assertEqual(_duration_text(0), '1 min')
+        self.assertEqual(_duration_text(1), '1 min')
+        self.assertEqual(_duration_text(5), '5 mins')
+        self.assertEqual(_duration_text(61), '1 hour 1 min')
+        self.assertEqual(_duration_text(135), '2 hours 15 mins')
+
+    def test_google_shaped_response(self):
+        from .distance import approximate_distance_matrix
+
+        with override_settings(TRANSPORT_DETOUR_FACTOR=1):
+            matrix = approximate_distance_matrix(['0,0', {'lat': 0, 'lng': 0.1}], [(0, 0.05)], speed_kmh=36)
+        self.assertEqual(matrix['origin_addresses'], ['0.0,0.0', '0.0,0.1'])
+        element = matrix['rows'][1]['elements'][0]
+        self.assertEqual(element['distance']['value'], round(haversine_m(0, 0.1, 0, 0.05)))
+        self.assertEqual(element['distance']['text'], '5.6 km')
+        self.assertEqual(element['duration']['value'], round(element['distance']['value'] / 10))
+        self.assertEqual(element['duration']['text'], '9 mins')
+        with self.assertRaises(ValueError):
+            approximate_distance_matrix(['Nairobi CBD'], ['0,0'])
+
+    def test_cache_rounds_coordinates(self):
+        from .distance import DistanceMatrixCache
+
+        cache = DistanceMatrixCache(precision=3, max_entries=1)
+        first = cache.distances([(0, 0)], [(0, 0.01)])
+        self.assertIs(cache.distances([(0.0001, 0)], [(0, 0.0101)]), first)
+        self.assertFalse(first.flags.writeable)
+        cache.distances([(1, 1)], [(0, 0)])
+        cache.distances([(0, 0)], [(0, 0.01)])
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+
+class SimulatorTests(SimpleTestCase):
+    def test_percentile_is_nearest_rank(self):
+        from .simulator import percentile
+
+        values = [7, 1, 10, 3, 2, 9, 4, 8, 6, 5]
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 95), 10)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([42], 99), 42)
+
+    def test_virtual_bus_shuttles_along_the_route(self):
+        from .simulator import VirtualBus
+
+        bus = VirtualBus(1, [(0, 0), (0, 0.01), (0, 0.02)], seed=3)
+        bus.travelled_m = bus.length_m / 4
+        self.assertAlmostEqual(bus.position()[1], 0.005)
+        bus.travelled_m = bus.length_m * 1.25  # on the way back
+        self.assertAlmostEqual(bus.position()[1], 0.015)
+        bus.travelled_m = bus.length_m * 2
+        self.assertEqual(bus.position(), (0, 0))
+
+        before = bus.travelled_m
+        lat, lng, speed = bus.step(10)
+        self.assertAlmostEqual(bus.travelled_m - before, speed / 3.6 * 10, delta=0.2)  # speed is rounded
+        self.assertLess(abs(lat), 0.001)
+        self.assertTrue(0 <= lng <= 0.02)
+
+        self.assertEqual(VirtualBus(2, [(1, 1)]).position(), (1, 1))
+
+    def test_virtual_buses_are_reproducible(self):
+        from .simulator import VirtualBus
+
+        points = [(0, 0), (0, 0.01)]
+        first, second = VirtualBus(1, points, seed=7), VirtualBus(1, points, seed=7)
+        self.assertEqual([first.step(5) for _ in range(5)], [second.step(5) for _ in range(5)])
+        self.assertNotEqual(VirtualBus(1, points).speed_kmh, VirtualBus(2, points).speed_kmh)
+
+    def test_run_simulation_leaves_out_warmup(self):
+        from .simulator import VirtualBus, run_simulation
+
+        class Target:
+            counts_queries = True
+
+            def __init__(self):
+                self.bulk_sizes = []
+
+            def maps_calls(self):
+                return 0
+
+            def post_fix(self, bus_id, lat, lng, speed, timestamp):
+                return 200, 0.001, 3
+
+            def post_bulk(self, fixes):
+                self.bulk_sizes.append(len(fixes))
+                return (400 if len(fixes) == 1 else 200), 0.002, 5
+
+        buses = [VirtualBus(n, [(0, 0), (0, 0.01)]) for n in range(5)]
+        target = Target()
+        single = run_simulation(target, buses, ticks=3, interval=5, warmup_ticks=2)
+        self.assertEqual((single['requests'], single['fixes'], single['errors']), (15, 15, 0))
+        self.assertEqual(single['queries_per_fix'], 3)
+        self.assertEqual(single['latency_ms']['p99'], 1)
+
+        bulk = run_simulation(target, buses, ticks=3, interval=5, mode='bulk', batch_size=2, warmup_ticks=1)
+        self.assertEqual(target.bulk_sizes, [2, 2, 1] * 4)
+        self.assertEqual((bulk['requests'], bulk['fixes'], bulk['errors']), (9, 15, 3))
+        self.assertEqual(bulk['queries_per_fix'], 3)
+
+
+class RouteProgressTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .eta import geometry_cache
+        from .models import Route
+        from .progress import RouteProgressTracker
+
+        # Along the equator, a stop every ~1.1 km
+        self.route = Route.objects.create(
+            name='R', start_point='A', end_point='B', distance=3.3, estimated_duration=10,
+            waypoints=[{'lat': 0, 'lng': n / 100, 'name': f'S{n}'} for n in range(4)]
+        )
+        geometry_cache.invalidate()
+        self.addCleanup(geometry_cache.invalidate)
+        self.tracker = RouteProgressTracker()
+        self.start = datetime(2026, 5, 4, 7, tzinfo=dt_timezone.utc)
+
+    def fix(self, seconds, lng, lat=0, route_id=None):
+        from datetime import timedelta
+
+        route_id = route_id if route_id is not None else self.route.id
+        return self.tracker.update(1, route_id, lat, lng, self.start + timedelta(seconds=seconds))
+
+    def test_progress_only_moves_forward(self):
+        first = self.fix(0, 0.005)
+        self.assertAlmostEqual(first.distance_along_m, haversine_m(0, 0, 0, 0.005), delta=1)
+        self.assertEqual((first.next_stop_index, first.next_stop_name), (1, 'S1'))
+
+        # GPS noise 55 m back does not move the bus back
+        self.assertEqual(self.fix(10, 0.0045).distance_along_m, first.distance_along_m)
+        later = self.fix(20, 0.012)
+        self.assertEqual(later.next_stop_name, 'S2')
+        self.assertAlmostEqual(later.snapped_longitude, 0.012)
+        self.assertIs(self.tracker.get(1), later)
+
+    def test_off_route_fix_keeps_progress(self):
+        on = self.fix(0, 0.005)
+        off = self.fix(10, 0.015, lat=0.01)
+        self.assertFalse(off.on_route)
+        self.assertEqual(off.distance_along_m, on.distance_along_m)
+        self.assertGreater(off.offset_m, 1000)
+
+    def test_restarts_for_a_new_trip_a_gap_or_another_route(self):
+        from .models import Route
+
+        self.fix(0, 0.02)
+        self.assertLess(self.fix(10, 0.001).distance_along_m, 200)
+
+        at_stop = self.fix(20, 0.02)
+        self.assertEqual(at_stop.next_stop_name, 'S3')
+        self.assertEqual(self.fix(60, 0.015)[2:6], at_stop[2:6])
+        # After a long gap the fix is taken as it is
+        self.assertEqual(self.fix(60 + 1801, 0.015).next_stop_name, 'S2')
+
+        other = Route.objects.create(
+            name='O', start_point='A', end_point='B', distance=1, estimated_duration=5,
+            waypoints=[{'lat': 0, 'lng': 0.03}, {'lat': 0, 'lng': 0}]
+        )
+        self.assertLess(self.fix(1900, 0.025, route_id=other.id).distance_along_m, 600)
+
+    def test_no_route_forgets_the_bus(self):
+        from .progress import progress_data
+
+        progress = self.fix(0, 0.015)
+        data = progress_data(progress)
+        self.assertAlmostEqual(data['fraction_complete'], 0.5, places=3)
+        self.assertEqual(data['updated_at'], '2026-05-04T07:00:00+00:00')
+        self.assertEqual(self.tracker.for_route(self.route.id), [progress])
+
+        self.assertIsNone(self.tracker.update(1, None, 0, 0.015, self.start))
+        self.assertIsNone(self.tracker.get(1))
+
+
+class ReverseGeocodeCacheTests(TestCase):
+    def setUp(self):
+        from .geocache import ReverseGeocodeCache
+
+        self.cache = ReverseGeocodeCache(precision=4, ttl_seconds=3600, max_entries=2)
+
+    def test_nearby_fixes_share_a_bucket(self):
+        from decimal import Decimal
+
+        self.assertEqual(self.cache.bucket(-1.29211, 36.82189), (-12921, 368219))
+        self.assertEqual(self.cache.bucket(Decimal('-1.292149'), Decimal('36.821860')), (-12921, 368219))
+        self.cache.set(-1.29211, 36.82189, 'Kenyatta Ave')
+        self.assertEqual(self.cache.get(-1.29209, 36.82191), 'Kenyatta Ave')
+        self.assertIsNone(self.cache.get(-1.2925, 36.8219))
+
+    def test_database_tier_serves_other_processes(self):
+        from .geocache import ReverseGeocodeCache
+
+        self.cache.set(-1.2921, 36.8219, 'Kenyatta Ave')
+        other = ReverseGeocodeCache(precision=4, ttl_seconds=3600, max_entries=2)
+        self.assertIsNone(other.peek(-1.2921, 36.8219))
+        with self.assertNumQueries(1):
+            self.assertEqual(other.get(-1.2921, 36.8219), 'Kenyatta Ave')
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get(-1.2921, 36.8219), 'Kenyatta Ave')
+        stats = other.stats()
+        self.assertEqual((stats['db_hits'], stats['memory_hits'], stats['misses']), (1, 1, 0))
+        self.assertEqual(stats['hit_rate'], 1.0)
+
+    def test_entries_expire_in_both_tiers(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import GeocodeCacheEntry
+
+        self.cache.set(-1.2921, 36.8219, 'Kenyatta Ave')
+        later = timezone.now() + timedelta(seconds=3601)
+        with mock.patch('transport.geocache.timezone.now', return_value=later):
+            self.assertIsNone(self.cache.get(-1.2921, 36.8219))
+            self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_least_recently_used_entries_are_evicted_from_memory(self):
+        self.cache.set(0, 0, 'A')
+        self.cache.set(0, 1, 'B')
+        self.cache.peek(0, 0)
+        self.cache.set(0, 2, 'C')
+        self.assertIsNone(self.cache.peek(0, 1))
+        self.assertEqual(self.cache.peek(0, 0), 'A')
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        # Still in the database tier
+        self.assertEqual(self.cache.get(0, 1), 'B')
+
+    def test_maps_service_only_calls_the_provider_on_a_miss(self):
+        provider = LocalMapsProvider()
+        maps_service.use_provider(provider)
+        self.addCleanup(maps_service.use_provider, None)
+        geocode_cache.clear()
+        self.addCleanup(geocode_cache.clear)
+
+        first = maps_service.reverse_geocode(-1.2921, 36.8219)
+        self.assertEqual(maps_service.reverse_geocode(-1.29212, 36.82188), first)
+        self.assertEqual(provider.calls['reverse_geocode'], 1)
+
+        maps_service.use_provider(FailingProvider())
+        self.assertEqual(maps_service.reverse_geocode(-1.5, 36.9), 'Address lookup failed')
+        self.assertIsNone(geocode_cache.get(-1.5, 36.9))
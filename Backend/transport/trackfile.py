@@ -0,0 +1,367 @@
+"""
+Compact binary track files: one bus, one day of fixes.
+
+Layout (all integers are LEB128 varints, signed ones zigzag encoded):
+
+    b'BTRK' version flags
+    bus_id  day (proleptic ordinal)  fix count  first timestamp (unix ms)
+    blocks of up to BLOCK_SIZE fixes, each:
+        number of fixes in the block
+        four columns, each prefixed with its byte length:
+            latitude     signed deltas of integer microdegrees
+            longitude    signed deltas of integer microdegrees
+            timestamp    unsigned deltas in milliseconds
+            speed        0 for unknown, otherwise 1 + speed in 0.1 km/h
+
+Deltas run on from one block to the next. With FLAG_ZLIB set the blocks
+are deflated as one stream. Storing each column contiguously keeps the
+small deltas next to each other, which is what makes the compression
+effective; a fix typically costs 3-6 bytes, against well over 100 for a
+TransportLog row. Blocks bound what a reader holds in memory: it inflates
+the file a chunk at a time and decodes one block at a time.
+"""
+import struct
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+MAGIC = b'BTRK'
+VERSION = 1
+FLAG_ZLIB = 1
+
+BLOCK_SIZE = 4096
+READ_SIZE = 64 * 1024
+
+
+class TrackFormatError(ValueError):
+    pass
+
+
+def _write_uvarint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_svarint(out, value):
+    _write_uvarint(out, (value << 1) ^ (value >> 63))
+
+
+def _read_uvarint(buffer, offset):
+    """One unsigned varint at offset; returns (value, next offset)"""
+    value = shift = 0
+    while True:
+        try:
+            byte = buffer[offset]
+        except IndexError:
+            raise TrackFormatError('Truncated track file') from None
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _uvarints(buffer):
+    """Lazily decode unsigned varints from a bytes-like object"""
+    value = shift = 0
+    for byte in buffer:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+    if shift:
+        raise TrackFormatError('Truncated varint')
+
+
+def _svarints(buffer):
+    for value in _uvarints(buffer):
+        yield (value >> 1) ^ -(value & 1)
+
+
+def _encode_block(count, columns):
+    block = bytearray()
+    _write_uvarint(block, count)
+    for column in columns:
+        _write_uvarint(block, len(column))
+        block += column
+    return block
+
+
+def write_track(fileobj, bus_id, day, fixes, compress=True):
+    """
+    Write time-ordered (lat, lng, timestamp, speed) fixes for one bus day.
+
+    timestamp is an aware datetime, speed km/h or None. Returns the number
+    of fixes written.
+    """
+    compressor = zlib.compressobj(6) if compress else None
+    body = bytearray()
+    columns = [bytearray() for _ in range(4)]
+    previous_lat = previous_lng = 0
+    first_ms = previous_ms = None
+    count = in_block = 0
+    for lat, lng, timestamp, speed in fixes:
+        lat_e6 = round(float(lat) * 1e6)
+        lng_e6 = round(float(lng) * 1e6)
+        unix_ms = round(timestamp.timestamp() * 1000)
+        if first_ms is None:
+            first_ms = previous_ms = unix_ms
+        if unix_ms < previous_ms:
+            raise TrackFormatError('Fixes must be in time order')
+
+        latitudes, longitudes, times, speeds = columns
+        _write_svarint(latitudes, lat_e6 - previous_lat)
+        _write_svarint(longitudes, lng_e6 - previous_lng)
+        _write_uvarint(times, unix_ms - previous_ms)
+        _write_uvarint(speeds, 0 if speed is None else 1 + max(round(float(speed) * 10), 0))
+        previous_lat, previous_lng, previous_ms = lat_e6, lng_e6, unix_ms
+        count += 1
+        in_block += 1
+
+        if in_block == BLOCK_SIZE:
+            block = _encode_block(in_block, columns)
+            body += compressor.compress(block) if compressor else block
+            columns = [bytearray() for _ in range(4)]
+            in_block = 0
+
+    if in_block:
+        block = _encode_block(in_block, columns)
+        body += compressor.compress(block) if compressor else block
+    if compressor:
+        body += compressor.flush()
+
+    header = bytearray(MAGIC)
+    header += struct.pack('BB', VERSION, FLAG_ZLIB if compress else 0)
+    for value in (bus_id, day.toordinal(), count, first_ms or 0):
+        _write_uvarint(header, value)
+
+    fileobj.write(header)
+    fileobj.write(body)
+    return count
+
+
+class _BodyStream:
+    """The body of a track file, read (and inflated) a chunk at a time"""
+
+    def __init__(self, fileobj, pending, inflate):
+        self._fileobj = fileobj
+        self._pending = pending
+        self._inflater = zlib.decompressobj() if inflate else None
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def _next_chunk(self):
+        """The next piece of body bytes, or b'' at the end of the file"""
+        while True:
+            data = self._inflater.unconsumed_tail if self._inflater else b''
+            if not data:
+                data, self._pending = self._pending or self._fileobj.read(READ_SIZE), b''
+            if self._inflater is None:
+                return data
+            if not data:
+                return self._inflater.flush()
+            try:
+                chunk = self._inflater.decompress(data, READ_SIZE)
+            except zlib.error as e:
+                raise TrackFormatError(f'Corrupt track file: {e}') from None
+            if chunk:
+                return chunk
+
+    def _fill(self, size):
+        """Buffer at least size unread bytes; False if the file ends first"""
+        while len(self._buffer) - self._offset < size:
+            chunk = self._next_chunk()
+            if not chunk:
+                return False
+            del self._buffer[:self._offset]
+            self._offset = 0
+            self._buffer += chunk
+        return True
+
+    def read(self, size):
+        if not self._fill(size):
+            raise TrackFormatError('Truncated track file')
+        data = bytes(self._buffer[self._offset:self._offset + size])
+        self._offset += size
+        return data
+
+    def read_uvarint(self):
+        value = shift = 0
+        while True:
+            byte = self.read(1)[0]
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def exhausted(self):
+        """Whether the body ended cleanly after what was read"""
+        if self._fill(1):
+            return False
+        return self._inflater is None or (self._inflater.eof and not self._inflater.unused_data)
+
+
+class TrackReader:
+    """
+    Streams the fixes of a track file written by write_track.
+
+    The header is parsed up front. Iterating reads the rest of the file a
+    chunk at a time and yields (lat, lng, timestamp, speed) one fix at a
+    time, so memory use does not grow with the file. The file object must
+    stay open while iterating, and a reader can only be iterated once.
+    """
+
+    def __init__(self, fileobj):
+        data = fileobj.read(READ_SIZE)
+        if data[:4] != MAGIC:
+            raise TrackFormatError('Not a track file')
+        if len(data) < 6:
+            raise TrackFormatError('Truncated track file')
+        version, flags = struct.unpack('BB', data[4:6])
+        if version != VERSION:
+            raise TrackFormatError(f'Unsupported track file version {version}')
+
+        offset = 6
+        header = []
+        for _ in range(4):
+            value, offset = _read_uvarint(data, offset)
+            header.append(value)
+        self.bus_id, day, self.count, self.first_ms = header
+        self.day = date.fromordinal(day)
+
+        self._body = _BodyStream(fileobj, data[offset:], flags & FLAG_ZLIB)
+        self._started = False
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError('A TrackReader can only be iterated once')
+        self._started = True
+
+        lat = lng = 0
+        unix_ms = self.first_ms
+        remaining = self.count
+        while remaining:
+            in_block = self._body.read_uvarint()
+            if not 0 < in_block <= remaining:
+                raise TrackFormatError('Corrupt track file: bad block size')
+            latitudes, longitudes, times, speeds = [self._body.read(self._body.read_uvarint()) for _ in range(4)]
+            decoded = 0
+            for d_lat, d_lng, d_ms, speed in zip(
+                _svarints(latitudes), _svarints(longitudes), _uvarints(times), _uvarints(speeds)
+            ):
+                lat += d_lat
+                lng += d_lng
+                unix_ms += d_ms
+                decoded += 1
+                yield (
+                    lat / 1e6,
+                    lng / 1e6,
+                    datetime.fromtimestamp(unix_ms / 1000, tz=dt_timezone.utc),
+                    None if speed == 0 else (speed - 1) / 10,
+                )
+            if decoded != in_block:
+                raise TrackFormatError('Corrupt track file: short block')
+            remaining -= in_block
+        if not self._body.exhausted():
+            raise TrackFormatError('Corrupt track file: data after the last fix')
+
+
+def day_bounds(day):
+    """Aware [start, end) datetimes for a date in the current timezone"""
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+
+def bus_day_fixes(bus_id, day):
+    """
+    Time-ordered (lat, lng, timestamp, speed) fixes for one bus day.
+
+    Reads raw location_update logs, or the compacted Trajectory rows when
+    the raw logs for that day are gone.
+    """
+    from .models import Trajectory, TransportLog
+
+    start, end = day_bounds(day)
+    rows = (
+        TransportLog.objects
+        .filter(bus_id=bus_id, log_type='location_update', created_at__gte=start, created_at__lt=end,
+                latitude__isnull=False, longitude__isnull=False)
+        .order_by('created_at', 'id')
+        .values_list('latitude', 'longitude', 'created_at', 'speed')
+    )
+    found = False
+    for lat, lng, created_at, speed in rows.iterator(chunk_size=2000):
+        found = True
+        yield float(lat), float(lng), created_at, float(speed) if speed is not None else None
+    if found:
+        return
+
+    trajectories = Trajectory.objects.filter(
+        bus_id=bus_id, started_at__lt=end, ended_at__gte=start
+    ).order_by('started_at')
+    for trajectory in trajectories:
+        for lat, lng, timestamp in trajectory.get_points():
+            if start <= timestamp < end:
+                yield lat, lng, timestamp, None
+
+
+def _unix_ms(timestamp):
+    return round(timestamp.timestamp() * 1000)
+
+
+def import_track(reader, replace=False, batch_size=1000):
+    """
+    Load a track file back into location_update logs.
+
+    With replace, existing location_update rows for that bus day are
+    deleted first. Otherwise fixes whose timestamp (to the millisecond the
+    file keeps) is already logged for the bus are skipped, so importing a
+    file twice adds nothing. Returns the number of rows created.
+    """
+    from django.db import transaction
+
+    from .enrichment import address_enricher
+    from .models import TransportLog
+
+    start, end = day_bounds(reader.day)
+    day_logs = TransportLog.objects.filter(
+        bus_id=reader.bus_id, log_type='location_update', created_at__gte=start, created_at__lt=end
+    )
+    created = 0
+    with transaction.atomic():
+        if replace:
+            day_logs.delete()
+            existing = set()
+        else:
+            existing = {_unix_ms(created_at) for created_at in day_logs.values_list('created_at', flat=True)}
+        batch = []
+        for lat, lng, timestamp, speed in reader:
+            if existing and _unix_ms(timestamp) in existing:
+                continue
+            batch.append(TransportLog(
+                bus_id=reader.bus_id,
+                log_type='location_update',
+                description=f'Location updated - Speed: {speed if speed is not None else "N/A"} km/h',
+                latitude=round(lat, 6),
+                longitude=round(lng, 6),
+                speed=speed,
+                created_at=timestamp
+            ))
+            if len(batch) >= batch_size:
+                TransportLog.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        TransportLog.objects.bulk_create(batch)
+        created += len(batch)
+        if created:
+            # Imported logs have no address yet
+            transaction.on_commit(address_enricher.notify)
+    return created
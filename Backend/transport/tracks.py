@@ -0,0 +1,160 @@
+"""
+Downsampled historical tracks for map rendering.
+
+A bus day of fixes (raw location_update logs, or compacted Trajectory
+rows once those are gone) is reduced server-side before it is sent to a
+phone:
+
+- with a zoom level, Douglas-Peucker first drops points closer than about
+  a screen pixel to the line at that zoom
+- Largest-Triangle-Three-Buckets then picks at most max_points, keeping
+  the points that contribute the most area (the turns) in each bucket
+
+The result is an encoded polyline plus encoded seconds between points, the
+same encoding Trajectory uses. Downsampled tracks are kept in an LRU keyed
+by (bus, day, max_points, zoom); past days are effectively immutable, and
+today's entry is reused until the bus reports another fix.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geo import encode_polyline, encode_signed, haversine_m
+from .trackfile import bus_day_fixes
+from .trajectory import douglas_peucker
+
+# Ground metres per pixel at zoom 0 on the equator for 256 px web-mercator tiles
+METRES_PER_PIXEL_Z0 = 156543.03
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets over (lat, lng, ...) tuples.
+
+    Always keeps the first and last point. Areas are computed on a local
+    flat projection so east-west and north-south turns weigh the same.
+    """
+    count = len(points)
+    if threshold >= count:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]]
+
+    coords = np.array([(point[1], point[0]) for point in points], dtype=np.float64)
+    coords[:, 0] *= math.cos(math.radians(points[0][0]))
+    x, y = coords[:, 0], coords[:, 1]
+
+    sampled = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        if next_start >= count - 1:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected])
+        )
+        selected = start + int(areas.argmax())
+        sampled.append(selected)
+    sampled.append(count - 1)
+    return [points[index] for index in sampled]
+
+
+def zoom_tolerance_m(zoom, latitude):
+    """About one screen pixel in metres at a zoom level and latitude"""
+    return METRES_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def downsample(fixes, max_points, zoom=None):
+    """Reduce time-ordered (lat, lng, timestamp, ...) fixes for display"""
+    if zoom is not None and len(fixes) > 2:
+        fixes = douglas_peucker(fixes, zoom_tolerance_m(zoom, fixes[0][0]))
+    return lttb(fixes, max_points)
+
+
+def build_track(bus_id, day, max_points, zoom=None):
+    """Downsampled, polyline-encoded track dict for one bus day"""
+    fixes = list(bus_day_fixes(bus_id, day))
+    points = downsample(fixes, max_points, zoom)
+
+    seconds = [round(point[2].timestamp()) for point in points]
+    offsets = [0] + [b - a for a, b in zip(seconds, seconds[1:])] if seconds else []
+    distance = sum(
+        haversine_m(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:])
+    )
+    return {
+        'bus_id': bus_id,
+        'date': day.isoformat(),
+        'raw_point_count': len(fixes),
+        'point_count': len(points),
+        'max_points': max_points,
+        'zoom': zoom,
+        'started_at': points[0][2].isoformat() if points else None,
+        'ended_at': points[-1][2].isoformat() if points else None,
+        'distance_m': round(distance, 1),
+        'precision': 5,
+        'polyline': encode_polyline([(point[0], point[1]) for point in points], precision=5),
+        'time_offsets': encode_signed(offsets),
+    }
+
+
+class TrackCache:
+    """LRU of downsampled tracks keyed by (bus_id, day, max_points, zoom)"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'TRANSPORT_TRACK_CACHE_SIZE', 512)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TRANSPORT_TRACK_CACHE_TTL', 3600)
+        self._entries = OrderedDict()  # key -> (track, version, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bus_id, day, max_points, zoom=None, version=None):
+        """
+        Cached track, building it on a miss. version changes whenever the
+        underlying fixes may have (for today, the bus's last fix time and
+        fix count).
+        """
+        key = (bus_id, day, max_points, zoom)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version and now - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        track = build_track(bus_id, day, max_points, zoom)
+        with self._lock:
+            self._entries[key] = (track, version, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return track
+
+    def forget(self, bus_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == bus_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+track_cache = TrackCache()
@@ -0,0 +1,165 @@
+"""
+Trajectory simplification and TransportLog compaction.
+
+Old location_update rows are grouped per bus into trips (split wherever
+the gap between fixes exceeds TRAJECTORY_TRIP_GAP), simplified with
+Douglas-Peucker and stored as Trajectory rows. The raw rows are then
+deleted. Other log types (SOS, maintenance, route changes) are never
+touched.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import encode_polyline, encode_signed, haversine_m
+from .models import Trajectory, TransportLog
+
+METRES_PER_DEGREE = 111320.0
+DELETE_BATCH_SIZE = 1000
+
+
+def _offset_m(point, start, end, cos_lat):
+    """Distance in metres from point to the segment start-end (local flat projection)"""
+    px, py = point[1] * cos_lat, point[0]
+    ax, ay = start[1] * cos_lat, start[0]
+    bx, by = end[1] * cos_lat, end[0]
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        t = 0
+    else:
+        t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy)) * METRES_PER_DEGREE
+
+
+def douglas_peucker(points, tolerance_m):
+    """
+    Simplify a sequence of (lat, lng, ...) tuples.
+
+    Keeps the first and last point and every point that deviates more than
+    tolerance_m metres from the simplified line. Iterative, so long tracks
+    do not hit the recursion limit.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    cos_lat = math.cos(math.radians(points[0][0]))
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_offset = 0.0
+        index = None
+        for i in range(first + 1, last):
+            offset = _offset_m(points[i], points[first], points[last], cos_lat)
+            if offset > max_offset:
+                max_offset, index = offset, i
+        if index is not None and max_offset > tolerance_m:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def split_trips(fixes, gap_seconds):
+    """Split time-ordered (lat, lng, timestamp) fixes wherever the gap exceeds gap_seconds"""
+    trip = []
+    for fix in fixes:
+        if trip and (fix[2] - trip[-1][2]).total_seconds() > gap_seconds:
+            yield trip
+            trip = []
+        trip.append(fix)
+    if trip:
+        yield trip
+
+
+def build_trajectory(bus_id, fixes, tolerance_m):
+    """Unsaved Trajectory for one trip of (lat, lng, timestamp) fixes"""
+    simplified = douglas_peucker(fixes, tolerance_m)
+
+    # Round offsets from the start, not each gap, so errors don't accumulate
+    deltas = []
+    previous = 0
+    for _, _, timestamp in simplified:
+        offset = round((timestamp - simplified[0][2]).total_seconds())
+        deltas.append(offset - previous)
+        previous = offset
+
+    distance = sum(
+        haversine_m(a[0], a[1], b[0], b[1]) for a, b in zip(fixes, fixes[1:])
+    )
+    return Trajectory(
+        bus_id=bus_id,
+        started_at=fixes[0][2],
+        ended_at=fixes[-1][2],
+        polyline=encode_polyline([(lat, lng) for lat, lng, _ in simplified], precision=6),
+        time_offsets=encode_signed(deltas),
+        raw_point_count=len(fixes),
+        point_count=len(simplified),
+        tolerance_m=tolerance_m,
+        distance_m=round(distance, 1),
+    )
+
+
+def compact_transport_logs(retention_days=None, tolerance_m=None, gap_seconds=None, delete_raw=True, dry_run=False):
+    """
+    Compact location_update rows older than the retention window.
+
+    Works one bus at a time, each inside its own transaction. Only the rows
+    actually read are deleted, so fixes back-dated past the cutoff while a
+    bus is being compacted wait for the next run. A trip is keyed by bus and
+    start time, so compacting the same rows again (e.g. after --keep-raw)
+    replaces its trajectory instead of adding a duplicate. Returns a summary
+    dict with the number of buses, trips, raw rows and kept points.
+    """
+    retention_days = retention_days if retention_days is not None else getattr(settings, 'TRANSPORT_LOG_RETENTION_DAYS', 30)
+    tolerance_m = tolerance_m if tolerance_m is not None else getattr(settings, 'TRAJECTORY_TOLERANCE_M', 10)
+    gap_seconds = gap_seconds if gap_seconds is not None else getattr(settings, 'TRAJECTORY_TRIP_GAP', 600)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    old_fixes = TransportLog.objects.filter(log_type='location_update', created_at__lt=cutoff)
+    summary = {'cutoff': cutoff, 'buses': 0, 'trips': 0, 'raw_rows': 0, 'points_kept': 0}
+
+    for bus_id in old_fixes.order_by().values_list('bus_id', flat=True).distinct():
+        read_ids = []
+        fixes = []
+        rows = (
+            old_fixes.filter(bus_id=bus_id)
+            .order_by('created_at', 'id')
+            .values_list('id', 'latitude', 'longitude', 'created_at')
+            .iterator(chunk_size=2000)
+        )
+        for log_id, lat, lng, created_at in rows:
+            read_ids.append(log_id)
+            if lat is not None and lng is not None:
+                fixes.append((float(lat), float(lng), created_at))
+        trajectories = [build_trajectory(bus_id, trip, tolerance_m) for trip in split_trips(fixes, gap_seconds)]
+
+        summary['buses'] += 1
+        summary['trips'] += len(trajectories)
+        summary['raw_rows'] += sum(t.raw_point_count for t in trajectories)
+        summary['points_kept'] += sum(t.point_count for t in trajectories)
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            Trajectory.objects.bulk_create(
+                trajectories,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['bus', 'started_at'],
+                update_fields=[
+                    'ended_at', 'polyline', 'time_offsets', 'raw_point_count',
+                    'point_count', 'tolerance_m', 'distance_m',
+                ],
+            )
+            if delete_raw:
+                for start in range(0, len(read_ids), DELETE_BATCH_SIZE):
+                    TransportLog.objects.filter(id__in=read_ids[start:start + DELETE_BATCH_SIZE]).delete()
+
+    return summary
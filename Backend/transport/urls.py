@@ -6,8 +6,21 @@ urlpatterns = [
     # Bus management
     path('', views.get_buses, name='get-buses'),
     path('<int:bus_id>/update-location/', views.update_bus_location, name='update-bus-location'),
+    path('<int:bus_id>/recent-track/', views.get_recent_track, name='recent-track'),
+    path('<int:bus_id>/track/', views.get_bus_track, name='bus-track'),
+    path('<int:bus_id>/eta/', views.get_bus_eta, name='bus-eta'),
+    path('<int:bus_id>/progress/', views.get_bus_progress, name='bus-progress'),
+    path('routes/<int:route_id>/progress/', views.get_route_progress, name='route-progress'),
+    path('locations/bulk/', views.bulk_update_locations, name='bulk-update-locations'),
+    path('stream/', views.stream_bus_positions, name='stream-bus-positions'),
+    
+    # Spatial queries
+    path('nearby/', views.get_buses_nearby, name='buses-nearby'),
+    path('nearest/', views.get_nearest_buses, name='nearest-buses'),
+    path('stops/nearby/', views.get_stops_nearby, name='stops-nearby'),
     path('<int:bus_id>/activate-sos/', views.activate_sos, name='activate-sos'),
     path('<int:bus_id>/resolve-sos/', views.resolve_sos, name='resolve-sos'),
+    path('sos/stats/', views.get_sos_stats, name='sos-stats'),
     
     # Logs
     path('logs/', views.get_transport_logs, name='get-transport-logs'),
@@ -15,4 +28,7 @@ urlpatterns = [
     # Google Maps services
     path('geocode/', views.geocode_address, name='geocode-address'),
     path('directions/', views.get_route_directions, name='get-directions'),
+    path('distance-matrix/', views.get_distance_matrix, name='distance-matrix'),
+    path('geocode/cache-stats/', views.get_geocode_cache_stats, name='geocode-cache-stats'),
+    path('maps/stats/', views.get_maps_provider_stats, name='maps-provider-stats'),
 ]
\ No newline at end of file
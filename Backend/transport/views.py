@@ -1,133 +1,559 @@
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import sync_to_async
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 
 from .models import Bus, Route, TransportLog
-from .serializers import BusSerializer, RouteSerializer, TransportLogSerializer
+from .serializers import BusSerializer, RouteSerializer, TransportLogSerializer, LocationFixSerializer
 from .services import maps_service
+from .geocache import geocode_cache
+from .enrichment import address_enricher
+from .streaming import fleet_broadcaster, position_from_bus
+from .live import live_state
+from .spatial import stop_index
+from .eta import estimate_bus_etas
+from . import sos
+from .geofence import geofence_engine, record_geofence_events
+from .anomalies import anomaly_detector, record_anomalies
+from .progress import progress_data, route_progress
+from .tracks import track_cache
 from accounts.permissions import IsAdmin, CanManageTransport
+from smart_system.pagination import get_page_size, next_page_url, paginate_keyset
 
 @api_view(['GET'])
 @permission_classes([CanManageTransport])
 def get_buses(request):
     """Get all buses with current locations"""
-    buses = Bus.objects.filter(status='active').select_related('current_route')
+    buses = live_state.active_buses()
     serializer = BusSerializer(buses, many=True)
     return Response(serializer.data)
 
-@api_view(['POST'])
+@api_view(['GET'])
 @permission_classes([CanManageTransport])
-def update_bus_location(request, bus_id):
-    """Update bus location with geocoding"""
+def get_recent_track(request, bus_id):
+    """Get the most recent fixes for a bus, oldest first"""
+    if live_state.get_bus(bus_id) is None:
+        return Response({'error': 'Bus not found'}, status=404)
+    
     try:
-        bus = Bus.objects.get(id=bus_id)
-        latitude = request.data.get('latitude')
-        longitude = request.data.get('longitude')
-        speed = request.data.get('speed')
-        
-        if latitude and longitude:
-            bus.current_latitude = latitude
-            bus.current_longitude = longitude
-            bus.last_location_update = timezone.now()
-            
-            # Get address from coordinates
-            address = maps_service.reverse_geocode(float(latitude), float(longitude))
-            
-            if speed:
-                bus.current_speed = speed
-            
-            bus.save()
-            
-            # Create transport log
-            TransportLog.objects.create(
-                bus=bus,
-                log_type='location_update',
-                description=f'Location updated - Speed: {speed or "N/A"} km/h',
-                latitude=latitude,
-                longitude=longitude,
-                address=address
-            )
-            
-            return Response({
-                'message': 'Location updated successfully',
-                'address': address,
-                'bus': BusSerializer(bus).data
-            })
-        
-        return Response({'error': 'Latitude and longitude required'}, status=400)
-        
-    except Bus.DoesNotExist:
+        limit = int(request.GET.get('limit', live_state.buffer_size))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    
+    return Response({
+        'bus_id': bus_id,
+        'fixes': live_state.recent_fixes(bus_id, max(limit, 0))
+    })
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_bus_track(request, bus_id):
+    """
+    Get a bus's track for one day, downsampled for map rendering.
+    
+    Query parameters:
+    - date: ISO date, default today
+    - max_points: upper bound on returned points (TRANSPORT_TRACK_DEFAULT_POINTS)
+    - zoom: optional map zoom; points closer than a pixel apart are dropped first
+    
+    Points come back as an encoded polyline with the seconds between them
+    encoded the same way.
+    """
+    bus = live_state.get_bus(bus_id)
+    if bus is None:
+        return Response({'error': 'Bus not found'}, status=404)
+    
+    today = timezone.localdate()
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else today
+        max_points = int(request.GET.get('max_points', getattr(settings, 'TRANSPORT_TRACK_DEFAULT_POINTS', 500)))
+        zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+    except ValueError:
+        return Response({'error': 'date must be YYYY-MM-DD; max_points and zoom must be integers'}, status=400)
+    if day > today:
+        return Response({'error': 'date cannot be in the future'}, status=400)
+    max_points = min(max(max_points, 2), getattr(settings, 'TRANSPORT_TRACK_MAX_POINTS', 5000))
+    if zoom is not None:
+        zoom = min(max(zoom, 0), 22)
+    
+    # Today's track grows with every fix, late ones included; past days are fixed
+    version = (bus.last_location_update, live_state.fix_count(bus_id)) if day == today else None
+    return Response(track_cache.get(bus_id, day, max_points, zoom, version=version))
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_bus_eta(request, bus_id):
+    """Get offline ETAs to the remaining stops on the bus's current route"""
+    bus = live_state.get_bus(bus_id)
+    if bus is None:
         return Response({'error': 'Bus not found'}, status=404)
+    
+    # Tracked progress keeps the ETA from jumping back on a noisy fix
+    progress = route_progress.get(bus_id)
+    along = progress.distance_along_m if progress and progress.route_id == bus.current_route_id else None
+    etas = estimate_bus_etas(bus, distance_along_m=along)
+    if etas is None:
+        return Response({'error': 'Bus has no route with waypoints or no known position'}, status=400)
+    return Response(etas)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_bus_progress(request, bus_id):
+    """
+    Get how far along its route a bus is and which stop is next.
+    
+    Served from the tracked, map-matched progress. Transport managers can
+    see any bus; parents only buses on their children's routes.
+    """
+    bus = live_state.get_bus(bus_id)
+    if bus is None:
+        return Response({'error': 'Bus not found'}, status=404)
+    if not CanManageTransport().has_permission(request, None) and not (
+        request.user.user_type == 'parent'
+        and request.user.id in sos.sos_recipients.for_route(bus.current_route_id)
+    ):
+        return Response({'error': 'You do not have permission to view this bus'}, status=403)
+    
+    progress = route_progress.get(bus_id)
+    if progress is None or progress.route_id != bus.current_route_id:
+        return Response({'error': 'No route progress for this bus yet'}, status=404)
+    return Response({**progress_data(progress), 'plate_number': bus.plate_number})
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_route_progress(request, route_id):
+    """Get tracked progress for every bus on a route, furthest along first"""
+    progress = sorted(route_progress.for_route(route_id), key=lambda p: -p.distance_along_m)
+    return Response({
+        'route_id': route_id,
+        'buses': [progress_data(p) for p in progress]
+    })
+
+def _query_point(request):
+    """Read lat/lng (and an optional radius in km) from the query string"""
+    lat = float(request.GET['lat'])
+    lng = float(request.GET['lng'])
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range')
+    return lat, lng
+
+def _max_query_km():
+    return getattr(settings, 'TRANSPORT_SPATIAL_MAX_RADIUS_KM', 50)
+
+def _query_km(request, name, default=None):
+    """A positive, finite distance in km no larger than TRANSPORT_SPATIAL_MAX_RADIUS_KM"""
+    value = request.GET.get(name)
+    if not value:
+        return default
+    km = float(value)
+    if not (0 < km <= _max_query_km()):
+        raise ValueError(f'{name} out of range')
+    return km
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_buses_nearby(request):
+    """Get active buses within radius_km (default 2) of a point"""
+    try:
+        lat, lng = _query_point(request)
+        radius_km = _query_km(request, 'radius_km', 2)
+    except (KeyError, ValueError):
+        return Response({'error': f'lat, lng and a radius_km between 0 and {_max_query_km()} are required'}, status=400)
+    
+    matches = live_state.buses_within(lat, lng, radius_km * 1000)
+    return Response({
+        'buses': [
+            dict(BusSerializer(bus, context={'resolve_address': False}).data, distance_m=round(distance, 1))
+            for bus, distance in matches
+        ],
+        'count': len(matches)
+    })
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_nearest_buses(request):
+    """Get the k (default 1) nearest active buses to a point"""
+    try:
+        lat, lng = _query_point(request)
+        k = int(request.GET.get('k', 1))
+        max_km = _query_km(request, 'max_km')
+        max_distance_m = max_km * 1000 if max_km else None
+    except (KeyError, ValueError):
+        return Response({'error': f'lat, lng, a numeric k and a max_km between 0 and {_max_query_km()} are required'}, status=400)
+    
+    matches = live_state.nearest_buses(lat, lng, max(1, min(k, 100)), max_distance_m)
+    return Response({
+        'buses': [
+            dict(BusSerializer(bus, context={'resolve_address': False}).data, distance_m=round(distance, 1))
+            for bus, distance in matches
+        ]
+    })
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_stops_nearby(request):
+    """Get route stops within radius_km (default 1) of a point"""
+    try:
+        lat, lng = _query_point(request)
+        radius_km = _query_km(request, 'radius_km', 1)
+    except (KeyError, ValueError):
+        return Response({'error': f'lat, lng and a radius_km between 0 and {_max_query_km()} are required'}, status=400)
+    
+    matches = stop_index.ensure_built().within(lat, lng, radius_km * 1000)
+    return Response({
+        'stops': [dict(stop, distance_m=round(distance, 1)) for _, distance, stop in matches],
+        'count': len(matches)
+    })
 
 @api_view(['POST'])
 @permission_classes([CanManageTransport])
-def activate_sos(request, bus_id):
-    """Activate SOS emergency for a bus"""
+def update_bus_location(request, bus_id):
+    """Update bus location from the live fleet state"""
+    latitude = request.data.get('latitude')
+    longitude = request.data.get('longitude')
+    speed = request.data.get('speed')
+    
+    if not (latitude and longitude):
+        if live_state.get_bus(bus_id) is None:
+            return Response({'error': 'Bus not found'}, status=404)
+        return Response({'error': 'Latitude and longitude required'}, status=400)
+    
     try:
-        bus = Bus.objects.get(id=bus_id)
-        bus.sos_activated = True
-        bus.sos_activated_at = timezone.now()
-        bus.save()
+        latitude = float(latitude)
+        longitude = float(longitude)
+        speed = float(speed) if speed else None
+    except (TypeError, ValueError):
+        return Response({'error': 'Latitude, longitude and speed must be numbers'}, status=400)
+    
+    timestamp = timezone.now()
+    bus, needs_sync = live_state.record_fix(bus_id, latitude, longitude, speed, timestamp)
+    if bus is None:
+        return Response({'error': 'Bus not found'}, status=404)
+    
+    events = geofence_engine.evaluate(bus_id, bus.current_route_id, latitude, longitude, timestamp)
+    progress = route_progress.update(bus_id, bus.current_route_id, latitude, longitude, timestamp)
+    anomalies = anomaly_detector.observe(
+        bus_id, bus.current_route_id, latitude, longitude, speed, timestamp,
+        at_stop=bool(geofence_engine.inside(bus_id))
+    )
+    
+    # Only use an address we already know; the rest is filled in
+    # by the background enricher so ingest never waits on Maps
+    address = geocode_cache.peek(latitude, longitude)
+    
+    with transaction.atomic():
+        if needs_sync:
+            # Narrow update instead of a full-row save
+            live_state.write_positions([bus])
+            transaction.on_commit(lambda: live_state.mark_synced([bus]))
         
-        # Create SOS log
+        # Create transport log
         TransportLog.objects.create(
-            bus=bus,
-            log_type='sos_activated',
-            description='SOS emergency activated by driver',
-            latitude=bus.current_latitude,
-            longitude=bus.current_longitude,
-            address=maps_service.reverse_geocode(
-                float(bus.current_latitude), 
-                float(bus.current_longitude)
-            ) if bus.current_latitude and bus.current_longitude else "Unknown location"
+            bus_id=bus_id,
+            log_type='location_update',
+            description=f'Location updated - Speed: {speed if speed is not None else "N/A"} km/h',
+            latitude=round(latitude, 6),
+            longitude=round(longitude, 6),
+            speed=speed,
+            address=address or ''
         )
+        record_geofence_events(events, request.user)
+        record_anomalies(anomalies, request.user)
+        if not address:
+            transaction.on_commit(address_enricher.notify)
+        position = position_from_bus(bus)
+        transaction.on_commit(lambda: fleet_broadcaster.publish([position]))
+    
+    live_state.flush_if_due()
+    
+    return Response({
+        'message': 'Location updated successfully',
+        'address': address,
+        'bus': BusSerializer(bus, context={'resolve_address': False}).data,
+        'geofence_events': [{'type': event.kind, 'fence': event.fence.name} for event in events],
+        'anomalies': [anomaly.kind for anomaly in anomalies],
+        'progress': progress_data(progress) if progress else None
+    })
+
+@api_view(['POST'])
+@permission_classes([CanManageTransport])
+def bulk_update_locations(request):
+    """
+    Record buffered GPS fixes for many buses in one request.
+    
+    Expected POST data:
+    - fixes: list of {bus_id, latitude, longitude, speed?, timestamp?}
+    
+    All accepted fixes are written with one TransportLog bulk insert and the
+    newest position per bus with one Bus bulk update, inside a single
+    transaction. Buses are looked up in the live fleet state.
+    Returns a per-item result in the order the fixes were submitted.
+    """
+    fixes = request.data.get('fixes')
+    if not isinstance(fixes, list) or not fixes:
+        return Response({'error': 'fixes must be a non-empty list'}, status=400)
+    
+    max_fixes = getattr(settings, 'TRANSPORT_BULK_MAX_FIXES', 1000)
+    if len(fixes) > max_fixes:
+        return Response({'error': f'At most {max_fixes} fixes per request'}, status=400)
+    
+    results = [None] * len(fixes)
+    valid = []
+    now = timezone.now()
+    for index, item in enumerate(fixes):
+        serializer = LocationFixSerializer(data=item)
+        if serializer.is_valid():
+            fix = serializer.validated_data
+            fix.setdefault('timestamp', now)
+            valid.append((index, fix))
+        else:
+            results[index] = {'index': index, 'status': 'rejected', 'errors': serializer.errors}
+    
+    buses = {bus_id: live_state.get_bus(bus_id) for bus_id in {fix['bus_id'] for _, fix in valid}}
+    
+    logs = []
+    accepted = []
+    for index, fix in valid:
+        if buses[fix['bus_id']] is None:
+            results[index] = {'index': index, 'status': 'rejected', 'errors': {'bus_id': ['Bus not found']}}
+            continue
         
-        # Create emergency alert for admins and parents
-        from alerts.views import create_emergency_alert
-        create_emergency_alert(request, {
-            'template': 'bus_sos_emergency',
-            'bus_id': bus_id,
-            'custom_data': {
-                'bus_plate': bus.plate_number,
-                'driver_name': bus.driver_name,
-                'location': bus.current_address
-            }
-        })
-        
-        return Response({
-            'message': 'SOS activated successfully',
-            'bus': BusSerializer(bus).data
-        })
-        
-    except Bus.DoesNotExist:
+        latitude = round(fix['latitude'], 6)
+        longitude = round(fix['longitude'], 6)
+        speed = fix.get('speed')
+        logs.append(TransportLog(
+            bus_id=fix['bus_id'],
+            log_type='location_update',
+            description=f'Location updated - Speed: {speed if speed is not None else "N/A"} km/h',
+            latitude=latitude,
+            longitude=longitude,
+            speed=speed,
+            address=geocode_cache.peek(latitude, longitude) or '',
+            created_at=fix['timestamp']
+        ))
+        accepted.append(fix)
+        results[index] = {'index': index, 'status': 'accepted', 'bus_id': fix['bus_id']}
+    
+    # Apply fixes in time order; the store ignores late fixes for the
+    # current position, so each snapshot ends up holding the newest one
+    latest = {}
+    events = []
+    anomalies = []
+    for fix in sorted(accepted, key=lambda fix: fix['timestamp']):
+        bus, _ = live_state.record_fix(
+            fix['bus_id'], fix['latitude'], fix['longitude'], fix.get('speed'), fix['timestamp']
+        )
+        if bus is None:
+            continue
+        latest[bus.id] = bus
+        if bus.last_location_update == fix['timestamp']:
+            # Late fixes don't move the bus, so they can't cross a fence
+            events.extend(geofence_engine.evaluate(
+                bus.id, bus.current_route_id, fix['latitude'], fix['longitude'], fix['timestamp']
+            ))
+            route_progress.update(bus.id, bus.current_route_id, fix['latitude'], fix['longitude'], fix['timestamp'])
+            anomalies.extend(anomaly_detector.observe(
+                bus.id, bus.current_route_id, fix['latitude'], fix['longitude'], fix.get('speed'),
+                fix['timestamp'], at_stop=bool(geofence_engine.inside(bus.id))
+            ))
+    updated_buses = list(latest.values())
+    
+    with transaction.atomic():
+        TransportLog.objects.bulk_create(logs, batch_size=500)
+        live_state.write_positions(updated_buses)
+        record_geofence_events(events, request.user)
+        record_anomalies(anomalies, request.user)
+        if any(not log.address for log in logs):
+            transaction.on_commit(address_enricher.notify)
+        transaction.on_commit(lambda: live_state.mark_synced(updated_buses))
+        positions = [position_from_bus(bus) for bus in updated_buses]
+        transaction.on_commit(lambda: fleet_broadcaster.publish(positions))
+    
+    live_state.flush_if_due()
+    
+    return Response({
+        'accepted': len(logs),
+        'rejected': len(fixes) - len(logs),
+        'buses_updated': len(updated_buses),
+        'geofence_events': len(events),
+        'anomalies': len(anomalies),
+        'results': results
+    }, status=200 if logs else 400)
+
+def _parse_ids(value):
+    """Parse a comma separated id list from a query parameter"""
+    if not value:
+        return set()
+    return {int(part) for part in value.split(',') if part.strip().isdigit()}
+
+def _authenticate(request):
+    """Resolve the JWT user for views that run outside DRF"""
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+def _stream_scope(request, route_ids):
+    """
+    Route ids a stream may show (None for all) and the routes to watch,
+    or None when the user may not watch buses at all. Transport managers
+    see the whole fleet; parents only their children's routes.
+    """
+    if CanManageTransport().has_permission(request, None):
+        return None, route_ids
+    if request.user.user_type != 'parent':
+        return None
+    allowed = sos.sos_recipients.routes_for_parent(request.user.id)
+    if not allowed:
+        return None
+    return allowed, (route_ids & allowed) if route_ids else set(allowed)
+
+def _fleet_snapshot(bus_ids, route_ids, allowed_route_ids=None):
+    buses = live_state.active_buses()
+    if bus_ids or route_ids:
+        buses = [bus for bus in buses if bus.id in bus_ids or bus.current_route_id in route_ids]
+    if allowed_route_ids is not None:
+        buses = [bus for bus in buses if bus.current_route_id in allowed_route_ids]
+    return [position_from_bus(bus) for bus in buses]
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _position_stream(subscription, snapshot):
+    heartbeat = getattr(settings, 'TRANSPORT_STREAM_HEARTBEAT', 15)
+    min_interval = getattr(settings, 'TRANSPORT_STREAM_MIN_INTERVAL', 1)
+    try:
+        yield _sse_event('snapshot', snapshot)
+        while True:
+            batch = await subscription.next_batch(heartbeat)
+            if batch:
+                yield _sse_event('positions', batch)
+                # Let further fixes coalesce before the next push
+                await asyncio.sleep(min_interval)
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        fleet_broadcaster.unsubscribe(subscription)
+
+async def stream_bus_positions(request):
+    """
+    Server-sent event stream of live bus positions (requires an ASGI server).
+    
+    Query params:
+    - bus_ids: comma separated bus ids to watch
+    - route_ids: comma separated route ids to watch
+    Both empty means the whole active fleet.
+    
+    Transport managers can watch any bus. Parents only get buses on their
+    children's routes; other users are refused.
+    
+    Sends a 'snapshot' event on connect, then 'positions' events holding only
+    the latest fix per bus since the previous push.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+    
+    bus_ids = _parse_ids(request.GET.get('bus_ids'))
+    route_ids = _parse_ids(request.GET.get('route_ids'))
+    request.user = user
+    scope = await sync_to_async(_stream_scope)(request, route_ids)
+    if scope is None:
+        return JsonResponse({'error': 'You do not have permission to watch bus positions'}, status=403)
+    allowed_route_ids, route_ids = scope
+    
+    # Subscribe before taking the snapshot so no fix falls in between
+    subscription = fleet_broadcaster.subscribe(asyncio.get_running_loop(), bus_ids, route_ids, allowed_route_ids)
+    try:
+        snapshot = await sync_to_async(_fleet_snapshot)(bus_ids, route_ids, allowed_route_ids)
+    except Exception:
+        fleet_broadcaster.unsubscribe(subscription)
+        raise
+    
+    response = StreamingHttpResponse(
+        _position_stream(subscription, snapshot),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['POST'])
+@permission_classes([CanManageTransport])
+def activate_sos(request, bus_id):
+    """Activate SOS emergency for a bus and alert parents on its route and admins"""
+    started = time.perf_counter()
+    result = sos.activate_sos(bus_id, request.user, started=started)
+    if result is None:
         return Response({'error': 'Bus not found'}, status=404)
+    
+    bus, alert, recipients, latency_ms = result
+    return Response({
+        'message': 'SOS activated successfully',
+        'alert_id': alert.id,
+        'recipients': recipients,
+        'latency_ms': latency_ms,
+        'bus': BusSerializer(bus, context={'resolve_address': False}).data
+    })
 
 @api_view(['POST'])
 @permission_classes([CanManageTransport])
 def resolve_sos(request, bus_id):
     """Resolve SOS emergency"""
-    try:
-        bus = Bus.objects.get(id=bus_id)
-        bus.sos_activated = False
-        bus.save()
-        
-        TransportLog.objects.create(
-            bus=bus,
-            log_type='sos_resolved',
-            description='SOS emergency resolved'
-        )
-        
-        return Response({'message': 'SOS resolved successfully'})
-        
-    except Bus.DoesNotExist:
+    if not sos.resolve_sos(bus_id):
         return Response({'error': 'Bus not found'}, status=404)
+    
+    return Response({'message': 'SOS resolved successfully'})
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_sos_stats(request):
+    """Get recent SOS call-to-delivery latencies"""
+    return Response(sos.sos_latency.stats())
+
+def _day_start(value):
+    """Aware datetime for the start of an ISO date in the current timezone"""
+    day = date.fromisoformat(value)
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+LOG_EXPORT_FIELDS = (
+    'id', 'bus_id', 'bus__plate_number', 'log_type', 'description',
+    'latitude', 'longitude', 'address', 'created_at'
+)
+
+def _ndjson_rows(logs):
+    encoder = DjangoJSONEncoder()
+    for row in logs.values(*LOG_EXPORT_FIELDS).iterator(chunk_size=2000):
+        row['bus_plate'] = row.pop('bus__plate_number')
+        yield encoder.encode(row) + '\n'
 
 @api_view(['GET'])
 @permission_classes([CanManageTransport])
 def get_transport_logs(request):
-    """Get transport logs with filters"""
+    """
+    Get transport logs with filters, newest first.
+    
+    Query params:
+    - bus_id, log_type, date_from, date_to (YYYY-MM-DD, inclusive)
+    - cursor: the 'next' cursor of the previous page
+    - limit: page size (defaults to PAGE_SIZE)
+    - stream=ndjson: export every matching row as newline-delimited JSON
+    """
     logs = TransportLog.objects.select_related('bus').all()
     
     # Apply filters
@@ -140,13 +566,37 @@ def get_transport_logs(request):
         logs = logs.filter(bus_id=bus_id)
     if log_type:
         logs = logs.filter(log_type=log_type)
-    if date_from:
-        logs = logs.filter(created_at__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(created_at__date__lte=date_to)
+    try:
+        # Plain timestamp bounds so the created_at indexes can be used
+        if date_from:
+            logs = logs.filter(created_at__gte=_day_start(date_from))
+        if date_to:
+            logs = logs.filter(created_at__lt=_day_start(date_to) + timedelta(days=1))
+    except ValueError:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=400)
     
-    serializer = TransportLogSerializer(logs, many=True)
-    return Response(serializer.data)
+    if request.GET.get('stream') == 'ndjson':
+        response = StreamingHttpResponse(
+            _ndjson_rows(logs.order_by('-created_at', '-id')),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = 'attachment; filename="transport-logs.ndjson"'
+        return response
+    
+    try:
+        page, next_cursor = paginate_keyset(
+            logs, ['-created_at', '-id'],
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request)
+        )
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=400)
+    
+    serializer = TransportLogSerializer(page, many=True)
+    return Response({
+        'next': next_page_url(request, next_cursor),
+        'results': serializer.data
+    })
 
 @api_view(['POST'])
 @permission_classes([CanManageTransport])
@@ -181,4 +631,41 @@ def get_route_directions(request):
     if directions:
         return Response(directions)
     
-    return Response({'error': 'Could not calculate route'}, status=400)
\ No newline at end of file
+    return Response({'error': 'Could not calculate route'}, status=400)
+
+@api_view(['POST'])
+@permission_classes([CanManageTransport])
+def get_distance_matrix(request):
+    """Distance matrix; mode 'approximate' is computed locally, 'remote' uses the Maps API"""
+    origins = request.data.get('origins')
+    destinations = request.data.get('destinations')
+    mode = request.data.get('mode', 'remote')
+    speed_kmh = request.data.get('speed_kmh')
+
+    if not origins or not destinations:
+        return Response({'error': 'Origins and destinations required'}, status=400)
+    if mode not in ('approximate', 'remote'):
+        return Response({'error': "mode must be 'approximate' or 'remote'"}, status=400)
+    if speed_kmh is not None:
+        try:
+            speed_kmh = float(speed_kmh)
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid speed_kmh'}, status=400)
+
+    matrix = maps_service.calculate_distance_matrix(origins, destinations, mode=mode, speed_kmh=speed_kmh)
+    if matrix:
+        return Response(matrix)
+
+    return Response({'error': 'Could not calculate distance matrix'}, status=400)
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_geocode_cache_stats(request):
+    """Get reverse-geocode cache hit/miss counters"""
+    return Response(geocode_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([CanManageTransport])
+def get_maps_provider_stats(request):
+    """Get Maps API call/failure counters and circuit breaker state"""
+    return Response(maps_service.stats())